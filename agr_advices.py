@@ -0,0 +1,233 @@
+"""
+農業氣象資料模組
+功能：保存同一份 F-A0010-001 回應中的天氣概況（weatherProfile）與農業氣象建議（agrAdvices：
+      各地區生長度日、作物生育期積溫），以批次 ID 與天氣資料對應，不需另外下載
+"""
+
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from database import get_connection, init_text_source, resolve_dimension_ids, table_columns
+from fetch_weather import parse_agr_advices, parse_weather_profile
+
+
+def init_advice_tables(conn: sqlite3.Connection):
+    """
+    創建天氣概況與農業氣象資料表
+
+    天氣概況加入全文檢索索引（text_index），可在 search.py 中搜尋。
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS weather_profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            batch_id INTEGER NOT NULL UNIQUE,
+            issued_date TEXT,
+            profile TEXT NOT NULL
+        )
+    """)
+    # 各地區逐日的生長度日與累積溫度（農業氣象預報）
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS degree_days (
+            batch_id INTEGER NOT NULL,
+            location_id INTEGER NOT NULL REFERENCES locations (id),
+            forecast_date TEXT NOT NULL,
+            degree_day REAL,
+            accumulated_temperature REAL,
+            PRIMARY KEY (batch_id, location_id, forecast_date)
+        )
+    """)
+    # 作物生長溫度範圍
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS crop_limits (
+            batch_id INTEGER NOT NULL,
+            crop TEXT NOT NULL,
+            description TEXT NOT NULL,
+            min_temp REAL,
+            max_temp REAL,
+            PRIMARY KEY (batch_id, crop, description)
+        )
+    """)
+    # 作物生育期統計（period：fifteenYears 為 15 年平均，thisYear 為今年至發布日）
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS crop_stages (
+            batch_id INTEGER NOT NULL,
+            crop TEXT NOT NULL,
+            location_id INTEGER NOT NULL REFERENCES locations (id),
+            breed TEXT,
+            period TEXT NOT NULL,
+            period_description TEXT,
+            stage TEXT,
+            dibbling_date TEXT,
+            start_date TEXT,
+            end_date TEXT,
+            growing_days INTEGER,
+            accumulated_temperature REAL
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_crop_stages_batch_id
+        ON crop_stages (batch_id)
+    """)
+    init_text_source(conn.cursor(), 'weather_profile', 'weather_profiles', 'profile')
+
+
+def insert_advice_rows(cursor: sqlite3.Cursor, batch_id: int, issued_date: Optional[str],
+                       profile: Optional[str], advices: Dict) -> int:
+    """
+    將一個批次的天氣概況與農業氣象資料寫入（不提交交易）
+
+    同一批次 ID 的舊資料會先被刪除，重複寫入不會產生重複資料。
+
+    Args:
+        cursor: 資料庫游標
+        batch_id: 批次識別碼
+        issued_date: 發布日期（YYYY-MM-DD）
+        profile: parse_weather_profile() 的結果
+        advices: parse_agr_advices() 的結果
+
+    Returns:
+        int: 寫入的資料筆數
+    """
+    for table in ('weather_profiles', 'degree_days', 'crop_limits', 'crop_stages'):
+        cursor.execute(f"DELETE FROM {table} WHERE batch_id = ?", (batch_id,))
+
+    inserted = 0
+    if profile:
+        cursor.execute("""
+            INSERT INTO weather_profiles (batch_id, issued_date, profile)
+            VALUES (?, ?, ?)
+        """, (batch_id, issued_date, profile))
+        inserted += 1
+
+    location_ids, _ = resolve_dimension_ids(cursor, advices['degree_days'] + advices['crop_stages'])
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO degree_days (batch_id, location_id, forecast_date,
+                                            degree_day, accumulated_temperature)
+        VALUES (?, ?, ?, ?, ?)
+    """, [
+        (batch_id, location_ids[day['location']], day['forecast_date'],
+         day['degree_day'], day['accumulated_temperature'])
+        for day in advices['degree_days']
+    ])
+    cursor.executemany("""
+        INSERT OR REPLACE INTO crop_limits (batch_id, crop, description, min_temp, max_temp)
+        VALUES (?, ?, ?, ?, ?)
+    """, [
+        (batch_id, limit['crop'], limit['description'], limit['min_temp'], limit['max_temp'])
+        for limit in advices['crop_limits']
+    ])
+    cursor.executemany("""
+        INSERT INTO crop_stages (batch_id, crop, location_id, breed, period, period_description,
+                                 stage, dibbling_date, start_date, end_date,
+                                 growing_days, accumulated_temperature)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (batch_id, stage['crop'], location_ids[stage['location']], stage['breed'],
+         stage['period'], stage['period_description'], stage['stage'], stage['dibbling_date'],
+         stage['start_date'], stage['end_date'], stage['growing_days'],
+         stage['accumulated_temperature'])
+        for stage in advices['crop_stages']
+    ])
+
+    return (inserted + len(advices['degree_days']) + len(advices['crop_limits'])
+            + len(advices['crop_stages']))
+
+
+def insert_advice_batches(batches: List[Tuple[int, Optional[str], Optional[str], Dict]]) -> int:
+    """
+    在單一交易中寫入多個批次的天氣概況與農業氣象資料
+
+    Args:
+        batches: [(batch_id, issued_date, 天氣概況, 農業氣象建議), ...]
+
+    Returns:
+        int: 成功插入的資料筆數，失敗返回 0
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        init_advice_tables(conn)
+
+        inserted_count = 0
+        for batch_id, issued_date, profile, advices in batches:
+            inserted_count += insert_advice_rows(cursor, batch_id, issued_date, profile, advices)
+
+        conn.commit()
+        conn.close()
+        return inserted_count
+
+    except sqlite3.Error as e:
+        print(f"✗ 農業氣象資料寫入失敗：{e}")
+        return 0
+
+
+def get_batch_advices(batch_id: int) -> Dict:
+    """
+    查詢批次的天氣概況與農業氣象資料
+
+    Returns:
+        Dict: {'profile': 天氣概況（可能為 None）, 'degree_days': [...], 'crop_stages': [...]}
+    """
+    result = {'profile': None, 'degree_days': [], 'crop_stages': []}
+    try:
+        conn = get_connection()
+        # 資料表在匯入時建立（ingest.py），還沒有匯入過時直接返回空結果
+        if not table_columns(conn.cursor(), 'weather_profiles'):
+            conn.close()
+            return result
+
+        row = conn.execute("SELECT profile FROM weather_profiles WHERE batch_id = ?",
+                           (batch_id,)).fetchone()
+        result['profile'] = row['profile'] if row else None
+        result['degree_days'] = [dict(row) for row in conn.execute("""
+            SELECT l.name AS location, d.forecast_date, d.degree_day, d.accumulated_temperature
+            FROM degree_days d
+            JOIN locations l ON l.id = d.location_id
+            WHERE d.batch_id = ?
+            ORDER BY d.location_id, d.forecast_date
+        """, (batch_id,))]
+        result['crop_stages'] = [dict(row) for row in conn.execute("""
+            SELECT s.crop, l.name AS location, s.breed, s.period, s.period_description,
+                   s.stage, s.dibbling_date, s.start_date, s.end_date,
+                   s.growing_days, s.accumulated_temperature
+            FROM crop_stages s
+            JOIN locations l ON l.id = s.location_id
+            WHERE s.batch_id = ?
+            ORDER BY s.rowid
+        """, (batch_id,))]
+        conn.close()
+
+    except sqlite3.Error as e:
+        print(f"✗ 查詢失敗：{e}")
+
+    return result
+
+
+# 測試程式碼
+if __name__ == "__main__":
+    from batch_keys import format_batch_id
+    from database import get_batch_list
+    from fetch_weather import load_replay_payload
+
+    print("=" * 60)
+    print("農業氣象資料")
+    print("=" * 60)
+
+    payload = load_replay_payload()
+    if payload:
+        profile = parse_weather_profile(payload)
+        advices = parse_agr_advices(payload)
+        print(f"✓ 天氣概況：{len(profile or '')} 字")
+        print(f"✓ 生長度日：{len(advices['degree_days'])} 筆")
+        print(f"✓ 作物生育期：{len(advices['crop_stages'])} 筆")
+
+    batches = get_batch_list()
+    if batches:
+        batch_id = batches[0][0]
+        advices = get_batch_advices(batch_id)
+        print(f"\n最新批次 {format_batch_id(batch_id)}：")
+        print(f"  天氣概況：{(advices['profile'] or '（無）')[:40]}...")
+        print(f"  生長度日 {len(advices['degree_days'])} 筆，作物生育期 {len(advices['crop_stages'])} 筆")
+
+    print("=" * 60)
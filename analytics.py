@@ -0,0 +1,379 @@
+"""
+氣候統計與距平分析模組
+功能：依地區與年積日（day of year）累積歷史溫度統計，
+      計算每筆預報相對於歷史同期的距平、z 分數與百分位
+"""
+
+import math
+import sqlite3
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from database import find_partitions, get_connection, iter_weather_sources, uses_delta_storage
+from history_cache import get_history_frame
+
+
+CLIMATOLOGY_WINDOW_DAYS = 7    # 同期視窗（前後各 N 天）
+MIN_SAMPLES = 3                # 樣本數不足時不計算 z 分數
+DAYS_IN_YEAR = 366
+LOCAL_TIME_OFFSET = '+8 hours'   # created_at 為 UTC，年積日以台灣時間計算
+CLIMATOLOGY_UPDATE_ATTEMPTS = 3  # 累積位置被其他行程更新時重新計算的次數
+
+
+def init_climatology_tables(conn: sqlite3.Connection):
+    """
+    創建氣候統計資料表
+
+    climatology_stats 只存放加總值（n、Σx、Σx²），新批次寫入時直接累加，
+    不需重新掃描歷史資料；保留策略刪除原始資料也不影響已累積的統計。
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS climatology_stats (
+            location_id INTEGER NOT NULL REFERENCES locations (id),
+            day_of_year INTEGER NOT NULL,
+            n_min INTEGER NOT NULL DEFAULT 0,
+            sum_min REAL NOT NULL DEFAULT 0,
+            sumsq_min REAL NOT NULL DEFAULT 0,
+            n_max INTEGER NOT NULL DEFAULT 0,
+            sum_max REAL NOT NULL DEFAULT 0,
+            sumsq_max REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (location_id, day_of_year)
+        )
+    """)
+    # 已累積到的批次 ID（只處理之後寫入的批次）
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS climatology_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_batch_id INTEGER NOT NULL
+        )
+    """)
+
+
+def read_climatology_state(conn: sqlite3.Connection) -> int:
+    """已累積到的批次 ID（尚未累積時為 0）"""
+    row = conn.execute("SELECT last_batch_id FROM climatology_state WHERE id = 1").fetchone()
+    return row['last_batch_id'] if row else 0
+
+
+def update_climatology() -> int:
+    """
+    將新寫入批次的資料累加到氣候統計（增量更新，於每次匯入後呼叫）
+
+    以批次 ID 記錄累積位置，新批次不論仍在主資料庫或已移到月分區都會被累加；
+    差異儲存（database.DELTA_STORAGE）時經由快照讀取，
+    與前一批次相同而沿用的資料列在每個批次各計一次，與完整儲存的結果相同。
+
+    附加分區時不能開啟交易，新資料在交易外彙總；寫入時在 BEGIN IMMEDIATE 交易中
+    確認累積位置沒有改變，其他行程（main.py 與背景更新）已先累加時放棄本次結果重新計算，
+    同一批次不會被累加兩次。
+
+    Returns:
+        int: 本次累加的資料筆數
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        init_climatology_tables(conn)
+        conn.commit()
+
+        for _ in range(CLIMATOLOGY_UPDATE_ATTEMPTS):
+            last_batch_id = read_climatology_state(conn)
+            batch_table = 'weather_batches' if uses_delta_storage(cursor) else 'weather'
+            max_batch_id = conn.execute(f"""
+                SELECT MAX(COALESCE((SELECT MAX(batch_id) FROM {batch_table}), 0),
+                           COALESCE((SELECT MAX(max_batch_id) FROM weather_partitions), 0))
+            """).fetchone()[0]
+            if max_batch_id <= last_batch_id:
+                conn.close()
+                return 0
+
+            # 依批次範圍取出新資料，每個來源以單一 GROUP BY 彙總
+            partitions = find_partitions(cursor, after_batch_id=last_batch_id)
+            groups = []
+            for source in iter_weather_sources(conn, partitions):
+                groups.extend(conn.execute(f"""
+                    SELECT location_id,
+                           CAST(strftime('%j', created_at, '{LOCAL_TIME_OFFSET}') AS INTEGER),
+                           COUNT(min_temp), TOTAL(min_temp), TOTAL(min_temp * min_temp),
+                           COUNT(max_temp), TOTAL(max_temp), TOTAL(max_temp * max_temp),
+                           COUNT(*)
+                    FROM {source}
+                    WHERE batch_id > ? AND batch_id <= ?
+                    GROUP BY 1, 2
+                """, (last_batch_id, max_batch_id)).fetchall())
+
+            cursor.execute("BEGIN IMMEDIATE")
+            if read_climatology_state(conn) != last_batch_id:
+                conn.rollback()
+                continue
+
+            conn.executemany("""
+                INSERT INTO climatology_stats (location_id, day_of_year,
+                                               n_min, sum_min, sumsq_min,
+                                               n_max, sum_max, sumsq_max)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (location_id, day_of_year) DO UPDATE SET
+                    n_min = n_min + excluded.n_min,
+                    sum_min = sum_min + excluded.sum_min,
+                    sumsq_min = sumsq_min + excluded.sumsq_min,
+                    n_max = n_max + excluded.n_max,
+                    sum_max = sum_max + excluded.sum_max,
+                    sumsq_max = sumsq_max + excluded.sumsq_max
+            """, [tuple(group)[:8] for group in groups])
+            conn.execute("""
+                INSERT INTO climatology_state (id, last_batch_id) VALUES (1, ?)
+                ON CONFLICT (id) DO UPDATE SET last_batch_id = excluded.last_batch_id
+            """, (max_batch_id,))
+
+            conn.commit()
+            conn.close()
+            return sum(group[8] for group in groups)
+
+        conn.close()
+        print("✗ 氣候統計更新失敗：其他行程持續更新中，下次匯入時再累加")
+        return 0
+
+    except sqlite3.Error as e:
+        print(f"✗ 氣候統計更新失敗：{e}")
+        return 0
+
+
+def rebuild_climatology() -> int:
+    """清空並從目前的天氣資料（含月分區）重新累積氣候統計"""
+    try:
+        conn = get_connection()
+        init_climatology_tables(conn)
+        conn.execute("DELETE FROM climatology_stats")
+        conn.execute("DELETE FROM climatology_state")
+        conn.commit()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"✗ 氣候統計重建失敗：{e}")
+        return 0
+    return update_climatology()
+
+
+def windowed_sums(values: np.ndarray, window_days: int) -> np.ndarray:
+    """
+    對年積日軸做循環視窗加總（跨年首尾相接）
+
+    Args:
+        values: 形狀為 (地區數, 366) 的陣列
+        window_days: 前後各 N 天
+
+    Returns:
+        np.ndarray: 相同形狀的視窗加總
+    """
+    width = 2 * window_days + 1
+    padded = np.concatenate([values[:, -window_days:], values, values[:, :window_days]], axis=1)
+    cumulative = np.cumsum(np.pad(padded, ((0, 0), (1, 0))), axis=1)
+    return cumulative[:, width:] - cumulative[:, :-width]
+
+
+def get_climatology(window_days: int = CLIMATOLOGY_WINDOW_DAYS) -> pd.DataFrame:
+    """
+    取得各地區每個年積日的同期平均與標準差
+
+    Returns:
+        pd.DataFrame: 欄位 location_id, day_of_year, n_min, mean_min, std_min,
+                      n_max, mean_max, std_max
+    """
+    try:
+        conn = get_connection()
+        init_climatology_tables(conn)
+        stats = pd.read_sql_query("SELECT * FROM climatology_stats", conn)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"✗ 氣候統計查詢失敗：{e}")
+        return pd.DataFrame()
+
+    if stats.empty:
+        return pd.DataFrame()
+
+    location_ids = np.sort(stats['location_id'].unique())
+    row_index = np.searchsorted(location_ids, stats['location_id'].to_numpy())
+    col_index = stats['day_of_year'].to_numpy() - 1
+
+    result = {
+        'location_id': np.repeat(location_ids, DAYS_IN_YEAR),
+        'day_of_year': np.tile(np.arange(1, DAYS_IN_YEAR + 1), len(location_ids)),
+    }
+
+    for kind in ('min', 'max'):
+        # 將稀疏的統計值放進 (地區, 年積日) 矩陣，再一次算完所有視窗
+        grids = {}
+        for column in (f'n_{kind}', f'sum_{kind}', f'sumsq_{kind}'):
+            grid = np.zeros((len(location_ids), DAYS_IN_YEAR))
+            grid[row_index, col_index] = stats[column].to_numpy()
+            grids[column] = windowed_sums(grid, window_days)
+
+        n = grids[f'n_{kind}']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = grids[f'sum_{kind}'] / n
+            variance = (grids[f'sumsq_{kind}'] - n * mean * mean) / (n - 1)
+        std = np.sqrt(np.clip(variance, 0, None))
+
+        result[f'n_{kind}'] = n.ravel().astype(int)
+        result[f'mean_{kind}'] = np.where(n > 0, mean, np.nan).ravel()
+        result[f'std_{kind}'] = np.where(n >= MIN_SAMPLES, std, np.nan).ravel()
+
+    return pd.DataFrame(result)
+
+
+def normal_percentile(z: np.ndarray) -> np.ndarray:
+    """
+    以常態分布估計 z 分數對應的百分位（0-100）
+
+    erf 使用 Abramowitz & Stegun 7.1.26 近似式（誤差小於 1.5e-7），可整個陣列一次計算。
+    """
+    z = np.asarray(z, dtype=float)
+    x = np.abs(z) / math.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741
+                + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-x * x)
+    return 50.0 * (1.0 + np.sign(z) * erf)
+
+
+def compute_anomalies(rows: pd.DataFrame,
+                      window_days: int = CLIMATOLOGY_WINDOW_DAYS,
+                      climatology: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    計算資料列相對於歷史同期的距平（整批向量化運算）
+
+    Args:
+        rows: 需包含 location_id、created_at、min_temp、max_temp 欄位
+        window_days: 同期視窗
+        climatology: 預先計算的氣候統計（None 時自動查詢）
+
+    Returns:
+        pd.DataFrame: 原欄位加上 mean_*、anomaly_*、z_*、percentile_*
+    """
+    if rows.empty:
+        return rows
+
+    if climatology is None:
+        climatology = get_climatology(window_days)
+    if climatology.empty:
+        return rows.assign(**{f'{col}_{kind}': np.nan
+                              for col in ('mean', 'anomaly', 'z', 'percentile')
+                              for kind in ('min', 'max')})
+
+    local_time = pd.to_datetime(rows['created_at']) + pd.Timedelta(hours=8)
+    merged = rows.assign(day_of_year=local_time.dt.dayofyear.to_numpy()).merge(
+        climatology, on=['location_id', 'day_of_year'], how='left'
+    )
+
+    for kind in ('min', 'max'):
+        value = merged[f'{kind}_temp'].astype(float)
+        merged[f'anomaly_{kind}'] = value - merged[f'mean_{kind}']
+        merged[f'z_{kind}'] = merged[f'anomaly_{kind}'] / merged[f'std_{kind}'].replace(0, np.nan)
+        merged[f'percentile_{kind}'] = normal_percentile(merged[f'z_{kind}'].to_numpy())
+
+    return merged
+
+
+def attach_location_ids(frame: pd.DataFrame) -> pd.DataFrame:
+    """為歷史快取的資料列加上 location_id（快取只保存地區名稱）"""
+    conn = get_connection()
+    location_ids = dict(conn.execute("SELECT name, id FROM locations").fetchall())
+    conn.close()
+    locations = frame['location'].astype(str)
+    return frame.assign(location=locations, location_id=locations.map(location_ids))
+
+
+def get_batch_anomalies(batch_id: int,
+                        window_days: int = CLIMATOLOGY_WINDOW_DAYS) -> pd.DataFrame:
+    """
+    計算指定批次各地區的距平
+
+    Returns:
+        pd.DataFrame: 每個地區一列，含 location、溫度、同期平均、距平、z 分數與百分位
+    """
+    # 優先讀取共享的歷史快取（history_cache.py），快取沒有此批次時查詢資料庫
+    cached = get_history_frame([batch_id], columns=['location', 'min_temp', 'max_temp', 'created_at'])
+    if cached is not None:
+        try:
+            rows = attach_location_ids(cached).sort_values('location', ignore_index=True)
+            return compute_anomalies(rows, window_days)
+        except sqlite3.Error as e:
+            print(f"✗ 查詢失敗：{e}")
+            return pd.DataFrame()
+
+    try:
+        conn = get_connection()
+        # 已移到月分區的批次只附加所在的分區
+        partitions = find_partitions(conn.cursor(), batch_id=batch_id)
+        frames = [
+            pd.read_sql_query(f"""
+                SELECT location_id, location, min_temp, max_temp, created_at
+                FROM {source}
+                WHERE batch_id = ?
+                ORDER BY location
+            """, conn, params=(batch_id,))
+            for source in iter_weather_sources(conn, partitions, include_main=not partitions)
+        ]
+        rows = pd.concat(frames, ignore_index=True)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"✗ 查詢失敗：{e}")
+        return pd.DataFrame()
+
+    return compute_anomalies(rows, window_days)
+
+
+def get_history_anomalies(start_date: Optional[str] = None,
+                          window_days: int = CLIMATOLOGY_WINDOW_DAYS) -> pd.DataFrame:
+    """
+    計算整段歷史（或起始日期之後）每筆資料的距平
+
+    Args:
+        start_date: 起始日期（YYYY-MM-DD），None 表示全部歷史
+    """
+    # 快取只轉換距平需要的欄位，日期條件在 Arrow 端篩選
+    cached = get_history_frame(start_date=start_date,
+                               columns=['batch_id', 'location', 'min_temp', 'max_temp', 'created_at'])
+    if cached is not None:
+        try:
+            return compute_anomalies(attach_location_ids(cached), window_days)
+        except sqlite3.Error as e:
+            print(f"✗ 查詢失敗：{e}")
+            return pd.DataFrame()
+
+    try:
+        conn = get_connection()
+        partitions = find_partitions(conn.cursor(), start_date=start_date)
+        frames = [
+            pd.read_sql_query(f"""
+                SELECT batch_id, location_id, location, min_temp, max_temp, created_at
+                FROM {source}
+                WHERE (? IS NULL OR created_at >= ?)
+            """, conn, params=(start_date, start_date))
+            for source in iter_weather_sources(conn, partitions)
+        ]
+        rows = pd.concat(frames, ignore_index=True)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"✗ 查詢失敗：{e}")
+        return pd.DataFrame()
+
+    return compute_anomalies(rows, window_days)
+
+
+# 測試程式碼
+if __name__ == "__main__":
+    print("=" * 60)
+    print("氣候統計與距平分析")
+    print("=" * 60)
+
+    added = rebuild_climatology()
+    print(f"✓ 已累積 {added} 筆資料")
+
+    climatology = get_climatology()
+    if not climatology.empty:
+        covered = climatology[climatology['n_min'] > 0]
+        print(f"涵蓋 {covered['location_id'].nunique()} 個地區、{covered['day_of_year'].nunique()} 個年積日")
+
+    print("=" * 60)
@@ -3,130 +3,80 @@ Streamlit 視覺化應用（CWA 風格增強版）
 功能：以專業視覺化方式展示中央氣象局天氣資料
 """
 
+import time
+
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
 import plotly.express as px
-from database import (
+from storage import (
+    get_repository,
+    init_database,
     get_latest_weather,
     get_weather_by_batch,
     get_batch_list,
     get_database_stats,
-    insert_weather_data
+    query_weather
+)
+from database import WEATHER_PAGE_SIZE
+from batch_keys import format_batch_id
+from refresh_worker import RefreshWorker
+from spatial import crop_surface, temperature_surface, view_bounds
+from stations import load_station_registry
+from history_cache import get_history_frame
+from analytics import get_batch_anomalies, CLIMATOLOGY_WINDOW_DAYS, MIN_SAMPLES
+from verification import get_skill_by_lead, REFERENCE_LEAD_DAYS
+from search import search_weather
+from agr_advices import get_batch_advices
+from profiling import PROFILE_ENABLED, instrument_functions, profile_rerun
+from figures import (
+    COLORS,
+    DASHBOARD_CSS,
+    HEATMAP_PIXELS_PER_DEGREE,
+    HEATMAP_RESOLUTION,
+    MAP_CENTER,
+    build_card_html,
+    build_forecast_skill_figure,
+    build_map_points,
+    interpolation_points,
+    build_temperature_bar_figure,
+    build_temperature_map_figure,
+    build_temperature_range_figure,
+    build_trend_figure,
+    missing_map_locations
 )
 
-# ==================== 色彩主題系統 ====================
-COLORS = {
-    'primary': '#1E88E5',      # 主藍色
-    'dark_blue': '#0D47A1',    # 深藍色
-    'light_blue': '#90CAF9',   # 淺藍色
-    'cold': '#42A5F5',         # 低溫（藍色）
-    'moderate': '#FFA726',     # 中溫（橙色）
-    'hot': '#EF5350',          # 高溫（紅色）
-    'background': '#F5F5F5',   # 背景灰
-    'text_dark': '#263238',    # 深色文字
-    'text_light': '#FFFFFF',   # 淺色文字
+# ==================== 區塊設定 ====================
+# 溫度卡片以外的區塊（選取後才查詢與繪製）
+DASHBOARD_SECTIONS = {
+    'anomaly': '📐 歷史同期',
+    'map': '🗺️ 溫度地圖',
+    'charts': '📊 溫度圖表',
+    'trend': '📈 歷史趨勢',
+    'skill': '🎯 預報校驗',
+    'advice': '🌾 農業氣象',
+    'table': '📋 資料表格',
+    'history': '🔎 歷史查詢',
+    'search': '🔤 全文檢索',
 }
+DEFAULT_SECTIONS = ['table']        # 首次載入時顯示的區塊
 
-# ==================== 地區座標映射 ====================
-# 台灣各地區的代表座標（緯度、經度）
-LOCATION_COORDINATES = {
-    '北部地區': {'lat': 25.0330, 'lon': 121.5654, 'city': '台北'},      # 台北
-    '中部地區': {'lat': 24.1477, 'lon': 120.6736, 'city': '台中'},      # 台中
-    '南部地區': {'lat': 22.9997, 'lon': 120.2270, 'city': '台南'},      # 台南
-    '東北部地區': {'lat': 24.7021, 'lon': 121.7378, 'city': '宜蘭'},    # 宜蘭
-    '東部地區': {'lat': 23.9871, 'lon': 121.6015, 'city': '花蓮'},      # 花蓮
-    '東南部地區': {'lat': 22.7583, 'lon': 121.1444, 'city': '台東'},    # 台東
-}
+# ==================== 地圖設定 ====================
+MAP_ZOOM_LEVELS = [1, 2, 4, 8]        # 地圖可選的放大倍數（放大後只傳送可見範圍內的地區與網格）
+MAP_FULL_VIEW = '全台灣'
 
+# ==================== 趨勢圖設定 ====================
+# 可選的批次範圍（None 為全部；長序列在繪圖前以 LTTB 降採樣，見 figures.py）
+TREND_RANGE_OPTIONS = {'最近 10 批': 10, '最近 100 批': 100, '最近 1000 批': 1000, '全部': None}
+TREND_BATCH_QUERY_LIMIT = 10         # 不超過此批次數時逐批查詢，否則以單一查詢取得
 
-def get_temp_color(temp):
-    """根據溫度返回對應的顏色"""
-    if temp is None:
-        return COLORS['moderate']
-    if temp < 15:
-        return COLORS['cold']
-    elif temp < 25:
-        return COLORS['moderate']
-    else:
-        return COLORS['hot']
+# ==================== 自動初始化設定 ====================
+INIT_POLL_INTERVAL = 2               # 等待背景初始化時檢查資料庫的間隔秒數
+INIT_RETRY_INTERVAL = 30             # 初始化失敗後再次嘗試的間隔秒數
 
 
 def inject_custom_css():
     """注入自訂 CSS 樣式"""
-    st.markdown("""
-        <style>
-        /* 整體頁面樣式 */
-        .main {
-            background-color: #FAFAFA;
-        }
-        
-        /* 溫度卡片樣式 */
-        .temp-card {
-            padding: 20px;
-            border-radius: 12px;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-            margin: 10px 0;
-            transition: transform 0.2s, box-shadow 0.2s;
-            height: 100%;
-        }
-        
-        .temp-card:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 4px 16px rgba(0,0,0,0.15);
-        }
-        
-        .temp-card-location {
-            font-size: 20px;
-            font-weight: bold;
-            margin-bottom: 10px;
-            color: #263238;
-        }
-        
-        .temp-card-temp {
-            font-size: 36px;
-            font-weight: bold;
-            margin: 10px 0;
-        }
-        
-        .temp-card-desc {
-            font-size: 14px;
-            color: #546E7A;
-            margin-top: 8px;
-        }
-        
-        .temp-label {
-            font-size: 12px;
-            color: #78909C;
-            margin-right: 5px;
-        }
-        
-        /* 統計卡片增強 */
-        .stat-card {
-            background: linear-gradient(135deg, #1E88E5 0%, #1565C0 100%);
-            padding: 20px;
-            border-radius: 10px;
-            color: white;
-            text-align: center;
-        }
-        
-        /* 標題樣式 */
-        .cwa-title {
-            color: #0D47A1;
-            font-size: 42px;
-            font-weight: 700;
-            margin-bottom: 10px;
-            text-align: center;
-        }
-        
-        .cwa-subtitle {
-            color: #546E7A;
-            font-size: 16px;
-            text-align: center;
-            margin-bottom: 30px;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    st.markdown(f"<style>{DASHBOARD_CSS}</style>", unsafe_allow_html=True)
 
 
 def render_header():
@@ -179,103 +129,104 @@ def render_temperature_cards(weather_data):
         col_idx = idx % num_cols
         
         with cols[col_idx]:
-            location = location_data['location']
-            min_temp = location_data['min_temp']
-            max_temp = location_data['max_temp']
-            description = location_data['description']
-            
-            # 根據平均溫度決定卡片顏色
-            avg_temp = (min_temp + max_temp) / 2 if min_temp and max_temp else 20
-            card_color = get_temp_color(avg_temp)
-            
             # 使用 HTML 渲染卡片
-            st.markdown(f"""
-                <div class="temp-card" style="background: linear-gradient(135deg, {card_color}22 0%, {card_color}44 100%); border-left: 4px solid {card_color};">
-                    <div class="temp-card-location">{location}</div>
-                    <div class="temp-card-temp" style="color: {card_color};">
-                        {min_temp}°C - {max_temp}°C
-                    </div>
-                    <div class="temp-card-desc">
-                        <span class="temp-label">天氣：</span>{description}
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
+            st.markdown(build_card_html(location_data), unsafe_allow_html=True)
             
             # 添加一些空間
             st.markdown("<div style='margin-bottom: 10px;'></div>", unsafe_allow_html=True)
 
 
+@st.cache_data(ttl=300, show_spinner=False)
+def load_batch_anomalies(batch_id):
+    """查詢批次距平（氣候統計只在匯入時更新，短暫快取即可）"""
+    return get_batch_anomalies(batch_id)
+
+
+def render_anomaly_panel(batch_id):
+    """渲染與歷史同期比較的距平面板"""
+    st.subheader("📐 與歷史同期比較")
+    
+    if get_repository().name != 'sqlite':
+        st.info("距平分析目前僅支援 SQLite 儲存後端")
+        return
+    
+    df = load_batch_anomalies(batch_id)
+    if df.empty or df[['z_min', 'z_max']].isna().all().all():
+        st.info(f"歷史同期資料不足（每個地區至少需要 {MIN_SAMPLES} 筆），累積更多批次後即可比較")
+        return
+    
+    display_columns = {
+        'location': '地區',
+        'max_temp': '最高溫度 (°C)',
+        'mean_max': '同期平均最高 (°C)',
+        'anomaly_max': '最高溫距平 (°C)',
+        'z_max': '最高溫 z 分數',
+        'percentile_max': '最高溫百分位',
+        'min_temp': '最低溫度 (°C)',
+        'mean_min': '同期平均最低 (°C)',
+        'anomaly_min': '最低溫距平 (°C)',
+        'z_min': '最低溫 z 分數',
+        'percentile_min': '最低溫百分位',
+    }
+    df_display = df[list(display_columns.keys())].copy()
+    df_display.columns = list(display_columns.values())
+    
+    temp_format = st.column_config.NumberColumn(format="%.1f°C")
+    st.dataframe(
+        df_display,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            **{name: temp_format for name in display_columns.values() if '°C' in name},
+            '最高溫 z 分數': st.column_config.NumberColumn(format="%+.2f"),
+            '最低溫 z 分數': st.column_config.NumberColumn(format="%+.2f"),
+            '最高溫百分位': st.column_config.ProgressColumn(format="%.0f", min_value=0, max_value=100),
+            '最低溫百分位': st.column_config.ProgressColumn(format="%.0f", min_value=0, max_value=100),
+        }
+    )
+    st.caption(f"同期為前後 {CLIMATOLOGY_WINDOW_DAYS} 天；百分位依常態分布估計，|z| ≥ 2 表示明顯偏離歷史同期")
+
+
 def render_temperature_bar_chart(weather_data):
     """渲染溫度條形圖"""
     st.subheader("📊 溫度對比圖")
     
-    # 準備資料
-    locations = [d['location'] for d in weather_data]
-    min_temps = [d['min_temp'] for d in weather_data]
-    max_temps = [d['max_temp'] for d in weather_data]
-    
-    # 建立 Plotly 圖表
-    fig = go.Figure()
-    
-    # 最低溫度條
-    fig.add_trace(go.Bar(
-        name='最低溫度',
-        x=locations,
-        y=min_temps,
-        marker_color=COLORS['cold'],
-        text=min_temps,
-        texttemplate='%{text}°C',
-        textposition='outside',
-        hovertemplate='<b>%{x}</b><br>最低溫度: %{y}°C<extra></extra>'
-    ))
-    
-    # 最高溫度條
-    fig.add_trace(go.Bar(
-        name='最高溫度',
-        x=locations,
-        y=max_temps,
-        marker_color=COLORS['hot'],
-        text=max_temps,
-        texttemplate='%{text}°C',
-        textposition='outside',
-        hovertemplate='<b>%{x}</b><br>最高溫度: %{y}°C<extra></extra>'
-    ))
-    
-    # 更新佈局
-    fig.update_layout(
-        barmode='group',
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        font=dict(family="Arial, sans-serif", size=12, color=COLORS['text_dark']),
-        xaxis=dict(
-            title='地區',
-            showgrid=False,
-            showline=True,
-            linecolor='lightgray'
-        ),
-        yaxis=dict(
-            title='溫度 (°C)',
-            showgrid=True,
-            gridcolor='lightgray',
-            showline=True,
-            linecolor='lightgray'
-        ),
-        hovermode='x unified',
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        ),
-        height=400
-    )
-    
+    fig = build_temperature_bar_figure(weather_data)
     st.plotly_chart(fig, use_container_width=True)
 
 
+@st.cache_resource(ttl=3600)
+def get_station_registry():
+    """測站座標與空間索引（行程共用；以 stations.py --load 更新後，快取過期時生效）"""
+    return load_station_registry()
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def compute_temperature_surface(batch_id, resolution):
+    """計算批次的溫度內插網格（依 batch_id 與解析度快取，重新執行時不重算）"""
+    map_data = build_map_points(get_weather_by_batch(batch_id), get_station_registry().coordinates())
+    points = interpolation_points(map_data)
+    return temperature_surface(
+        points['lon'],
+        points['lat'],
+        points['value'],
+        resolution=resolution
+    )
+
+
+@st.cache_data(ttl=300, max_entries=64, show_spinner=False)
+def load_batch_weather(batch_id):
+    """查詢單一批次的資料（拖動滑桿來回查看同一批次時不再查詢資料庫）"""
+    return get_weather_by_batch(batch_id)
+
+
+@st.fragment
 def render_taiwan_temperature_map_enhanced(batches):
-    """渲染增強版台灣溫度分布地圖 (CWA 風格)"""
+    """
+    渲染增強版台灣溫度分布地圖 (CWA 風格)
+    
+    以片段（fragment）執行：拖動批次滑桿只重新執行地圖區塊，不重建頁面其他部分。
+    """
     st.subheader("🗺️ 台灣溫度分布地圖")
     
     # 動畫控制 (C): 如果有多個批次，顯示動畫控制
@@ -291,7 +242,8 @@ def render_taiwan_temperature_map_enhanced(batches):
                 max_value=len(batches) - 1,
                 value=0,
                 format="批次 %d",
-                help="拖動滑桿查看不同時間的溫度分布"
+                help="拖動滑桿查看不同時間的溫度分布",
+                key='map_batch_index'
             )
         
         with col2:
@@ -299,138 +251,53 @@ def render_taiwan_temperature_map_enhanced(batches):
         
         # 顯示選中批次的時間資訊
         batch_id, count, created_at = batches[selected_batch_idx]
-        st.info(f"📅 批次時間：{created_at} | 批次 ID: {batch_id} | 資料筆數: {count}")
+        st.info(f"📅 批次時間：{created_at} | 批次 ID: {format_batch_id(batch_id)} | 資料筆數: {count}")
     else:
         # 只有一個批次
         batch_id =batches[0][0]
-        st.info(f"📌 當前批次：{batch_id}")
+        st.info(f"📌 當前批次：{format_batch_id(batch_id)}")
     
     # 獲取選定批次的資料
-    weather_data = get_weather_by_batch(batch_id)
+    weather_data = load_batch_weather(batch_id)
     
     if not weather_data:
         st.warning("無法顯示地圖：沒有可用的天氣資料")
         return
     
-    # 準備地圖資料
-    map_data = []
-    for location_data in weather_data:
-        location = location_data['location']
-        if location in LOCATION_COORDINATES:
-            coords = LOCATION_COORDINATES[location]
-            min_temp = location_data['min_temp']
-            max_temp = location_data['max_temp']
-            avg_temp = (min_temp + max_temp) / 2 if min_temp and max_temp else 20
-            
-            map_data.append({
-                'location': location,
-                'city': coords['city'],
-                'lat': coords['lat'],
-                'lon': coords['lon'],
-                'min_temp': min_temp,
-                'max_temp': max_temp,
-                'avg_temp': avg_temp,
-                'description': location_data['description'],
-                'color': get_temp_color(avg_temp)
-            })
+    # 準備地圖資料（座標來自測站登錄，見 stations.py）
+    registry = get_station_registry()
+    coordinates = registry.coordinates()
+    map_data = build_map_points(weather_data, coordinates)
+    missing = missing_map_locations(weather_data, coordinates)
+    if missing:
+        st.caption(f"⚠️ 以下地區沒有座標，未顯示在地圖上：{'、'.join(missing)}")
     
     if not map_data:
         st.warning("無法顯示地圖：缺少地理座標資料")
         return
     
-    # 建立 Plotly 地圖
-    fig = go.Figure()
-    
-    # 熱力圖效果 (A): 為每個位置添加多層漸變色圈模擬溫度擴散
-    for data in map_data:
-        # 添加3層光暈效果（由外到內）
-        for layer in range(3, 0, -1):
-            size = 80 * layer  # 外層更大
-            opacity = 0.15 / layer  # 外層更透明
-            
-            fig.add_trace(go.Scattergeo(
-                lon=[data['lon']],
-                lat=[data['lat']],
-                mode='markers',
-                marker=dict(
-                    size=size,
-                    color=data['color'],
-                    opacity=opacity,
-                    line=dict(width=0)
-                ),
-                showlegend=False,
-                hoverinfo='skip'
-            ))
-        
-        # 添加中心標記點（最清晰）
-        marker_size = 20 + (data['avg_temp'] - 15) * 1.5
-        marker_size = max(20, min(marker_size, 45))
-        
-        fig.add_trace(go.Scattergeo(
-            lon=[data['lon']],
-            lat=[data['lat']],
-            text=f"{data['city']}<br>{data['avg_temp']:.1f}°C",
-            mode='markers+text',
-            name=data['location'],
-            marker=dict(
-                size=marker_size,
-                color=data['color'],
-                line=dict(width=3, color='white'),
-                opacity=0.9
-            ),
-            textposition='top center',
-            textfont=dict(
-                size=13,
-                color=COLORS['text_dark'],
-                family='Arial Black',
-            ),
-            hovertemplate=(
-                f"<b>{data['location']}</b> ({data['city']})<br>"
-                f"🌡️ 溫度範圍: {data['min_temp']}°C - {data['max_temp']}°C<br>"
-                f"📊 平均溫度: {data['avg_temp']:.1f}°C<br>"
-                f"☁️ 天氣: {data['description']}<br>"
-                "<extra></extra>"
-            ),
-            showlegend=False
-        ))
-    
-    # 改進地圖樣式 (B): 更詳細的台灣地圖設定
-    fig.update_geos(
-        center=dict(lat=23.7, lon=120.9),  # 調整中心點以更好地框住台灣
-        projection_scale=25,                # 增加縮放以顯示更多細節
-        showcountries=True,
-        countrycolor='#CCCCCC',
-        showland=True,
-        landcolor='#F0F0F0',              # 淺灰色陸地
-        showocean=True,
-        oceancolor='#E3F2FD',             # 淺藍色海洋
-        coastlinecolor='#78909C',         # 深灰色海岸線
-        coastlinewidth=1.5,
-        showlakes=True,
-        lakecolor='#BBDEFB',
-        projection_type='mercator',
-        visible=True,
-        resolution=50,                     # 提高解析度
-        showframe=True,
-        framecolor='#BDBDBD',
-        framewidth=1
-    )
-    
-    # 更新佈局
-    fig.update_layout(
-        height=550,
-        margin=dict(l=0, r=0, t=10, b=0),
-        paper_bgcolor='#FAFAFA',
-        font=dict(family="Arial", size=12),
-        geo=dict(
-            bgcolor='#FFFFFF',
-        ),
-        hoverlabel=dict(
-            bgcolor="white",
-            font_size=13,
-            font_family="Arial"
-        )
-    )
+    # 縮放與中心：只傳送可見範圍內的地區，並依縮放疏化過於密集的標記
+    col1, col2 = st.columns(2)
+    with col1:
+        zoom = st.select_slider("地圖縮放：", options=MAP_ZOOM_LEVELS, value=1,
+                                format_func=lambda level: f"{level}×", key='map_zoom')
+    with col2:
+        center_name = st.selectbox("放大中心：", [MAP_FULL_VIEW] + [d['location'] for d in map_data],
+                                   key='map_center', disabled=zoom == 1)
+    center = next(({'lat': d['lat'], 'lon': d['lon']} for d in map_data
+                   if zoom > 1 and d['location'] == center_name), MAP_CENTER)
+    bounds = view_bounds(center['lon'], center['lat'], zoom)
+    visible = set(registry.visible([d['location'] for d in map_data], bounds,
+                                   HEATMAP_PIXELS_PER_DEGREE * zoom))
+    visible_data = [d for d in map_data if d['location'] in visible]
+    if len(visible_data) < len(map_data):
+        st.caption(f"顯示 {len(visible_data)} / {len(map_data)} 個地區（範圍外或過於密集的地區已略過，放大可顯示更多）")
+    
+    # 熱力圖效果 (A): 以 IDW 內插的溫度網格作為單一圖層（依批次快取，放大時只保留可見的網格）
+    surface = compute_temperature_surface(batch_id, HEATMAP_RESOLUTION)
+    if zoom > 1:
+        surface = crop_surface(surface, bounds)
+    fig = build_temperature_map_figure(visible_data, surface, HEATMAP_RESOLUTION, zoom, center)
     
     st.plotly_chart(fig, use_container_width=True)
     
@@ -475,10 +342,8 @@ def render_taiwan_temperature_map_enhanced(batches):
         )
 
 
-def render_taiwan_temperature_map(weather_data):
-    """渲染台灣溫度分布地圖（簡化版，向後兼容）"""
-    # 獲取批次列表
-    batches = get_batch_list()
+def render_taiwan_temperature_map(batches):
+    """渲染台灣溫度分布地圖（簡化版，向後兼容；批次列表由呼叫端傳入，不重複查詢）"""
     # 調用增強版函數
     render_taiwan_temperature_map_enhanced(batches)
 
@@ -487,83 +352,109 @@ def render_temperature_range_chart(weather_data):
     """渲染溫度範圍圖"""
     st.subheader("🌡️ 溫度範圍分布")
     
-    # 準備資料
-    locations = [d['location'] for d in weather_data]
-    min_temps = [d['min_temp'] for d in weather_data]
-    max_temps = [d['max_temp'] for d in weather_data]
-    temp_ranges = [max_t - min_t for min_t, max_t in zip(min_temps, max_temps)]
-    
-    # 建立圖表
-    fig = go.Figure()
-    
-    # 添加範圍條
-    for i, location in enumerate(locations):
-        avg_temp = (min_temps[i] + max_temps[i]) / 2
-        color = get_temp_color(avg_temp)
-        
-        fig.add_trace(go.Scatter(
-            x=[min_temps[i], max_temps[i]],
-            y=[location, location],
-            mode='lines+markers',
-            name=location,
-            line=dict(color=color, width=8),
-            marker=dict(size=12, color=color),
-            hovertemplate=f'<b>{location}</b><br>溫度範圍: {min_temps[i]}°C - {max_temps[i]}°C<br>溫差: {temp_ranges[i]}°C<extra></extra>',
-            showlegend=False
-        ))
-    
-    # 更新佈局
-    fig.update_layout(
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        font=dict(family="Arial, sans-serif", size=12, color=COLORS['text_dark']),
-        xaxis=dict(
-            title='溫度 (°C)',
-            showgrid=True,
-            gridcolor='lightgray',
-            showline=True,
-            linecolor='lightgray'
-        ),
-        yaxis=dict(
-            title='',
-            showgrid=False,
-            showline=False
-        ),
-        height=300,
-        hovermode='closest'
-    )
+    fig = build_temperature_range_figure(weather_data)
     
     st.plotly_chart(fig, use_container_width=True)
 
 
+@st.cache_data(ttl=300, max_entries=16, show_spinner=False)
+def query_trend_frame(recent_batches):
+    """
+    從資料庫查詢趨勢圖使用的批次資料（沒有歷史快取時使用）
+    
+    Args:
+        recent_batches: ((batch_id, count, created_at), ...)
+    
+    Returns:
+        pd.DataFrame: 含 batch_time 欄位，沒有資料時返回 None
+    """
+    if len(recent_batches) <= TREND_BATCH_QUERY_LIMIT:
+        # 收集所有批次的資料
+        all_data = []
+        for batch_id, count, created_at in recent_batches:
+            batch_data = get_weather_by_batch(batch_id)
+            for item in batch_data:
+                item['batch_time'] = created_at[:16]  # 只取到分鐘
+                all_data.append(item)
+        
+        if not all_data:
+            return None
+        
+        df = pd.DataFrame(all_data)
+    else:
+        # 批次很多時以單一查詢取得：最近的批次即依批次 ID 遞減的前幾筆
+        rows, _ = query_weather(start_date=min(created_at for _, _, created_at in recent_batches)[:10],
+                                sort_by='batch_id', descending=True,
+                                limit=sum(count for _, count, _ in recent_batches))
+        if not rows:
+            return None
+        
+        batch_times = {batch_id: created_at[:16] for batch_id, _, created_at in recent_batches}
+        df = pd.DataFrame(rows)
+        df = df[df['batch_id'].isin(batch_times)].copy()
+        df['batch_time'] = df['batch_id'].map(batch_times)
+    return df
+
+
+def load_trend_frame(recent_batches, columns, locations=None):
+    """
+    取得趨勢圖使用的批次資料（只包含指定的欄位與地區）
+    
+    優先由共享的歷史快取（記憶體映射，多個伺服器行程共用）在 Arrow 端篩選，
+    只轉換要繪製的窄表；此路徑不經 st.cache_data，避免每個快取項目各保存一份歷史。
+    
+    Args:
+        recent_batches: ((batch_id, count, created_at), ...)
+        columns: 需要的欄位（batch_time 另外加上）
+        locations: 只取這些地區，None 表示全部
+    
+    Returns:
+        pd.DataFrame: 含 batch_time 欄位，沒有資料時返回 None
+    """
+    df = get_history_frame([batch_id for batch_id, _, _ in recent_batches],
+                           columns=['batch_id', *columns], locations=locations)
+    if df is None or df.empty:
+        df = query_trend_frame(recent_batches)
+        if df is None:
+            return None
+        if locations is not None:
+            df = df[df['location'].isin(locations)]
+        return df[['batch_id', *columns, 'batch_time']]
+    
+    batch_times = {batch_id: created_at[:16] for batch_id, _, created_at in recent_batches}
+    df['batch_time'] = df['batch_id'].map(batch_times)
+    df['location'] = df['location'].astype(str)
+    return df
+
+
+@st.fragment
 def render_trend_chart(batches):
-    """渲染歷史趨勢圖（如果有多個批次）"""
+    """
+    渲染歷史趨勢圖（如果有多個批次）
+    
+    以片段執行：切換範圍、地區或溫度類型只重新繪製趨勢圖（見 load_trend_frame）。
+    """
     if len(batches) < 2:
         return
     
     st.subheader("📈 歷史溫度趨勢")
     
-    # 收集所有批次的資料
-    all_data = []
-    for batch_id, count, created_at in batches[:10]:  # 最多顯示最近 10 個批次
-        batch_data = get_weather_by_batch(batch_id)
-        for item in batch_data:
-            item['batch_time'] = created_at[:16]  # 只取到分鐘
-            all_data.append(item)
-    
-    if not all_data:
+    # 預設顯示最近 10 個批次；較長的範圍在繪圖時降採樣
+    trend_range = st.radio("顯示範圍：", list(TREND_RANGE_OPTIONS), horizontal=True, key='trend_range')
+    recent_batches = tuple(tuple(batch) for batch in batches[:TREND_RANGE_OPTIONS[trend_range]])
+    location_df = load_trend_frame(recent_batches, ['location'])
+    if location_df is None:
         return
     
-    df = pd.DataFrame(all_data)
-    
     # 獲取所有獨特的地區
-    locations = df['location'].unique()
+    locations = sorted(location_df['location'].unique())
     
     # 讓用戶選擇要顯示的地區
     selected_locations = st.multiselect(
         "選擇要顯示的地區：",
         options=list(locations),
-        default=list(locations[:3]) if len(locations) >= 3 else list(locations)
+        default=list(locations[:3]) if len(locations) >= 3 else list(locations),
+        key='trend_locations'
     )
     
     if not selected_locations:
@@ -571,56 +462,67 @@ def render_trend_chart(batches):
         return
     
     # 選擇顯示最低溫或最高溫
-    temp_type = st.radio("選擇溫度類型：", ["最低溫度", "最高溫度"], horizontal=True)
+    temp_type = st.radio("選擇溫度類型：", ["最低溫度", "最高溫度"], horizontal=True, key='trend_temp_type')
     temp_col = 'min_temp' if temp_type == "最低溫度" else 'max_temp'
     
+    # 只取選取的地區與溫度欄位
+    df = load_trend_frame(recent_batches, ['location', temp_col], selected_locations)
+    if df is None:
+        return
+    
     # 建立趨勢圖
-    fig = go.Figure()
+    fig = build_trend_figure(df, selected_locations, temp_col, temp_type)
     
-    for location in selected_locations:
-        location_df = df[df['location'] == location].sort_values('batch_time')
-        
-        fig.add_trace(go.Scatter(
-            x=location_df['batch_time'],
-            y=location_df[temp_col],
-            mode='lines+markers',
-            name=location,
-            line=dict(width=2),
-            marker=dict(size=8),
-            hovertemplate=f'<b>{location}</b><br>時間: %{{x}}<br>{temp_type}: %{{y}}°C<extra></extra>'
-        ))
-    
-    # 更新佈局
-    fig.update_layout(
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        font=dict(family="Arial, sans-serif", size=12, color=COLORS['text_dark']),
-        xaxis=dict(
-            title='批次時間',
-            showgrid=True,
-            gridcolor='lightgray',
-            showline=True,
-            linecolor='lightgray'
-        ),
-        yaxis=dict(
-            title=f'{temp_type} (°C)',
-            showgrid=True,
-            gridcolor='lightgray',
-            showline=True,
-            linecolor='lightgray'
-        ),
-        hovermode='x unified',
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        ),
-        height=400
-    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_forecast_skill():
+    """查詢各預報時效的校驗結果（僅 SQLite 後端）"""
+    if get_repository().name != 'sqlite':
+        return pd.DataFrame()
+    return get_skill_by_lead()
+
+
+def render_forecast_skill_panel(skill):
+    """渲染依預報時效的校驗圖（偏差與平均絕對誤差）"""
+    st.subheader("🎯 預報校驗（依預報時效）")
     
+    fig = build_forecast_skill_figure(skill)
     st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"以時效 {REFERENCE_LEAD_DAYS} 天的預報為基準；偏差為正表示較長時效的預報偏高。"
+               f"樣本數：{int(skill['n'].sum())} 組配對")
+
+
+@st.cache_data(ttl=300, max_entries=32, show_spinner=False)
+def load_batch_advices(batch_id):
+    """查詢批次的天氣概況與農業氣象資料（僅 SQLite 後端）"""
+    if get_repository().name != 'sqlite':
+        return {'profile': None, 'degree_days': [], 'crop_stages': []}
+    return get_batch_advices(batch_id)
+
+
+def render_advice_panel(advices):
+    """渲染天氣概況與農業氣象資料（生長度日、作物生育期積溫）"""
+    st.subheader("🌾 天氣概況與農業氣象")
+    
+    if advices['profile']:
+        st.markdown(advices['profile'])
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if advices['degree_days']:
+            df = pd.DataFrame(advices['degree_days'])
+            df = df.pivot(index='forecast_date', columns='location', values='degree_day')
+            st.caption("逐日生長度日（°C·日）")
+            st.dataframe(df, use_container_width=True)
+    with col2:
+        if advices['crop_stages']:
+            df = pd.DataFrame(advices['crop_stages'])[
+                ['crop', 'location', 'breed', 'stage', 'growing_days', 'accumulated_temperature']]
+            df.columns = ['作物', '地區', '品種', '生育期', '日數', '積溫 (°C·日)']
+            st.caption("作物生育期積溫")
+            st.dataframe(df, use_container_width=True, hide_index=True)
 
 
 def render_enhanced_data_table(weather_data):
@@ -640,8 +542,9 @@ def render_enhanced_data_table(weather_data):
         'fetch_time': '獲取時間'
     }
     
-    # 選擇要顯示的欄位
+    # 選擇要顯示的欄位（批次 ID 以文字格式顯示）
     df_display = df[list(display_columns.keys())].copy()
+    df_display['batch_id'] = df_display['batch_id'].map(format_batch_id)
     df_display.columns = list(display_columns.values())
     
     # 使用可互動的資料表
@@ -662,43 +565,223 @@ def render_enhanced_data_table(weather_data):
     return df_display
 
 
-def auto_initialize_database():
-    """自動抓取一批資料並初始化資料庫（用於 Streamlit Cloud）"""
-    try:
-        from fetch_weather import fetch_weather_data, parse_weather_json
-        from datetime import datetime
-        
-        with st.spinner('🔄 正在初始化資料庫...'):
-            json_data = fetch_weather_data()
-            if json_data:
-                weather_list = parse_weather_json(json_data)
-                if weather_list:
-                    batch_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    insert_weather_data(weather_list, batch_id)
-                    st.success(f'✅ 成功初始化資料庫！載入了 {len(weather_list)} 筆資料')
-                    return True
-        st.error('❌ 初始化失敗：無法解析資料')
-        return False
-    except Exception as e:
-        st.error(f'❌ 初始化失敗：{e}')
-        import traceback
-        st.code(traceback.format_exc())
-        return False
+HISTORY_SORT_OPTIONS = {
+    '建立時間': 'created_at',
+    '地區': 'location',
+    '最低溫度': 'min_temp',
+    '最高溫度': 'max_temp',
+    '天氣描述': 'description',
+    '批次 ID': 'batch_id',
+}
+
+
+@st.cache_data(ttl=60, max_entries=64, show_spinner=False)
+def load_history_page(locations, start_date, end_date, description, sort_by, descending, page):
+    """查詢歷史資料的單一頁面（篩選、排序與分頁都在資料庫端執行）"""
+    return query_weather(list(locations), start_date, end_date, description,
+                         sort_by, descending, WEATHER_PAGE_SIZE, (page - 1) * WEATHER_PAGE_SIZE)
+
+
+@st.fragment
+def render_history_table(location_options):
+    """渲染歷史資料查詢表格（只查詢並傳送目前頁面）"""
+    st.subheader("🔎 歷史資料查詢")
+    
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        locations = st.multiselect("地區：", options=location_options, key='history_locations')
+    with col2:
+        date_range = st.date_input("日期範圍：", value=(), key='history_dates')
+    with col3:
+        description = st.text_input("天氣描述包含：", key='history_description').strip()
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        sort_label = st.selectbox("排序欄位：", options=list(HISTORY_SORT_OPTIONS), key='history_sort')
+    with col2:
+        descending = st.toggle("遞減排序", value=True, key='history_descending')
+    
+    # 選取日期範圍途中只有起始日
+    start_date = date_range[0].isoformat() if len(date_range) >= 1 else None
+    end_date = date_range[1].isoformat() if len(date_range) == 2 else None
+    
+    # 篩選或排序條件改變時回到第一頁
+    filters = (tuple(locations), start_date, end_date, description,
+               HISTORY_SORT_OPTIONS[sort_label], descending)
+    if st.session_state.get('history_filters') != filters:
+        st.session_state['history_filters'] = filters
+        st.session_state['history_page'] = 1
+    
+    rows, total = load_history_page(*filters, st.session_state.get('history_page', 1))
+    page_count = max(1, -(-total // WEATHER_PAGE_SIZE))
+    if st.session_state.get('history_page', 1) > page_count:
+        st.session_state['history_page'] = page_count
+        rows, total = load_history_page(*filters, page_count)
+    
+    if not rows:
+        st.info("沒有符合條件的資料")
+        return
+    
+    df = pd.DataFrame(rows)[['location', 'min_temp', 'max_temp', 'description', 'batch_id', 'created_at']]
+    df['batch_id'] = df['batch_id'].map(format_batch_id)
+    df.columns = ['地區', '最低溫度 (°C)', '最高溫度 (°C)', '天氣描述', '批次 ID', '建立時間']
+    st.dataframe(
+        df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            '最低溫度 (°C)': st.column_config.NumberColumn(format="%.1f°C"),
+            '最高溫度 (°C)': st.column_config.NumberColumn(format="%.1f°C"),
+        }
+    )
+    
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        st.number_input("頁碼：", min_value=1, max_value=page_count, step=1, key='history_page')
+    with col2:
+        st.caption(f"第 {st.session_state['history_page']} / {page_count} 頁，"
+                   f"共 {total} 筆符合條件（每頁 {WEATHER_PAGE_SIZE} 筆）")
+
+
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def load_search_results(query):
+    return search_weather(query)
+
+
+@st.fragment
+def render_text_search():
+    """渲染全文檢索（以 text_index 找出提到關鍵字的批次與地區）"""
+    st.subheader("🔤 全文檢索")
+    
+    query = st.text_input("關鍵字（以空白分隔多個關鍵字）：", key='text_search',
+                          placeholder="例如：短暫雨、多雲 午後").strip()
+    if not query:
+        return
+    
+    results = load_search_results(query)
+    if not results:
+        st.info(f"沒有提到「{query}」的資料")
+        return
+    
+    df = pd.DataFrame(results)[['source', 'date', 'location', 'text', 'batch_id']]
+    df['batch_id'] = df['batch_id'].map(format_batch_id)
+    df.columns = ['來源', '日期', '地區', '內容', '批次 ID']
+    st.dataframe(df, use_container_width=True, hide_index=True)
+    st.caption(f"共 {len(df)} 筆（由新到舊）")
+
+
+@st.cache_resource
+def prepare_database():
+    """建立或遷移資料表結構（每個行程只執行一次）"""
+    return init_database()
+
+
+@st.cache_resource
+def get_refresh_worker():
+    """取得行程共用的背景更新執行緒（所有 session 共用同一個）"""
+    worker = RefreshWorker()
+    worker.start()
+    return worker
+
+
+@st.fragment(run_every=INIT_POLL_INTERVAL)
+def render_initialization_status():
+    """等待背景初始化完成，資料寫入後重新載入整個頁面"""
+    stats = get_database_stats()
+    if stats and stats['total_records'] > 0:
+        st.rerun(scope="app")
+    
+    worker = get_refresh_worker()
+    status = worker.status()
+    if not status['running'] and status['last_run'] and \
+            time.time() - status['last_run'] > INIT_RETRY_INTERVAL:
+        worker.request_refresh()
+    
+    if status['last_error']:
+        st.error(f"❌ 初始化失敗：{status['last_error']}，稍後將自動重試")
+    else:
+        st.info('🔄 資料庫為空，正在背景下載第一批資料，完成後頁面會自動更新...')
 
 
 def ensure_database_initialized():
     """確保資料庫已初始化（用於 Streamlit Cloud）"""
     try:
+        prepare_database()
+        worker = get_refresh_worker()
         stats = get_database_stats()
-        if stats and stats['total_records'] == 0:
-            st.info('⚠️ 資料庫為空，正在自動初始化...')
-            if auto_initialize_database():
-                st.rerun()  # 重新載入以顯示新資料
     except Exception as e:
         st.warning(f'資料庫檢查失敗：{e}')
+        return
+    
+    if not stats or stats['total_records'] > 0:
+        return
+    
+    # 由背景執行緒下載（跨行程鎖確保只有一個下載者），頁面不阻塞
+    worker.request_refresh()
+    render_initialization_status()
+    st.stop()
+
+
+def render_section_selector():
+    """
+    渲染區塊選擇器，返回要顯示的區塊
+    
+    未選取的區塊不查詢資料也不建立圖表，首次載入只需要統計、批次列表與溫度卡片。
+    """
+    options = [key for key in DASHBOARD_SECTIONS
+               if key != 'search' or get_repository().name == 'sqlite']
+    sections = st.segmented_control(
+        "🧩 顯示更多區塊：",
+        options=options,
+        format_func=DASHBOARD_SECTIONS.get,
+        selection_mode="multi",
+        default=[key for key in DEFAULT_SECTIONS if key in options],
+        key='visible_sections'
+    )
+    return set(sections or [])
+
+
+def render_profile_panel(profile):
+    """在側邊欄渲染本次重新執行的效能分析（各函數耗時與 SQL 陳述式）"""
+    with st.sidebar:
+        st.subheader("⏱️ 效能分析")
+        st.caption(f"本次重新執行 {profile.elapsed * 1000:.0f} ms，"
+                   f"SQL 陳述式 {sum(profile.statements.values())} 個")
+        
+        df = profile.call_frame()
+        df.columns = ['類型', '函數', '次數', '總耗時 (ms)', '最長 (ms)']
+        st.dataframe(
+            df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                '總耗時 (ms)': st.column_config.NumberColumn(format="%.1f"),
+                '最長 (ms)': st.column_config.NumberColumn(format="%.1f"),
+            }
+        )
+        st.caption("巢狀呼叫的耗時包含內層函數；快取命中的 load_* 函數不會查詢資料庫")
+        
+        with st.expander("SQL 陳述式"):
+            df = profile.statement_frame()
+            df.columns = ['SQL', '次數']
+            st.dataframe(df, use_container_width=True, hide_index=True)
+        
+        if profile.dump_path:
+            st.caption(f"cProfile：{profile.dump_path}")
 
 
 def main():
+    """主函數"""
+    # 以 WEATHER_PROFILE=1 或網址參數 ?profile=1 開啟效能分析
+    profiling_enabled = PROFILE_ENABLED or st.query_params.get('profile') == '1'
+    with profile_rerun(profiling_enabled) as profile:
+        render_dashboard()
+    if profile is not None:
+        render_profile_panel(profile)
+
+
+def render_dashboard():
+    """渲染儀表板頁面"""
     # 設置頁面配置
     st.set_page_config(
         page_title="中央氣象局天氣資料",
@@ -739,27 +822,27 @@ def main():
         st.error("無法獲取批次列表")
         return
     
-    # 創建批次選項
-    batch_options = ["最新資料"] + [
-        f"{batch_id} ({count} 筆) - {created_at}"
+    # 創建批次選項（選項值為整數批次 ID，None 表示最新資料）
+    batch_labels = {
+        batch_id: f"{format_batch_id(batch_id)} ({count} 筆) - {created_at}"
         for batch_id, count, created_at in batches
-    ]
+    }
     
-    selected_option = st.selectbox(
+    selected_batch_id = st.selectbox(
         "選擇要查看的資料批次：",
-        batch_options,
-        index=0
+        [None] + list(batch_labels),
+        index=0,
+        format_func=lambda batch_id: "最新資料" if batch_id is None else batch_labels[batch_id],
+        key='selected_batch'
     )
     
     # 根據選擇獲取資料
-    if selected_option == "最新資料":
+    if selected_batch_id is None:
         weather_data = get_latest_weather()
-        st.info(f"📌 顯示最新一批資料（批次 ID: {batches[0][0]}）")
+        st.info(f"📌 顯示最新一批資料（批次 ID: {format_batch_id(batches[0][0])}）")
     else:
-        # 從選項中提取 batch_id
-        batch_id = selected_option.split(" (")[0]
-        weather_data = get_weather_by_batch(batch_id)
-        st.info(f"📌 顯示批次：{batch_id}")
+        weather_data = get_weather_by_batch(selected_batch_id)
+        st.info(f"📌 顯示批次：{format_batch_id(selected_batch_id)}")
     
     if not weather_data:
         st.warning("該批次沒有資料")
@@ -772,44 +855,93 @@ def main():
     
     st.markdown("---")
     
-    # 台灣溫度分布地圖
-    render_taiwan_temperature_map(weather_data)
+    # 其他區塊只在選取後才查詢資料與建立圖表（選擇保存在工作階段狀態）
+    sections = render_section_selector()
+    batch_id = weather_data[0]['batch_id']
     
-    st.markdown("---")
+    # 與歷史同期比較
+    if 'anomaly' in sections:
+        render_anomaly_panel(batch_id)
+        st.markdown("---")
+    
+    # 台灣溫度分布地圖
+    if 'map' in sections:
+        render_taiwan_temperature_map(batches)
+        st.markdown("---")
     
     # 溫度圖表
-    col1, col2 = st.columns(2)
+    if 'charts' in sections:
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            render_temperature_bar_chart(weather_data)
+        
+        with col2:
+            render_temperature_range_chart(weather_data)
+        
+        st.markdown("---")
     
-    with col1:
-        render_temperature_bar_chart(weather_data)
+    # 歷史趨勢圖（如果有多個批次）
+    if 'trend' in sections:
+        if len(batches) >= 2:
+            render_trend_chart(batches)
+        else:
+            st.info("累積兩個以上的批次後即可顯示歷史趨勢")
+        st.markdown("---")
     
-    with col2:
-        render_temperature_range_chart(weather_data)
+    # 預報校驗（累積連續多天的批次後才有結果）
+    if 'skill' in sections:
+        skill = load_forecast_skill()
+        if not skill.empty:
+            render_forecast_skill_panel(skill)
+        else:
+            st.info("累積連續多天的批次後即可顯示預報校驗")
+        st.markdown("---")
     
-    st.markdown("---")
+    # 天氣概況與農業氣象（同一份回應中的 weatherProfile 與 agrAdvices）
+    if 'advice' in sections:
+        advices = load_batch_advices(batch_id)
+        if advices['profile'] or advices['degree_days'] or advices['crop_stages']:
+            render_advice_panel(advices)
+        else:
+            st.info("這個批次沒有天氣概況與農業氣象資料")
+        st.markdown("---")
     
-    # 歷史趨勢圖（如果有多個批次）
-    if len(batches) >= 2:
-        render_trend_chart(batches)
+    # 資料表格與下載按鈕
+    if 'table' in sections:
+        df_display = render_enhanced_data_table(weather_data)
+        
+        csv = df_display.to_csv(index=False, encoding='utf-8-sig')
+        st.download_button(
+            label="📥 下載為 CSV",
+            data=csv,
+            file_name=f"weather_data_{format_batch_id(batches[0][0])}.csv",
+            mime="text/csv"
+        )
         st.markdown("---")
     
-    # 資料表格
-    df_display = render_enhanced_data_table(weather_data)
+    # 歷史資料查詢（伺服器端篩選與分頁）
+    if 'history' in sections:
+        render_history_table([d['location'] for d in weather_data])
+        st.markdown("---")
     
-    # 下載按鈕
-    st.markdown("---")
-    csv = df_display.to_csv(index=False, encoding='utf-8-sig')
-    st.download_button(
-        label="📥 下載為 CSV",
-        data=csv,
-        file_name=f"weather_data_{batches[0][0]}.csv",
-        mime="text/csv"
-    )
+    # 全文檢索（text_index 只建立在 SQLite 資料庫中）
+    if 'search' in sections:
+        render_text_search()
+        st.markdown("---")
     
     # 頁尾資訊
-    st.markdown("---")
     st.caption("🔗 資料來源：中央氣象局開放資料平台")
     st.caption(f"📊 資料庫檔案：data.db | 最後更新：{stats['latest_record']}")
+    
+    worker_status = get_refresh_worker().status()
+    if worker_status['interval'] > 0:
+        st.caption(f"🔄 背景更新：每 {worker_status['interval'] // 60} 分鐘檢查一次")
+
+
+# 效能分析：記錄各 render_* / load_* 函數的耗時（未開啟時不記錄）
+instrument_functions(globals(), ('render_',), 'render')
+instrument_functions(globals(), ('load_',), 'load')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,264 @@
+"""
+歷史資料重新匯入腳本
+功能：走訪已存檔的 CWA JSON 檔案，以多個行程平行解析，
+      再由單一寫入者以批次交易寫回 weather 資料表（支援中斷後續跑）
+"""
+
+import sys
+import io
+
+# 設置 Windows 終端輸出為 UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+import database
+from batch_keys import (
+    batch_id_from_datetime,
+    batch_id_to_datetime,
+    legacy_batch_id,
+    parse_batch_id
+)
+from fetch_weather import issue_date_from_sent
+from payload_decoder import PAYLOAD_DECODER, decode_payload
+from verification import init_forecast_tables, insert_forecast_batches
+from agr_advices import init_advice_tables, insert_advice_batches
+
+
+CHECKPOINT_FILE = "backfill_checkpoint.json"
+
+
+def find_archive_files(archive_dir: str) -> List[str]:
+    """
+    遞迴列出存檔目錄中的所有 JSON 檔案（依路徑排序）
+
+    Args:
+        archive_dir: 存檔目錄
+
+    Returns:
+        List[str]: JSON 檔案路徑列表
+    """
+    paths = []
+    for root, _, files in os.walk(archive_dir):
+        for name in files:
+            if name.endswith('.json'):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def derive_batch_info(path: str, sent: Optional[str]) -> Tuple[int, Optional[str]]:
+    """
+    推導存檔對應的批次 ID 與建立時間
+
+    檔名為整數批次 ID（main.py 的存檔格式）或舊版的 YYYYMMDD_HHMMSS 時直接沿用，
+    否則使用 API 回應中的發布時間（sent）。
+
+    Args:
+        path: 存檔路徑
+        sent: API 回應的發布時間（ISO 8601），沒有時為 None
+
+    Returns:
+        Tuple[int, str]: (batch_id, created_at)，created_at 為 UTC 時間字串
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+
+    try:
+        batch_id = parse_batch_id(stem)
+    except ValueError:
+        if not sent:
+            return legacy_batch_id(stem), None
+        batch_id = batch_id_from_datetime(datetime.fromisoformat(sent))
+
+    # SQLite 的 CURRENT_TIMESTAMP 為 UTC，保持一致
+    created_at = batch_id_to_datetime(batch_id).strftime("%Y-%m-%d %H:%M:%S")
+    return batch_id, created_at
+
+
+def parse_archive_file(path: str, decoder: Optional[str] = None) -> Dict:
+    """
+    解析單一存檔（在子行程中執行）
+
+    Args:
+        path: 存檔路徑
+        decoder: 解碼器名稱（見 payload_decoder.py），None 時使用 CWA_PAYLOAD_DECODER
+
+    Returns:
+        Dict: {'path', 'batch_id', 'created_at', 'rows', 'issued_date', 'forecasts',
+               'profile', 'advices', 'error'}
+    """
+    try:
+        # 直接解碼原始位元組（快速解碼器只處理需要的欄位）
+        with open(path, 'rb') as f:
+            payload = decode_payload(f.read(), decoder)
+        batch_id, created_at = derive_batch_info(path, payload['sent'])
+        # 沒有發布時間時以批次 ID 的日期作為發布日期
+        issued_date = (issue_date_from_sent(payload['sent']) or
+                       batch_id_to_datetime(batch_id).astimezone().strftime("%Y-%m-%d"))
+        return {'path': path, 'batch_id': batch_id, 'created_at': created_at,
+                'rows': payload['weather'], 'issued_date': issued_date,
+                'forecasts': payload['forecasts'], 'profile': payload['profile'],
+                'advices': payload['advices'], 'error': None}
+    except (OSError, ValueError, TypeError, AttributeError, KeyError) as e:
+        # 結構不符的存檔（例如最上層不是物件）只記錄為失敗，不中斷其他檔案的解析
+        return {'path': path, 'batch_id': None, 'created_at': None,
+                'rows': [], 'issued_date': None, 'forecasts': [],
+                'profile': None, 'advices': None, 'error': str(e)}
+
+
+def load_checkpoint(checkpoint_path: str) -> set:
+    """讀取已完成的檔案列表"""
+    try:
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            return set(json.load(f).get('completed', []))
+    except (OSError, ValueError):
+        return set()
+
+
+def save_checkpoint(checkpoint_path: str, completed: set):
+    """以原子方式寫入檢查點（先寫暫存檔再取代）"""
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'completed': sorted(completed)}, f, ensure_ascii=False)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def run_backfill(archive_dir: str, workers: Optional[int] = None,
+                 files_per_transaction: int = 50,
+                 checkpoint_path: str = CHECKPOINT_FILE,
+                 decoder: Optional[str] = None) -> Dict:
+    """
+    平行解析存檔並批次寫入資料庫
+
+    Args:
+        archive_dir: 存檔目錄
+        workers: 解析行程數（預設為 CPU 核心數）
+        files_per_transaction: 每個寫入交易包含的檔案數
+        checkpoint_path: 檢查點檔案路徑
+        decoder: 解碼器名稱（msgspec、orjson、default 或 auto）
+
+    Returns:
+        Dict: 執行統計
+    """
+    completed = load_checkpoint(checkpoint_path)
+    pending = [p for p in find_archive_files(archive_dir) if p not in completed]
+
+    stats = {'files': len(pending), 'skipped': len(completed),
+             'rows': 0, 'failed': [], 'elapsed': 0.0}
+    if not pending:
+        return stats
+
+    start = time.perf_counter()
+    buffer = []
+    buffer_forecasts = []
+    buffer_advices = []
+    buffer_paths = []
+
+    def flush():
+        inserted = database.insert_weather_batches(buffer)
+        if buffer and inserted == 0 and any(rows for _, rows, _ in buffer):
+            raise RuntimeError("資料寫入失敗，已保留檢查點，可修正後續跑")
+        if not insert_forecast_batches(buffer_forecasts) and any(f for _, _, f in buffer_forecasts):
+            raise RuntimeError("逐日預報寫入失敗，已保留檢查點，可修正後續跑")
+        if (not insert_advice_batches(buffer_advices) and
+                any(profile or any(advices.values()) for _, _, profile, advices in buffer_advices)):
+            raise RuntimeError("農業氣象資料寫入失敗，已保留檢查點，可修正後續跑")
+        stats['rows'] += inserted
+        completed.update(buffer_paths)
+        save_checkpoint(checkpoint_path, completed)
+        print(f"  ✓ 已寫入 {len(completed) - stats['skipped']}/{stats['files']} 個檔案")
+        buffer.clear()
+        buffer_forecasts.clear()
+        buffer_advices.clear()
+        buffer_paths.clear()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map 依輸入順序回傳，寫入順序與批次時間一致
+        for result in executor.map(partial(parse_archive_file, decoder=decoder),
+                                   pending, chunksize=8):
+            if result['error']:
+                stats['failed'].append((result['path'], result['error']))
+                continue
+            buffer.append((result['batch_id'], result['rows'], result['created_at']))
+            buffer_forecasts.append((result['batch_id'], result['issued_date'], result['forecasts']))
+            buffer_advices.append((result['batch_id'], result['issued_date'],
+                                   result['profile'], result['advices']))
+            buffer_paths.append(result['path'])
+            if len(buffer) >= files_per_transaction:
+                flush()
+
+    if buffer:
+        flush()
+
+    stats['elapsed'] = time.perf_counter() - start
+    return stats
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='重新解析並匯入已存檔的 CWA 資料')
+    parser.add_argument('archive_dir', help='存檔目錄（main.py 以 CWA_ARCHIVE_DIR 存檔）')
+    parser.add_argument('--workers', type=int, default=None, help='解析行程數')
+    parser.add_argument('--batch-size', type=int, default=50, help='每個交易包含的檔案數')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE, help='檢查點檔案')
+    parser.add_argument('--decoder', default=PAYLOAD_DECODER,
+                        choices=['auto', 'msgspec', 'orjson', 'default'],
+                        help='JSON 解碼器（auto 依序選擇已安裝的 msgspec、orjson）')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='清空 weather、forecast_days 資料表、月分區與檢查點後重新匯入')
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+
+    print("=" * 60)
+    print("歷史資料重新匯入")
+    print("=" * 60)
+
+    if not database.init_database():
+        sys.exit(1)
+
+    if args.rebuild:
+        conn = database.get_connection()
+        removed = database.clear_partitions(conn)
+        database.clear_weather(conn.cursor())
+        init_forecast_tables(conn)
+        conn.execute("DELETE FROM forecast_days")
+        init_advice_tables(conn)
+        for table in ('weather_profiles', 'degree_days', 'crop_limits', 'crop_stages'):
+            conn.execute(f"DELETE FROM {table}")
+        conn.commit()
+        conn.close()
+        if os.path.exists(args.checkpoint):
+            os.remove(args.checkpoint)
+        print(f"✓ 已清空 weather 與 forecast_days 資料表（刪除 {removed} 個月分區）")
+
+    stats = run_backfill(args.archive_dir, args.workers, args.batch_size, args.checkpoint,
+                         args.decoder)
+
+    # 重新匯入會刪除並重寫批次，氣候統計、預報校驗與歷史快取需完整重建
+    if stats['rows']:
+        from analytics import rebuild_climatology
+        from verification import rebuild_verification
+        rebuild_climatology()
+        rebuild_verification()
+        if os.getenv('WEATHER_HISTORY_CACHE'):
+            from history_cache import publish_history_cache
+            publish_history_cache(rebuild=True)
+
+    print(f"\n處理檔案：{stats['files']}（先前已完成 {stats['skipped']}）")
+    print(f"寫入資料：{stats['rows']} 筆")
+    if stats['elapsed']:
+        print(f"耗時：{stats['elapsed']:.2f} 秒（{stats['files'] / stats['elapsed']:.1f} 檔案/秒）")
+    for path, error in stats['failed']:
+        print(f"✗ 無法解析 {path}：{error}")
+
+    print("=" * 60)
@@ -0,0 +1,178 @@
+"""
+批次 ID 模組
+功能：產生可依時間排序的整數批次 ID（毫秒時間戳 + 行程 + 序號），
+      資料表以整數儲存、比較與排序；文字格式（YYYYMMDD_HHMMSS）只用於顯示
+
+位元配置（共 63 位元，可存入 SQLite INTEGER / DuckDB BIGINT）：
+    [ UTC 毫秒時間戳 43 位元 | 行程 8 位元 | 序號 12 位元 ]
+
+行程欄位只取 PID 的低 8 位元：兩個 PID 低位元相同的行程在同一毫秒、以相同序號產生 ID 時
+會得到相同的值。兩個儲存後端的 insert_weather_data() 都在寫入交易中拒絕已存在的批次 ID，
+衝突的批次會寫入失敗而不會與既有批次合併（背景更新與 main.py 下次執行時重新產生）。
+超過 2^53，JSON 與 JavaScript 需以字串傳遞（render_static.py）。
+"""
+
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Tuple, Union
+
+NODE_BITS = 8           # 行程識別（PID 的低位元），PID 低位元不同的行程同一毫秒內不會衝突
+SEQUENCE_BITS = 12      # 同一行程同一毫秒內的序號
+NODE_MASK = (1 << NODE_BITS) - 1
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+TIMESTAMP_SHIFT = NODE_BITS + SEQUENCE_BITS
+
+# 舊版文字批次 ID（本地時間，精確到秒）
+LABEL_FORMAT = "%Y%m%d_%H%M%S"
+LABEL_PATTERN = re.compile(r"^\d{8}_\d{6}$")
+# 顯示文字（format_batch_id 的輸出，同一毫秒內的批次帶 -序號）
+DISPLAY_PATTERN = re.compile(r"^(\d{8}_\d{6})(?:-(\d+))?$")
+
+_state = {'ms': 0, 'sequence': 0}
+_state_lock = threading.Lock()
+
+
+def compose_batch_id(ms: int, node: int = 0, sequence: int = 0) -> int:
+    return (ms << TIMESTAMP_SHIFT) | ((node & NODE_MASK) << SEQUENCE_BITS) | (sequence & SEQUENCE_MASK)
+
+
+def generate_batch_id() -> int:
+    """
+    生成批次 ID（同一行程內嚴格遞增）
+
+    同一毫秒內以序號區分，序號用完時借用下一毫秒；
+    時鐘倒退時沿用上一次的時間戳，不會產生較小的 ID。
+
+    Returns:
+        int: 批次識別碼
+    """
+    now_ms = time.time_ns() // 1_000_000
+    with _state_lock:
+        if now_ms > _state['ms']:
+            _state['ms'] = now_ms
+            _state['sequence'] = 0
+        else:
+            _state['sequence'] += 1
+            if _state['sequence'] > SEQUENCE_MASK:
+                _state['ms'] += 1
+                _state['sequence'] = 0
+        return compose_batch_id(_state['ms'], os.getpid(), _state['sequence'])
+
+
+def batch_id_from_datetime(moment: datetime) -> int:
+    """由時間建立批次 ID（行程與序號為 0，用於重新匯入與遷移）"""
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    return compose_batch_id(int(moment.timestamp() * 1000))
+
+
+def batch_id_to_datetime(batch_id: int) -> datetime:
+    """批次 ID 對應的時間（UTC）"""
+    ms = batch_id >> TIMESTAMP_SHIFT
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+def format_batch_id(batch_id: Optional[int]) -> str:
+    """
+    顯示用的文字格式（本地時間 YYYYMMDD_HHMMSS，與舊版批次 ID 相同）
+
+    同一毫秒內連續產生的批次加上 -序號；其他情況下同一秒的批次顯示相同，
+    查詢與排序一律使用整數批次 ID。
+    """
+    if batch_id is None:
+        return ''
+    label = batch_id_to_datetime(batch_id).astimezone().strftime(LABEL_FORMAT)
+    sequence = batch_id & SEQUENCE_MASK
+    return f"{label}-{sequence}" if sequence else label
+
+
+def legacy_batch_id(label: str) -> int:
+    """
+    將舊版文字批次 ID 轉換為整數批次 ID
+
+    YYYYMMDD_HHMMSS（本地時間）轉換為該秒的批次 ID；
+    其他文字以 CRC32 對應到固定的值（不具時間意義，會排在所有批次之前）。
+    """
+    label = str(label)
+    if LABEL_PATTERN.match(label):
+        return batch_id_from_datetime(datetime.strptime(label, LABEL_FORMAT).astimezone())
+    if label.isdigit():
+        return int(label)
+    return zlib.crc32(label.encode('utf-8'))
+
+
+def parse_batch_id(value: Union[int, str]) -> int:
+    """接受整數、整數字串或 YYYYMMDD_HHMMSS（命令列參數與存檔檔名使用）"""
+    if isinstance(value, int):
+        return value
+    value = value.strip()
+    if value.isdigit() or LABEL_PATTERN.match(value):
+        return legacy_batch_id(value)
+    raise ValueError(f"無法解析的批次 ID：{value}")
+
+
+def label_batch_range(label: str) -> Tuple[int, int]:
+    """
+    YYYYMMDD_HHMMSS（本地時間）對應的批次 ID 範圍
+
+    顯示文字只精確到秒，該秒內任何毫秒、行程與序號的批次都顯示為相同文字。
+
+    Returns:
+        Tuple[int, int]: (最小批次 ID, 最大批次 ID)，兩端皆包含
+    """
+    start = batch_id_from_datetime(datetime.strptime(label, LABEL_FORMAT).astimezone())
+    ms = start >> TIMESTAMP_SHIFT
+    return start, compose_batch_id(ms + 999, NODE_MASK, SEQUENCE_MASK)
+
+
+def resolve_batch_id(value: Union[int, str], batch_ids: Iterable[int]) -> Optional[int]:
+    """
+    將命令列的批次參數對應到既有批次 ID
+
+    接受整數、整數字串或 format_batch_id() 顯示的文字（YYYYMMDD_HHMMSS[-序號]）；
+    文字對應到該秒內序號相符（沒有 -序號 時為 0）的批次，同一秒有多個時取最新的一個。
+
+    Args:
+        value: 批次參數
+        batch_ids: 既有的批次 ID
+
+    Returns:
+        int: 批次 ID，找不到時返回 None
+    """
+    batch_ids = set(batch_ids)
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value) if int(value) in batch_ids else None
+
+    match = DISPLAY_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"無法解析的批次 ID：{value}")
+    low, high = label_batch_range(match.group(1))
+    candidates = [batch_id for batch_id in batch_ids if low <= batch_id <= high]
+    sequence = int(match.group(2) or 0)
+    candidates = [batch_id for batch_id in candidates if batch_id & SEQUENCE_MASK == sequence]
+    return max(candidates, default=None)
+
+
+# 測試程式碼
+if __name__ == "__main__":
+    print("=" * 60)
+    print("批次 ID 測試")
+    print("=" * 60)
+
+    ids = [generate_batch_id() for _ in range(5)]
+    for batch_id in ids:
+        print(f"  {batch_id} -> {format_batch_id(batch_id)}")
+    print(f"{'✓' if ids == sorted(set(ids)) else '✗'} 連續產生的批次 ID 嚴格遞增")
+
+    legacy = legacy_batch_id('20251211_083000')
+    print(f"✓ 20251211_083000 -> {legacy} -> {format_batch_id(legacy)}")
+
+    label = format_batch_id(ids[-1])
+    print(f"{'✓' if resolve_batch_id(label, ids) == ids[-1] else '✗'} {label} 對應回 {ids[-1]}")
+
+    print("=" * 60)
@@ -0,0 +1,262 @@
+"""
+Streamlit 儀表板負載測試
+功能：以 streamlit.testing.v1.AppTest 在多個行程中同時模擬 N 個使用者工作階段
+      （開啟區塊、拖動地圖批次滑桿、切換批次、翻頁與篩選歷史資料、全文檢索），
+      量測每次重新執行（rerun）的延遲 p50/p95、每次重新執行的 SQL 陳述式數與行程記憶體
+
+每個模擬工作階段在獨立的行程中執行：各行程有自己的 st.cache_data 快取，
+結果相當於每個使用者都沒有共用快取的最差情況；資料庫連線與磁碟 I/O 則實際互相競爭。
+"""
+
+import sys
+import io
+
+# 設置 Windows 終端輸出為 UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+import argparse
+import contextlib
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# resource 只在 Unix 上提供（Windows 不回報記憶體用量）
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import database
+from batch_keys import batch_id_from_datetime
+from bench_storage import generate_batches
+
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+# 使用者操作與權重（拖動滑桿最常見，每次拖動會連續觸發數次重新執行）
+ACTIONS = {
+    'map_slider': 5,
+    'select_batch': 2,
+    'history_page': 2,
+    'history_filter': 1,
+    'search': 1,
+}
+SEARCH_TERMS = ['短暫雨', '多雲', '雨', '晴時多雲']
+
+# 首次載入後開啟的儀表板區塊（見 app.DASHBOARD_SECTIONS；未開啟的區塊沒有對應的操作）
+DEFAULT_SESSION_SECTIONS = ['anomaly', 'map', 'charts', 'trend', 'table', 'history', 'search']
+
+
+def generate_database(path: str, batch_count: int, interval_hours: float = 3, seed: int = 0) -> int:
+    """
+    產生合成資料庫（每 interval_hours 小時一個批次，最新的批次為目前時間）
+
+    Returns:
+        int: 寫入的資料筆數
+    """
+    database.DATABASE_NAME = path
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    batches = []
+    for index, rows in enumerate(generate_batches(batch_count, seed)):
+        created = now - timedelta(hours=interval_hours * (batch_count - 1 - index))
+        batches.append((batch_id_from_datetime(created), rows, created.strftime("%Y-%m-%d %H:%M:%S")))
+    inserted = database.insert_weather_batches(batches)
+
+    # 與歷史同期比較需要氣候統計
+    from analytics import update_climatology
+    with contextlib.redirect_stdout(io.StringIO()):
+        update_climatology()
+    return inserted
+
+
+def peak_rss_mb() -> Optional[float]:
+    """目前行程的最大常駐記憶體（MB），無法取得時返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 回報，macOS 以位元組回報
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def interact(at, action: str, rng: random.Random, rerun):
+    """
+    執行一個使用者操作並重新執行
+
+    拖動滑桿時瀏覽器會在拖動途中送出數個中間值，因此以連續數次重新執行模擬。
+    操作的控制項不存在時（所屬區塊未開啟，或只有一個批次時沒有滑桿）略過。
+    """
+    if action == 'map_slider':
+        if not any(slider.key == 'map_batch_index' for slider in at.slider):
+            return
+        for _ in range(rng.randint(2, 4)):
+            slider = at.slider(key='map_batch_index')
+            slider.set_value(rng.randint(int(slider.min), int(slider.max)))
+            rerun(at, action)
+        return
+
+    try:
+        if action == 'select_batch':
+            selectbox = at.selectbox(key='selected_batch')
+            selectbox.select_index(rng.randrange(len(selectbox.options)))
+        elif action == 'history_page':
+            page = at.number_input(key='history_page')
+            page.set_value(rng.randint(int(page.min), int(page.max)))
+        elif action == 'history_filter':
+            at.text_input(key='history_description').set_value(rng.choice(['', '雨', '晴', '多雲']))
+        elif action == 'search':
+            at.text_input(key='text_search').set_value(rng.choice(SEARCH_TERMS))
+    except KeyError:
+        return
+    rerun(at, action)
+
+
+def run_session(index: int, db_path: str, interactions: int, think: float,
+                start_at: float, timeout: float, seed: int, sections: List[str]) -> Dict:
+    """
+    在子行程中執行一個模擬工作階段
+
+    Returns:
+        Dict: {'samples': [(操作, 秒數, SQL 陳述式數), ...], 'rss_mb', 'errors'}
+    """
+    os.environ['WEATHER_DB_PATH'] = db_path
+    os.environ['WEATHER_REFRESH_INTERVAL'] = '0'
+    database.DATABASE_NAME = db_path
+
+    from streamlit.testing.v1 import AppTest
+
+    statements = [0]
+    database.set_query_trace(lambda sql: statements.__setitem__(0, statements[0] + 1))
+
+    rng = random.Random(seed * 1000 + index)
+    samples = []
+    errors = []
+
+    def rerun(at, action):
+        statements[0] = 0
+        start = time.perf_counter()
+        at.run(timeout=timeout)
+        samples.append((action, time.perf_counter() - start, statements[0]))
+        errors.extend(str(e.value) for e in at.exception)
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    # 所有行程同時開始（行程啟動與匯入 Streamlit 的時間不列入量測）
+    time.sleep(max(0.0, start_at - time.time()))
+    with contextlib.redirect_stdout(io.StringIO()):
+        rerun(at, 'load')
+        if sections:
+            at.segmented_control(key='visible_sections').set_value(sections)
+            rerun(at, 'open_sections')
+        for _ in range(interactions):
+            time.sleep(rng.uniform(0, think))
+            action = rng.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+            interact(at, action, rng, rerun)
+
+    database.set_query_trace(None)
+    return {'samples': samples, 'rss_mb': peak_rss_mb(), 'errors': errors}
+
+
+def summarize(samples: List) -> Dict:
+    seconds = np.array([s[1] for s in samples])
+    statements = np.array([s[2] for s in samples])
+    return {
+        'count': len(samples),
+        'p50_ms': float(np.percentile(seconds, 50) * 1000),
+        'p95_ms': float(np.percentile(seconds, 95) * 1000),
+        'max_ms': float(seconds.max() * 1000),
+        'statements': float(statements.mean()),
+    }
+
+
+def run_load_test(db_path: str, sessions: int, interactions: int, think: float,
+                  timeout: float = 60, seed: int = 0,
+                  sections: List[str] = DEFAULT_SESSION_SECTIONS) -> Dict:
+    """
+    同時執行 sessions 個模擬工作階段
+
+    Returns:
+        Dict: {'overall': 統計, 'actions': {操作: 統計}, 'rss_mb': [...], 'errors': [...], 'elapsed'}
+    """
+    start_at = time.time() + 5 + sessions * 0.2
+    with ProcessPoolExecutor(max_workers=sessions) as executor:
+        futures = [executor.submit(run_session, index, db_path, interactions, think,
+                                   start_at, timeout, seed, sections)
+                   for index in range(sessions)]
+        results = [future.result() for future in futures]
+    elapsed = time.time() - start_at
+
+    samples = [sample for result in results for sample in result['samples']]
+    actions = {}
+    for action in ['load', 'open_sections'] + list(ACTIONS):
+        action_samples = [s for s in samples if s[0] == action]
+        if action_samples:
+            actions[action] = summarize(action_samples)
+
+    return {
+        'overall': summarize(samples),
+        'actions': actions,
+        'rss_mb': [r['rss_mb'] for r in results if r['rss_mb'] is not None],
+        'errors': [e for r in results for e in r['errors']],
+        'elapsed': elapsed,
+    }
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Streamlit 儀表板負載測試')
+    parser.add_argument('--sessions', type=int, default=10, help='同時模擬的工作階段數')
+    parser.add_argument('--interactions', type=int, default=20, help='每個工作階段的操作次數')
+    parser.add_argument('--think', type=float, default=0.5, help='操作間隔的最長秒數（隨機）')
+    parser.add_argument('--db', default=None, help='使用既有資料庫（預設產生合成資料庫）')
+    parser.add_argument('--batches', type=int, default=500, help='合成資料庫的批次數')
+    parser.add_argument('--timeout', type=float, default=60, help='單次重新執行的逾時秒數')
+    parser.add_argument('--seed', type=int, default=0, help='亂數種子')
+    parser.add_argument('--sections', nargs='*', default=DEFAULT_SESSION_SECTIONS,
+                        help='首次載入後開啟的區塊（不指定任何區塊時只量測預設畫面）')
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+
+    print("=" * 70)
+    print(f"儀表板負載測試（{args.sessions} 個工作階段 × {args.interactions} 次操作）")
+    print("=" * 70)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = args.db
+        if db_path is None:
+            db_path = os.path.join(workdir, 'bench.db')
+            inserted = generate_database(db_path, args.batches, seed=args.seed)
+            print(f"✓ 已產生合成資料庫：{args.batches} 個批次，{inserted} 筆資料")
+
+        result = run_load_test(os.path.abspath(db_path), args.sessions, args.interactions,
+                               args.think, args.timeout, args.seed, args.sections)
+
+    print(f"\n{'操作':<16}{'次數':>8}{'p50':>12}{'p95':>12}{'最大':>12}{'SQL/次':>10}")
+    for action, stats in list(result['actions'].items()) + [('全部', result['overall'])]:
+        print(f"{action:<16}{stats['count']:>8}{stats['p50_ms']:>10.0f}ms{stats['p95_ms']:>10.0f}ms"
+              f"{stats['max_ms']:>10.0f}ms{stats['statements']:>10.1f}")
+
+    print(f"\n總重新執行次數：{result['overall']['count']}（{result['elapsed']:.1f} 秒，"
+          f"{result['overall']['count'] / result['elapsed']:.1f} 次/秒）")
+    if result['rss_mb']:
+        print(f"每個工作階段行程的最大記憶體：中位數 {np.median(result['rss_mb']):.0f} MB，"
+              f"最大 {max(result['rss_mb']):.0f} MB")
+
+    if result['errors']:
+        print(f"✗ 共 {len(result['errors'])} 次重新執行發生例外，例如：{result['errors'][0]}")
+    else:
+        print("✓ 所有重新執行都沒有例外")
+
+    print("=" * 70)
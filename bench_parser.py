@@ -0,0 +1,83 @@
+"""
+CWA 回應解碼效能量測
+功能：以相同的原始回應比較各解碼器（msgspec、orjson、原實作）的吞吐量，
+      並確認解析結果與原實作一致
+"""
+
+import sys
+import io
+
+# 設置 Windows 終端輸出為 UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+import argparse
+import time
+from typing import Dict, List
+
+from payload_decoder import DECODERS, available_decoders
+
+
+def load_payloads(paths: List[str]) -> List[bytes]:
+    payloads = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            payloads.append(f.read())
+    return payloads
+
+
+def measure(decode, payloads: List[bytes], iterations: int) -> Dict:
+    """
+    重複解碼所有回應
+
+    Returns:
+        Dict: {'seconds', 'payloads_per_second', 'mb_per_second'}
+    """
+    total_bytes = sum(len(raw) for raw in payloads) * iterations
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for raw in payloads:
+            decode(raw)
+    elapsed = time.perf_counter() - start
+    count = len(payloads) * iterations
+    return {
+        'seconds': elapsed,
+        'payloads_per_second': count / elapsed,
+        'mb_per_second': total_bytes / elapsed / 1024 / 1024
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CWA 回應解碼效能量測')
+    parser.add_argument('payloads', nargs='*', default=['weather_response.json'],
+                        help='原始回應檔案（預設 weather_response.json）')
+    parser.add_argument('--iterations', type=int, default=200, help='重複次數')
+    parser.add_argument('--decoders', nargs='+', default=available_decoders(),
+                        help='要量測的解碼器')
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.payloads)
+
+    print("=" * 60)
+    print(f"解碼效能量測（{len(payloads)} 個回應 × {args.iterations} 次）")
+    print("=" * 60)
+
+    # 先確認結果一致，再量測
+    reference = [DECODERS['default'](raw) for raw in payloads]
+    results = {}
+    for name in args.decoders:
+        decode = DECODERS[name]
+        same = all(decode(raw) == expected for raw, expected in zip(payloads, reference))
+        print(f"{'✓' if same else '✗'} {name} 的解析結果與原實作" + ("一致" if same else "不一致"))
+        results[name] = measure(decode, payloads, args.iterations)
+
+    baseline = results.get('default')
+    print(f"\n{'解碼器':<10}{'回應/秒':>12}{'MB/秒':>10}{'加速':>8}")
+    for name, result in results.items():
+        speedup = (f"{result['payloads_per_second'] / baseline['payloads_per_second']:.1f}x"
+                   if baseline else '-')
+        print(f"{name:<10}{result['payloads_per_second']:>12.0f}"
+              f"{result['mb_per_second']:>10.1f}{speedup:>8}")
+
+    print("=" * 60)
@@ -0,0 +1,176 @@
+"""
+儲存後端一致性檢查與效能量測
+功能：對每個可用的儲存後端執行相同的操作序列，確認查詢結果一致，
+      並量測寫入、批次查詢、歷史查詢、篩選分頁查詢、每日彙總與統計的耗時
+"""
+
+import sys
+import io
+
+# 設置 Windows 終端輸出為 UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+import argparse
+import contextlib
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+import database
+import storage
+
+
+LOCATIONS = ['北部地區', '中部地區', '南部地區', '東北部地區', '東部地區', '東南部地區']
+DESCRIPTIONS = [(2, '晴時多雲'), (3, '多雲時晴'), (8, '多雲短暫雨'), (11, '陰短暫雨')]
+
+# 比較結果時忽略各後端自行產生的欄位
+VOLATILE_KEYS = ('id', 'fetch_time', 'created_at')
+# 統計中與儲存方式無關的欄位（stored_records 在差異儲存時少於 total_records）
+STATS_KEYS = ('total_records', 'total_batches')
+QUERY_PAGE_SIZE = 20
+
+
+def generate_batches(batch_count: int, seed: int = 0) -> List[List[Dict]]:
+    """產生固定亂數種子的合成批次資料"""
+    rng = random.Random(seed)
+    batches = []
+    for _ in range(batch_count):
+        rows = []
+        for location in LOCATIONS:
+            weather_id, description = rng.choice(DESCRIPTIONS)
+            min_temp = float(rng.randint(8, 24))
+            rows.append({
+                'location': location,
+                'min_temp': min_temp,
+                'max_temp': min_temp + rng.randint(3, 10),
+                'description': description,
+                'weather_id': weather_id
+            })
+        batches.append(rows)
+    return batches
+
+
+def stable_rows(rows: List[Dict]) -> List[Dict]:
+    return [{k: v for k, v in row.items() if k not in VOLATILE_KEYS} for row in rows]
+
+
+def row_key(row: Dict):
+    return tuple(sorted(row.items()))
+
+
+def timed(results: Dict, name: str, func, *args):
+    start = time.perf_counter()
+    value = func(*args)
+    results[name] = time.perf_counter() - start
+    return value
+
+
+def run_suite(repo: storage.WeatherRepository, batches: List[List[Dict]]) -> Dict:
+    """
+    對單一後端執行操作序列
+
+    Returns:
+        Dict: {'timings': {...}, 'snapshot': {...}}（snapshot 用於跨後端比對）
+    """
+    timings = {}
+    # 後端本身的進度訊息不列入輸出
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert repo.init_database(), "init_database 失敗"
+
+        start = time.perf_counter()
+        for index, rows in enumerate(batches):
+            inserted = repo.insert_weather_data(rows, index + 1)
+            assert inserted == len(rows), "insert_weather_data 筆數不符"
+        timings['insert'] = time.perf_counter() - start
+
+        latest = timed(timings, 'latest', repo.get_latest_weather)
+        middle_id = len(batches) // 2 + 1
+        by_batch = timed(timings, 'by_batch', repo.get_weather_by_batch, middle_id)
+        batch_list = timed(timings, 'batch_list', repo.get_batch_list)
+        all_rows = timed(timings, 'all', repo.get_all_weather)
+        summary = timed(timings, 'daily_summary', repo.get_daily_summary)
+        stats = timed(timings, 'stats', repo.get_database_stats)
+        # 篩選 + 排序：完整結果比對內容，分頁比對排序欄位（同值的順序依各後端的 id）
+        query_rows, query_total = timed(timings, 'query', repo.query_weather,
+                                        LOCATIONS[:3], None, None, '雨', 'max_temp', True,
+                                        len(batches) * len(LOCATIONS), 0)
+        page_rows, page_total = timed(timings, 'query_page', repo.query_weather,
+                                      None, None, None, None, 'min_temp', False,
+                                      QUERY_PAGE_SIZE, QUERY_PAGE_SIZE)
+
+    # 內容檢查（兩個後端都必須通過）
+    assert [r['batch_id'] for r in latest] == [len(batches)] * len(LOCATIONS)
+    assert sorted(r['location'] for r in by_batch) == [r['location'] for r in by_batch]
+    assert len(batch_list) == len(batches)
+    assert len(all_rows) == stats['total_records'] == len(batches) * len(LOCATIONS)
+    assert stats['total_batches'] == len(batches)
+    assert sum(row['batch_count'] for row in summary) == len(batches) * len(LOCATIONS)
+    assert 0 < stats['stored_records'] <= stats['total_records']
+    assert query_total == len(query_rows)
+    assert page_total == stats['total_records']
+    assert len(page_rows) == min(QUERY_PAGE_SIZE, max(page_total - QUERY_PAGE_SIZE, 0))
+
+    snapshot = {
+        'latest': stable_rows(latest),
+        'by_batch': stable_rows(by_batch),
+        'batch_ids': [b[0] for b in batch_list],
+        'all': stable_rows(all_rows),
+        'summary': [(r['location'], r['min_temp'], r['max_temp'],
+                     round(r['avg_min_temp'], 6), round(r['avg_max_temp'], 6),
+                     r['batch_count']) for r in summary],
+        'stats': {key: stats[key] for key in STATS_KEYS},
+        'query': (query_total, sorted(map(row_key, stable_rows(query_rows)))),
+        'query_page': (page_total, [r['min_temp'] for r in page_rows]),
+    }
+    return {'timings': timings, 'snapshot': snapshot}
+
+
+def make_repository(name: str, workdir: str) -> storage.WeatherRepository:
+    """在暫存目錄建立指定後端"""
+    database.DATABASE_NAME = os.path.join(workdir, f"{name}.db")
+    if name == 'duckdb':
+        return storage.DuckDBRepository(os.path.join(workdir, "bench.duckdb"))
+    return storage.SQLiteRepository()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='儲存後端一致性檢查與效能量測')
+    parser.add_argument('--batches', type=int, default=500, help='合成批次數')
+    parser.add_argument('--backends', nargs='+', default=list(storage.REPOSITORY_CLASSES),
+                        help='要量測的後端')
+    args = parser.parse_args()
+
+    batches = generate_batches(args.batches)
+
+    print("=" * 60)
+    print(f"儲存後端量測（{args.batches} 個批次，{args.batches * len(LOCATIONS)} 筆資料）")
+    print("=" * 60)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.backends:
+            if name == 'duckdb' and storage.duckdb is None:
+                print(f"- {name}: 未安裝，略過")
+                continue
+            results[name] = run_suite(make_repository(name, workdir), batches)
+
+    operations = ['insert', 'latest', 'by_batch', 'batch_list', 'all', 'daily_summary', 'stats',
+                  'query', 'query_page']
+    print(f"\n{'操作':<14}" + "".join(f"{name:>12}" for name in results))
+    for op in operations:
+        print(f"{op:<14}" + "".join(f"{results[name]['timings'][op] * 1000:>10.1f}ms"
+                                    for name in results))
+
+    # 跨後端比對查詢結果
+    names = list(results)
+    for other in names[1:]:
+        for key, value in results[names[0]]['snapshot'].items():
+            status = "✓" if value == results[other]['snapshot'][key] else "✗"
+            print(f"{status} {names[0]} 與 {other} 的 {key} 結果" +
+                  ("一致" if status == "✓" else "不一致"))
+
+    print("=" * 60)
@@ -0,0 +1,5 @@
+"""
+pytest 設定：test_json_structure.py 是下載資料的檢查腳本（匯入時即連線），不列入測試收集
+"""
+
+collect_ignore = ['test_json_structure.py']
@@ -3,24 +3,326 @@ SQLite 資料庫操作模組
 功能：初始化資料庫、插入和查詢天氣資料
 """
 
+import os
 import sqlite3
-from typing import List, Dict, Optional, Tuple
+import stat
+import time
+from typing import Callable, List, Dict, Optional, Tuple
 from datetime import datetime
 
+from batch_keys import format_batch_id, legacy_batch_id
 
-DATABASE_NAME = "data.db"
+
+DATABASE_NAME = os.getenv('WEATHER_DB_PATH', 'data.db')
+BUSY_TIMEOUT = 30  # 等待其他連線釋放寫入鎖的秒數
+
+# 分頁查詢允許的排序欄位（欄位名稱不能使用參數綁定，只接受白名單）
+WEATHER_SORT_COLUMNS = ('created_at', 'location', 'min_temp', 'max_temp', 'description', 'batch_id')
+WEATHER_PAGE_SIZE = 50
+
+# 月分區檔案（weather_YYYYMM.db）所在目錄，由 partitions.py 建立；查詢時才附加
+PARTITION_DIR = os.getenv('WEATHER_PARTITION_DIR', 'partitions')
+PARTITION_ATTACH_LIMIT = 9   # SQLite 預設最多附加 10 個資料庫，單次查詢最多附加的分區數
+
+# 差異儲存：只寫入與前一批次不同的地區，批次快照由 weather_snapshots 指向實際資料列
+# （資料庫一旦啟用即持續使用，見 init_delta_tables）
+DELTA_STORAGE = os.getenv('WEATHER_DELTA_STORAGE', '0') == '1'
+
+
+# 查詢追蹤（bench_app.py 等量測工具使用）：設定後，之後建立的連線執行的每個 SQL 陳述式都會傳給此函數
+_query_trace = {'callback': None}
+
+
+def set_query_trace(callback: Optional[Callable[[str], None]]):
+    """設定（None 為取消）查詢追蹤函數"""
+    _query_trace['callback'] = callback
 
 
 def get_connection() -> sqlite3.Connection:
     """獲取資料庫連接"""
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = sqlite3.connect(DATABASE_NAME, timeout=BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row  # 使結果可以像字典一樣訪問
+    if _query_trace['callback'] is not None:
+        conn.set_trace_callback(_query_trace['callback'])
     return conn
 
 
+# weather 事實資料表只存放整數維度鍵，文字由 locations / weather_codes 對應
+WEATHER_COLUMNS_SQL = """
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id INTEGER NOT NULL,
+    location_id INTEGER NOT NULL REFERENCES locations (id),
+    min_temp REAL,
+    max_temp REAL,
+    weather_code_id INTEGER REFERENCES weather_codes (id),
+    fetch_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+"""
+
+
+WEATHER_COLUMN_NAMES = ('id', 'batch_id', 'location_id', 'min_temp', 'max_temp',
+                        'weather_code_id', 'fetch_time', 'created_at')
+
+# weather_detail 的欄位（檢視表與分區查詢共用；維度表只存在主資料庫）
+WEATHER_DETAIL_SQL = """
+    SELECT w.id, w.batch_id, l.name AS location, w.min_temp, w.max_temp,
+           c.description, w.fetch_time, w.created_at,
+           w.location_id, w.weather_code_id, c.cwa_weather_id
+    FROM {source} w
+    JOIN locations l ON l.id = w.location_id
+    LEFT JOIN weather_codes c ON c.id = w.weather_code_id
+"""
+
+# 差異儲存模式下還原完整批次快照（欄位與 weather 相同；
+# 沿用的資料列記錄的是首次寫入的時間，fetch_time / created_at 改用批次時間）
+DELTA_SOURCE_SQL = """(
+    SELECT w.id, s.batch_id, s.location_id, w.min_temp, w.max_temp,
+           w.weather_code_id, b.created_at AS fetch_time, b.created_at
+    FROM weather_snapshots s
+    JOIN weather_batches b ON b.batch_id = s.batch_id
+    JOIN weather w ON w.id = s.weather_id
+)"""
+
+
+def table_columns(cursor: sqlite3.Cursor, table: str) -> List[str]:
+    """查詢資料表的欄位名稱（資料表不存在時返回空列表）"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def migrate_weather_dimensions(cursor: sqlite3.Cursor) -> bool:
+    """
+    將舊版 weather 資料表（每列重複存放地區與天氣描述文字）
+    轉換為只存放 locations / weather_codes 整數鍵的格式
+    
+    Returns:
+        bool: 有執行遷移返回 True
+    """
+    if 'location' not in table_columns(cursor, 'weather'):
+        return False
+    
+    print("正在遷移 weather 資料表為維度編碼格式...")
+    
+    # 舊版資料表的批次 ID 為文字，一併轉換為整數
+    cursor.connection.create_function('legacy_batch_id', 1, legacy_batch_id, deterministic=True)
+    
+    # 先從既有資料建立維度
+    cursor.execute("""
+        INSERT OR IGNORE INTO locations (name)
+        SELECT DISTINCT location FROM weather
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO weather_codes (description)
+        SELECT DISTINCT description FROM weather WHERE description IS NOT NULL
+    """)
+    
+    cursor.execute(f"CREATE TABLE weather_migrated ({WEATHER_COLUMNS_SQL})")
+    cursor.execute("""
+        INSERT INTO weather_migrated (id, batch_id, location_id, min_temp, max_temp,
+                                      weather_code_id, fetch_time, created_at)
+        SELECT w.id, legacy_batch_id(w.batch_id), l.id, w.min_temp, w.max_temp,
+               c.id, w.fetch_time, w.created_at
+        FROM weather w
+        JOIN locations l ON l.name = w.location
+        LEFT JOIN weather_codes c ON c.description = w.description
+    """)
+    cursor.execute("DROP TABLE weather")
+    cursor.execute("ALTER TABLE weather_migrated RENAME TO weather")
+    return True
+
+
+def migrate_batch_keys(cursor: sqlite3.Cursor, table: str, columns_sql: str) -> bool:
+    """
+    將資料表的文字批次 ID（YYYYMMDD_HHMMSS）轉換為整數批次 ID（見 batch_keys.py）
+    
+    Args:
+        cursor: 資料庫游標
+        table: 資料表名稱
+        columns_sql: 新版資料表的欄位定義（batch_id 為 INTEGER）
+        
+    Returns:
+        bool: 有執行遷移返回 True
+    """
+    column_types = {row[1]: row[2] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column_types.get('batch_id', '').upper() != 'TEXT':
+        return False
+    
+    print(f"正在將 {table} 的批次 ID 轉換為整數...")
+    
+    cursor.connection.create_function('legacy_batch_id', 1, legacy_batch_id, deterministic=True)
+    columns = ", ".join(column_types)
+    select = ", ".join("legacy_batch_id(batch_id)" if name == 'batch_id' else name
+                       for name in column_types)
+    cursor.execute(f"CREATE TABLE {table}_migrated ({columns_sql})")
+    cursor.execute(f"INSERT INTO {table}_migrated ({columns}) SELECT {select} FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {table}_migrated RENAME TO {table}")
+    return True
+
+
+def init_lock_table(cursor: sqlite3.Cursor):
+    """創建跨行程鎖資料表（其他儲存後端也使用 SQLite 協調行程）"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS app_locks (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+
+
+def init_partition_tables(cursor: sqlite3.Cursor):
+    """
+    創建月分區目錄（見 partitions.py）
+    
+    weather_partitions 記錄每個分區的批次與時間範圍，供查詢路由篩選；
+    archived_batches 保存已移出批次的清單，批次列表與批次查詢不必附加分區。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS weather_partitions (
+            month TEXT PRIMARY KEY,
+            file TEXT NOT NULL,
+            min_batch_id INTEGER,
+            max_batch_id INTEGER,
+            min_created_at TIMESTAMP,
+            max_created_at TIMESTAMP,
+            row_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archived_batches (
+            batch_id INTEGER PRIMARY KEY,
+            month TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            created_at TIMESTAMP
+        )
+    """)
+
+
+def uses_delta_storage(cursor: sqlite3.Cursor) -> bool:
+    """資料庫是否使用差異儲存（weather_snapshots 存在）"""
+    return cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'weather_snapshots'"
+    ).fetchone() is not None
+
+
+def weather_source(cursor: sqlite3.Cursor) -> str:
+    """可放在 FROM 之後、每列為一個批次中一個地區的來源（完整儲存時即 weather）"""
+    return DELTA_SOURCE_SQL if uses_delta_storage(cursor) else 'weather'
+
+
+def init_delta_tables(cursor: sqlite3.Cursor):
+    """
+    創建差異儲存的批次目錄與快照索引
+    
+    weather 只存放與前一批次不同的資料列；weather_snapshots 記錄每個批次的每個地區
+    對應到哪一列（未變動的地區指向較早批次的資料列），weather_batches 記錄批次時間。
+    既有的完整批次第一次啟用時直接建立快照（每列指向自己），之後寫入的批次才省略重複資料。
+    """
+    if uses_delta_storage(cursor):
+        return
+    
+    cursor.execute("""
+        CREATE TABLE weather_batches (
+            batch_id INTEGER PRIMARY KEY,
+            created_at TIMESTAMP NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE weather_snapshots (
+            batch_id INTEGER NOT NULL,
+            location_id INTEGER NOT NULL,
+            weather_id INTEGER NOT NULL,
+            PRIMARY KEY (batch_id, location_id)
+        ) WITHOUT ROWID
+    """)
+    # 刪除批次時以此判斷資料列是否仍被其他批次使用
+    cursor.execute("CREATE INDEX idx_weather_snapshots_weather_id ON weather_snapshots (weather_id)")
+    # 日期範圍查詢依批次時間篩選
+    cursor.execute("CREATE INDEX idx_weather_batches_created_at ON weather_batches (created_at)")
+    
+    cursor.execute("""
+        INSERT INTO weather_batches (batch_id, created_at)
+        SELECT batch_id, MIN(created_at) FROM weather GROUP BY batch_id
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO weather_snapshots (batch_id, location_id, weather_id)
+        SELECT batch_id, location_id, id FROM weather
+    """)
+
+
+def init_text_source(cursor: sqlite3.Cursor, kind: str, table: str, column: str):
+    """
+    將資料表的文字欄位加入 text_index，並以觸發程序在寫入、修改、刪除時同步
+    
+    Args:
+        cursor: 資料庫游標
+        kind: 來源名稱（搜尋結果依此對應回來源資料表）
+        table: 來源資料表（以 id 作為 ref_id）
+        column: 文字欄位
+    """
+    trigger = f"{table}_text_insert"
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                      (trigger,)).fetchone():
+        return
+    
+    # 第一次加入時先索引既有資料
+    cursor.execute(f"""
+        INSERT INTO text_index (body, kind, ref_id)
+        SELECT {column}, '{kind}', id FROM {table} WHERE {column} IS NOT NULL
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER {trigger} AFTER INSERT ON {table}
+        WHEN new.{column} IS NOT NULL
+        BEGIN
+            INSERT INTO text_index (body, kind, ref_id) VALUES (new.{column}, '{kind}', new.id);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_text_update AFTER UPDATE OF {column} ON {table}
+        BEGIN
+            DELETE FROM text_index WHERE kind = '{kind}' AND ref_id = old.id;
+            INSERT INTO text_index (body, kind, ref_id)
+            SELECT new.{column}, '{kind}', new.id WHERE new.{column} IS NOT NULL;
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_text_delete AFTER DELETE ON {table}
+        BEGIN
+            DELETE FROM text_index WHERE kind = '{kind}' AND ref_id = old.id;
+        END
+    """)
+
+
+def init_text_index(cursor: sqlite3.Cursor):
+    """
+    創建全文檢索索引 text_index（kind 為來源名稱，ref_id 為來源資料表的 id）
+    
+    使用 FTS5 的 trigram 斷詞：任意 3 個字以上的子字串都能以索引查詢，適合不分詞的中文；
+    SQLite 未編譯 FTS5 時改用一般資料表，搜尋時以 LIKE 比對（見 search.py）。
+    """
+    if not cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'text_index'").fetchone():
+        try:
+            cursor.execute("""
+                CREATE VIRTUAL TABLE text_index USING fts5(
+                    body, kind UNINDEXED, ref_id UNINDEXED, tokenize = 'trigram'
+                )
+            """)
+        except sqlite3.OperationalError:
+            cursor.execute("""
+                CREATE TABLE text_index (
+                    body TEXT,
+                    kind TEXT NOT NULL,
+                    ref_id INTEGER NOT NULL
+                )
+            """)
+    
+    init_text_source(cursor, 'weather_code', 'weather_codes', 'description')
+
+
 def init_database() -> bool:
     """
-    初始化資料庫，創建 weather 資料表
+    初始化資料庫，創建 weather 資料表與 locations / weather_codes 維度表
     
     Returns:
         bool: 成功返回 True，失敗返回 False
@@ -29,20 +331,74 @@ def init_database() -> bool:
         conn = get_connection()
         cursor = conn.cursor()
         
-        # 創建 weather 資料表
+        # 新資料庫使用增量式空間回收（僅在建立第一個資料表前設定才會生效）
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        
+        # WAL 模式讓讀取不會被寫入阻擋（多個 Streamlit 連線同時讀取）
+        cursor.execute("PRAGMA journal_mode = WAL")
+        
+        # 地區維度
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS locations (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
+        
+        # 天氣描述維度（cwa_weather_id 為 CWA 的 weatherid）
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS weather (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                batch_id TEXT NOT NULL,
-                location TEXT NOT NULL,
-                min_temp REAL,
-                max_temp REAL,
-                description TEXT,
-                fetch_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            CREATE TABLE IF NOT EXISTS weather_codes (
+                id INTEGER PRIMARY KEY,
+                cwa_weather_id INTEGER,
+                description TEXT NOT NULL UNIQUE
             )
         """)
         
+        # 檢視表依賴 weather，遷移前先移除（稍後重建）
+        cursor.execute("DROP VIEW IF EXISTS weather_detail")
+        
+        # 舊版資料表先轉換格式
+        migrate_weather_dimensions(cursor)
+        migrate_batch_keys(cursor, 'weather', WEATHER_COLUMNS_SQL)
+        
+        # 創建 weather 資料表
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS weather ({WEATHER_COLUMNS_SQL})")
+        
+        # 批次查詢與保留策略都依 batch_id / created_at 篩選
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_weather_batch_id
+            ON weather (batch_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_weather_created_at
+            ON weather (created_at)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_weather_location_id
+            ON weather (location_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_weather_code_id
+            ON weather (weather_code_id)
+        """)
+        
+        # 跨行程鎖（確保同一時間只有一個行程執行初始化等工作）
+        init_lock_table(cursor)
+        
+        # 月分區目錄
+        init_partition_tables(cursor)
+        
+        # 全文檢索（天氣描述）
+        init_text_index(cursor)
+        
+        # 差異儲存（已啟用的資料庫不論設定都繼續使用，否則既有快照無法還原）
+        if DELTA_STORAGE:
+            init_delta_tables(cursor)
+        
+        # 查詢層透過檢視表還原文字欄位與批次快照（每次重建以套用最新定義）
+        cursor.execute("CREATE VIEW weather_detail AS"
+                       + WEATHER_DETAIL_SQL.format(source=weather_source(cursor)))
+        
         conn.commit()
         conn.close()
         
@@ -54,9 +410,184 @@ def init_database() -> bool:
         return False
 
 
-def insert_weather_data(data_list: List[Dict], batch_id: str) -> int:
+def resolve_dimension_ids(cursor: sqlite3.Cursor, data_list: List[Dict]) -> Tuple[Dict, Dict]:
+    """
+    取得（必要時建立）資料中出現的地區與天氣描述的整數鍵
+    
+    Args:
+        cursor: 資料庫游標（與寫入共用同一交易）
+        data_list: 天氣資料列表
+        
+    Returns:
+        Tuple[Dict, Dict]: (地區名稱 -> location_id, 天氣描述 -> weather_code_id)
+    """
+    names = {weather.get('location') for weather in data_list}
+    codes = {}
+    for weather in data_list:
+        if weather.get('description') is not None:
+            codes.setdefault(weather['description'], weather.get('weather_id'))
+    
+    cursor.executemany(
+        "INSERT OR IGNORE INTO locations (name) VALUES (?)",
+        [(name,) for name in names]
+    )
+    cursor.executemany("""
+        INSERT INTO weather_codes (description, cwa_weather_id) VALUES (?, ?)
+        ON CONFLICT (description) DO UPDATE SET
+            cwa_weather_id = COALESCE(weather_codes.cwa_weather_id, excluded.cwa_weather_id)
+    """, list(codes.items()))
+    
+    location_ids = {}
+    if names:
+        placeholders = ",".join("?" * len(names))
+        cursor.execute(f"SELECT id, name FROM locations WHERE name IN ({placeholders})",
+                       list(names))
+        location_ids = {row[1]: row[0] for row in cursor.fetchall()}
+    
+    code_ids = {}
+    if codes:
+        placeholders = ",".join("?" * len(codes))
+        cursor.execute(f"SELECT id, description FROM weather_codes WHERE description IN ({placeholders})",
+                       list(codes))
+        code_ids = {row[1]: row[0] for row in cursor.fetchall()}
+    
+    return location_ids, code_ids
+
+
+def insert_weather_rows(cursor: sqlite3.Cursor, data_list: List[Dict], batch_id: int,
+                        created_at: Optional[str] = None) -> int:
     """
-    批量插入天氣資料（保留歷史資料，不刪除舊資料）
+    將一個批次的天氣資料寫入 weather（不提交交易）
+    
+    Args:
+        cursor: 資料庫游標
+        data_list: 天氣資料列表
+        batch_id: 批次識別碼
+        created_at: 建立時間，None 時使用目前時間
+        
+    Returns:
+        int: 寫入的資料筆數
+    """
+    location_ids, code_ids = resolve_dimension_ids(cursor, data_list)
+    
+    if uses_delta_storage(cursor):
+        return insert_delta_rows(cursor, data_list, batch_id, created_at, location_ids, code_ids)
+    
+    cursor.executemany("""
+        INSERT INTO weather (batch_id, location_id, min_temp, max_temp, weather_code_id,
+                             fetch_time, created_at)
+        VALUES (?, ?, ?, ?, ?,
+                COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))
+    """, [
+        (
+            batch_id,
+            location_ids[weather.get('location')],
+            weather.get('min_temp'),
+            weather.get('max_temp'),
+            code_ids.get(weather.get('description')),
+            created_at,
+            created_at
+        )
+        for weather in data_list
+    ])
+    return len(data_list)
+
+
+def insert_delta_rows(cursor: sqlite3.Cursor, data_list: List[Dict], batch_id: int,
+                      created_at: Optional[str], location_ids: Dict, code_ids: Dict) -> int:
+    """
+    差異儲存：與前一批次的快照比較，只寫入數值有變動的地區（不提交交易）
+    
+    Returns:
+        int: 批次快照的資料筆數（含未變動而沿用前一批次的地區）
+    """
+    cursor.execute("""
+        SELECT s.location_id, w.id, w.min_temp, w.max_temp, w.weather_code_id
+        FROM weather_snapshots s
+        JOIN weather w ON w.id = s.weather_id
+        WHERE s.batch_id = (SELECT MAX(batch_id) FROM weather_batches WHERE batch_id < ?)
+    """, (batch_id,))
+    previous = {row[0]: (row[1], tuple(row[2:])) for row in cursor.fetchall()}
+    
+    cursor.execute("""
+        INSERT OR REPLACE INTO weather_batches (batch_id, created_at)
+        VALUES (?, COALESCE(?, CURRENT_TIMESTAMP))
+    """, (batch_id, created_at))
+    
+    snapshots = []
+    for weather in data_list:
+        location_id = location_ids[weather.get('location')]
+        values = (weather.get('min_temp'), weather.get('max_temp'),
+                  code_ids.get(weather.get('description')))
+        weather_id, previous_values = previous.get(location_id, (None, None))
+        if previous_values != values:
+            cursor.execute("""
+                INSERT INTO weather (batch_id, location_id, min_temp, max_temp, weather_code_id,
+                                     fetch_time, created_at)
+                VALUES (?, ?, ?, ?, ?,
+                        COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))
+            """, (batch_id, location_id, *values, created_at, created_at))
+            weather_id = cursor.lastrowid
+        snapshots.append((batch_id, location_id, weather_id))
+    
+    cursor.executemany("""
+        INSERT OR REPLACE INTO weather_snapshots (batch_id, location_id, weather_id)
+        VALUES (?, ?, ?)
+    """, snapshots)
+    return len(data_list)
+
+
+def delete_weather_batches(cursor: sqlite3.Cursor, batch_ids: List[int]) -> int:
+    """
+    刪除批次的天氣資料（不提交交易）
+    
+    差異儲存時先移除批次快照，資料列只在沒有其他批次沿用時才刪除。
+    
+    Returns:
+        int: 實際刪除的 weather 資料列數
+    """
+    if not batch_ids:
+        return 0
+    placeholders = ",".join("?" * len(batch_ids))
+    if not uses_delta_storage(cursor):
+        return cursor.execute(f"DELETE FROM weather WHERE batch_id IN ({placeholders})",
+                              batch_ids).rowcount
+    
+    # 這些批次寫入或沿用的資料列中，沒有其他批次使用的才刪除
+    deleted = cursor.execute(f"""
+        DELETE FROM weather
+        WHERE (batch_id IN ({placeholders})
+               OR id IN (SELECT weather_id FROM weather_snapshots
+                         WHERE batch_id IN ({placeholders})))
+          AND NOT EXISTS (SELECT 1 FROM weather_snapshots s
+                          WHERE s.weather_id = weather.id
+                            AND s.batch_id NOT IN ({placeholders}))
+    """, batch_ids * 3).rowcount
+    cursor.execute(f"DELETE FROM weather_snapshots WHERE batch_id IN ({placeholders})", batch_ids)
+    cursor.execute(f"DELETE FROM weather_batches WHERE batch_id IN ({placeholders})", batch_ids)
+    return deleted
+
+
+def clear_weather(cursor: sqlite3.Cursor):
+    """清空所有天氣資料（含差異儲存的快照，不提交交易）"""
+    cursor.execute("DELETE FROM weather")
+    if uses_delta_storage(cursor):
+        cursor.execute("DELETE FROM weather_snapshots")
+        cursor.execute("DELETE FROM weather_batches")
+
+
+def batch_exists(cursor: sqlite3.Cursor, batch_id: int) -> bool:
+    """批次是否已存在（主資料庫或月分區）"""
+    batch_table = 'weather_batches' if uses_delta_storage(cursor) else 'weather'
+    return cursor.execute(f"""
+        SELECT EXISTS (SELECT 1 FROM {batch_table} WHERE batch_id = ?)
+            OR EXISTS (SELECT 1 FROM archived_batches WHERE batch_id = ?)
+    """, (batch_id, batch_id)).fetchone()[0] == 1
+
+
+def insert_weather_data(data_list: List[Dict], batch_id: int) -> int:
+    """
+    批量插入新批次的天氣資料（保留歷史資料，不刪除舊資料；批次 ID 已存在時不寫入）
     
     Args:
         data_list: 天氣資料列表
@@ -69,20 +600,15 @@ def insert_weather_data(data_list: List[Dict], batch_id: str) -> int:
         conn = get_connection()
         cursor = conn.cursor()
         
-        inserted_count = 0
+        # 先取得寫入鎖再檢查，兩個行程產生相同批次 ID 時（見 batch_keys.py）後寫入者失敗
+        cursor.execute("BEGIN IMMEDIATE")
+        if batch_exists(cursor, batch_id):
+            conn.rollback()
+            conn.close()
+            print(f"✗ 資料插入失敗：批次 ID 已存在（{batch_id}）")
+            return 0
         
-        for weather in data_list:
-            cursor.execute("""
-                INSERT INTO weather (batch_id, location, min_temp, max_temp, description)
-                VALUES (?, ?, ?, ?, ?)
-            """, (
-                batch_id,
-                weather.get('location'),
-                weather.get('min_temp'),
-                weather.get('max_temp'),
-                weather.get('description')
-            ))
-            inserted_count += 1
+        inserted_count = insert_weather_rows(cursor, data_list, batch_id)
         
         conn.commit()
         conn.close()
@@ -95,55 +621,349 @@ def insert_weather_data(data_list: List[Dict], batch_id: str) -> int:
         return 0
 
 
-def get_latest_weather() -> List[Dict]:
+def insert_weather_batches(batches: List[Tuple[int, List[Dict], Optional[str]]]) -> int:
     """
-    查詢最新一批天氣資料
+    在單一交易中寫入多個批次（用於重新匯入歷史資料）
     
+    同一批次 ID 的舊資料（包含已移到月分區的）會先被刪除，因此重複執行不會產生重複資料；
+    重新寫入的批次回到主資料庫，下次分區移動時再移回所屬月份。
+    
+    Args:
+        batches: [(batch_id, 天氣資料列表, created_at), ...]，
+                 created_at 為 None 時使用目前時間
+        
     Returns:
-        List[Dict]: 最新批次的天氣資料
+        int: 成功插入的資料筆數，失敗返回 0
     """
     try:
         conn = get_connection()
+        remove_archived_batches(conn, [batch_id for batch_id, _, _ in batches])
         cursor = conn.cursor()
         
-        # 先找出最新的 batch_id
-        cursor.execute("""
-            SELECT batch_id
-            FROM weather
-            ORDER BY created_at DESC
-            LIMIT 1
-        """)
+        inserted_count = 0
         
-        result = cursor.fetchone()
-        if not result:
-            conn.close()
-            return []
+        for batch_id, data_list, created_at in batches:
+            delete_weather_batches(cursor, [batch_id])
+            inserted_count += insert_weather_rows(cursor, data_list, batch_id, created_at)
         
-        latest_batch_id = result['batch_id']
+        conn.commit()
+        conn.close()
         
-        # 查詢該批次的所有資料
-        cursor.execute("""
-            SELECT id, batch_id, location, min_temp, max_temp, description, 
-                   fetch_time, created_at
-            FROM weather
-            WHERE batch_id = ?
-            ORDER BY location
-        """, (latest_batch_id,))
+        return inserted_count
         
-        rows = cursor.fetchall()
+    except (sqlite3.Error, OSError) as e:
+        print(f"✗ 批次寫入失敗：{e}")
+        return 0
+
+
+def acquire_lock(name: str, owner: str, ttl: float) -> bool:
+    """
+    嘗試取得跨行程鎖（不等待）
+    
+    鎖記錄在 app_locks 資料表中，逾期（持有者當機）後可被其他人取得。
+    
+    Args:
+        name: 鎖名稱
+        owner: 持有者識別碼（每次嘗試應唯一）
+        ttl: 鎖的有效秒數
+        
+    Returns:
+        bool: 取得鎖返回 True
+    """
+    try:
+        conn = get_connection()
+        now = time.time()
+        
+        # 只有鎖不存在或已逾期時才會寫入成功
+        conn.execute("""
+            INSERT INTO app_locks (name, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                owner = excluded.owner,
+                expires_at = excluded.expires_at
+            WHERE app_locks.expires_at < ?
+        """, (name, owner, now + ttl, now))
+        conn.commit()
+        
+        row = conn.execute("SELECT owner FROM app_locks WHERE name = ?", (name,)).fetchone()
         conn.close()
         
-        # 轉換為字典列表
-        return [dict(row) for row in rows]
+        return row is not None and row['owner'] == owner
+        
+    except sqlite3.Error as e:
+        print(f"✗ 取得鎖失敗：{e}")
+        return False
+
+
+def renew_lock(name: str, owner: str, ttl: float) -> bool:
+    """
+    延長跨行程鎖的有效期限（僅持有者可延長，長時間作業在各階段之間呼叫）
+    
+    Returns:
+        bool: 仍持有鎖返回 True
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.execute(
+            "UPDATE app_locks SET expires_at = ? WHERE name = ? AND owner = ?",
+            (time.time() + ttl, name, owner)
+        )
+        conn.commit()
+        conn.close()
+        return cursor.rowcount > 0
+        
+    except sqlite3.Error as e:
+        print(f"✗ 延長鎖失敗：{e}")
+        return False
+
+
+def release_lock(name: str, owner: str) -> bool:
+    """
+    釋放跨行程鎖（僅持有者可釋放）
+    
+    Returns:
+        bool: 成功釋放返回 True
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.execute(
+            "DELETE FROM app_locks WHERE name = ? AND owner = ?", (name, owner)
+        )
+        conn.commit()
+        conn.close()
+        return cursor.rowcount > 0
+        
+    except sqlite3.Error as e:
+        print(f"✗ 釋放鎖失敗：{e}")
+        return False
+
+
+def find_partitions(cursor: sqlite3.Cursor, start_date: Optional[str] = None,
+                    end_date: Optional[str] = None,
+                    batch_id: Optional[int] = None,
+                    after_batch_id: Optional[int] = None) -> List[Tuple[str, str]]:
+    """
+    查詢路由：依日期範圍或批次找出需要附加的月分區
+    
+    Args:
+        cursor: 資料庫游標
+        start_date: 起始日期（YYYY-MM-DD，含），None 表示不限
+        end_date: 結束日期（YYYY-MM-DD，含），None 表示不限
+        batch_id: 只找包含此批次的分區（指定時忽略日期範圍）
+        after_batch_id: 只找包含比此批次 ID 更新的批次的分區
+        
+    Returns:
+        List[Tuple[str, str]]: [(月份 YYYY-MM, 檔案路徑), ...]，由新到舊；
+                               檔案已移出分區目錄（封存）的月份會略過
+    """
+    if batch_id is not None:
+        cursor.execute("""
+            SELECT p.month, p.file
+            FROM archived_batches a
+            JOIN weather_partitions p ON p.month = a.month
+            WHERE a.batch_id = ?
+        """, (batch_id,))
+    else:
+        cursor.execute("""
+            SELECT month, file
+            FROM weather_partitions
+            WHERE (? IS NULL OR max_created_at >= ?)
+              AND (? IS NULL OR min_created_at < date(?, '+1 day'))
+              AND (? IS NULL OR max_batch_id > ?)
+            ORDER BY month DESC
+        """, (start_date, start_date, end_date, end_date, after_batch_id, after_batch_id))
+    
+    partitions = []
+    for month, file in cursor.fetchall():
+        path = os.path.join(PARTITION_DIR, file)
+        if os.path.exists(path):
+            partitions.append((month, path))
+    return partitions
+
+
+def iter_weather_sources(conn: sqlite3.Connection, partitions: List[Tuple[str, str]],
+                         include_main: bool = True):
+    """
+    附加分區並產生與 weather_detail 欄位相同的查詢來源
+    
+    沒有分區時直接使用 weather_detail；否則每次最多附加 PARTITION_ATTACH_LIMIT 個分區，
+    以 UNION ALL 合併（主資料庫只包含在第一組），查詢完成後卸離。
+    
+    Args:
+        conn: 資料庫連接（不可在交易中）
+        partitions: find_partitions() 的結果
+        include_main: 是否包含主資料庫的 weather
+        
+    Yields:
+        str: 可放在 FROM 之後的資料表或子查詢
+    """
+    if not partitions:
+        if include_main:
+            yield 'weather_detail'
+        return
+    
+    columns = ", ".join(WEATHER_COLUMN_NAMES)
+    for start in range(0, len(partitions), PARTITION_ATTACH_LIMIT):
+        schemas = []
+        try:
+            for month, path in partitions[start:start + PARTITION_ATTACH_LIMIT]:
+                schema = f"p{month.replace('-', '')}"
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+                schemas.append(schema)
+            
+            tables = [f"{schema}.weather" for schema in schemas]
+            if include_main and start == 0:
+                # 分區存放完整批次；主資料庫使用差異儲存時先還原快照
+                main_source = weather_source(conn.cursor())
+                tables.insert(0, 'main.weather' if main_source == 'weather' else main_source)
+            union = " UNION ALL ".join(f"SELECT {columns} FROM {table}" for table in tables)
+            yield f"({WEATHER_DETAIL_SQL.format(source=f'({union})')})"
+        finally:
+            for schema in schemas:
+                conn.execute(f"DETACH DATABASE {schema}")
+
+
+def refresh_partition_catalog(conn: sqlite3.Connection, month: str, file: str):
+    """
+    依附加為 part 的分區內容重寫該月份的目錄（不提交交易）
+
+    分區已沒有資料時移除該月份的目錄記錄。
+    """
+    conn.execute("DELETE FROM main.archived_batches WHERE month = ?", (month,))
+    conn.execute("""
+        INSERT INTO main.archived_batches (batch_id, month, count, created_at)
+        SELECT batch_id, ?, COUNT(*), MIN(created_at)
+        FROM part.weather
+        GROUP BY batch_id
+    """, (month,))
+    conn.execute("""
+        INSERT INTO main.weather_partitions (month, file, min_batch_id, max_batch_id,
+                                             min_created_at, max_created_at, row_count)
+        SELECT ?, ?, MIN(batch_id), MAX(batch_id), MIN(created_at), MAX(created_at), COUNT(*)
+        FROM part.weather
+        WHERE true
+        ON CONFLICT (month) DO UPDATE SET
+            file = excluded.file,
+            min_batch_id = excluded.min_batch_id,
+            max_batch_id = excluded.max_batch_id,
+            min_created_at = excluded.min_created_at,
+            max_created_at = excluded.max_created_at,
+            row_count = excluded.row_count
+    """, (month, file))
+    conn.execute("DELETE FROM main.weather_partitions WHERE month = ? AND row_count = 0", (month,))
+
+
+def remove_archived_batches(conn: sqlite3.Connection, batch_ids: List[int]) -> int:
+    """
+    從月分區刪除指定的批次並更新目錄（重新寫入已移出的批次前呼叫，避免同一批次重複）
+
+    每個分區各自開放寫入、附加後在單一交易中刪除，完成後恢復唯讀（已沒有資料的分區檔案直接刪除）；
+    分區檔案已移出分區目錄（封存）時只移除目錄中的批次記錄。
+
+    Args:
+        conn: 資料庫連接（不可在交易中）
+        batch_ids: 批次 ID 列表
+
+    Returns:
+        int: 從分區刪除的資料筆數
+    """
+    if not batch_ids:
+        return 0
+    placeholders = ",".join("?" * len(batch_ids))
+    owners = {}
+    for row in conn.execute(f"""
+        SELECT a.batch_id, p.month, p.file
+        FROM archived_batches a
+        JOIN weather_partitions p ON p.month = a.month
+        WHERE a.batch_id IN ({placeholders})
+    """, batch_ids).fetchall():
+        owners.setdefault((row['month'], row['file']), []).append(row['batch_id'])
+    
+    deleted = 0
+    for (month, file), owned in owners.items():
+        path = os.path.join(PARTITION_DIR, file)
+        owned_placeholders = ",".join("?" * len(owned))
+        if not os.path.exists(path):
+            conn.execute(f"DELETE FROM archived_batches WHERE batch_id IN ({owned_placeholders})",
+                         owned)
+            conn.commit()
+            continue
+        
+        os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+        conn.execute("ATTACH DATABASE ? AS part", (path,))
+        try:
+            try:
+                deleted += conn.execute(
+                    f"DELETE FROM part.weather WHERE batch_id IN ({owned_placeholders})", owned
+                ).rowcount
+                refresh_partition_catalog(conn, month, file)
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        finally:
+            conn.execute("DETACH DATABASE part")
+        
+        if conn.execute("SELECT 1 FROM weather_partitions WHERE month = ?", (month,)).fetchone():
+            os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        else:
+            os.remove(path)
+    return deleted
+
+
+def clear_partitions(conn: sqlite3.Connection) -> int:
+    """
+    刪除所有月分區檔案並清空目錄（重新匯入全部歷史資料前使用）
+
+    Returns:
+        int: 刪除的分區檔案數
+    """
+    files = [row['file'] for row in conn.execute("SELECT file FROM weather_partitions").fetchall()]
+    conn.execute("DELETE FROM archived_batches")
+    conn.execute("DELETE FROM weather_partitions")
+    conn.commit()
+    
+    removed = 0
+    for file in files:
+        path = os.path.join(PARTITION_DIR, file)
+        if os.path.exists(path):
+            os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def get_latest_weather() -> List[Dict]:
+    """
+    查詢最新一批天氣資料
+    
+    Returns:
+        List[Dict]: 最新批次的天氣資料
+    """
+    try:
+        conn = get_connection()
+        
+        # 批次 ID 依時間遞增，最大值即最新批次（直接由索引取得；差異儲存時
+        # 最新批次可能沒有寫入任何資料列，改由批次目錄取得）；
+        # 主資料庫沒有資料時才使用已移到分區的批次
+        batches = 'weather_batches' if uses_delta_storage(conn.cursor()) else 'weather'
+        latest_batch_id = conn.execute(f"""
+            SELECT COALESCE((SELECT MAX(batch_id) FROM {batches}),
+                            (SELECT MAX(batch_id) FROM archived_batches))
+        """).fetchone()[0]
+        conn.close()
         
     except sqlite3.Error as e:
         print(f"✗ 查詢失敗：{e}")
         return []
+    
+    if latest_batch_id is None:
+        return []
+    return get_weather_by_batch(latest_batch_id)
 
 
 def get_all_weather() -> List[Dict]:
     """
-    查詢所有歷史天氣資料
+    查詢所有歷史天氣資料（包含所有分區）
     
     Returns:
         List[Dict]: 所有天氣資料
@@ -152,14 +972,17 @@ def get_all_weather() -> List[Dict]:
         conn = get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT id, batch_id, location, min_temp, max_temp, description,
-                   fetch_time, created_at
-            FROM weather
-            ORDER BY created_at DESC, location
-        """)
+        # 分區由新到舊附加，依序串接即維持批次遞減的順序
+        rows = []
+        for source in iter_weather_sources(conn, find_partitions(cursor)):
+            cursor.execute(f"""
+                SELECT id, batch_id, location, min_temp, max_temp, description,
+                       fetch_time, created_at
+                FROM {source}
+                ORDER BY batch_id DESC, location
+            """)
+            rows.extend(cursor.fetchall())
         
-        rows = cursor.fetchall()
         conn.close()
         
         return [dict(row) for row in rows]
@@ -169,7 +992,7 @@ def get_all_weather() -> List[Dict]:
         return []
 
 
-def get_weather_by_batch(batch_id: str) -> List[Dict]:
+def get_weather_by_batch(batch_id: int) -> List[Dict]:
     """
     查詢特定批次的天氣資料
     
@@ -183,15 +1006,19 @@ def get_weather_by_batch(batch_id: str) -> List[Dict]:
         conn = get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT id, batch_id, location, min_temp, max_temp, description,
-                   fetch_time, created_at
-            FROM weather
-            WHERE batch_id = ?
-            ORDER BY location
-        """, (batch_id,))
+        # 已移到分區的批次只附加所在的分區，其他批次只查主資料庫
+        partitions = find_partitions(cursor, batch_id=batch_id)
+        rows = []
+        for source in iter_weather_sources(conn, partitions, include_main=not partitions):
+            cursor.execute(f"""
+                SELECT id, batch_id, location, min_temp, max_temp, description,
+                       fetch_time, created_at
+                FROM {source}
+                WHERE batch_id = ?
+                ORDER BY location
+            """, (batch_id,))
+            rows.extend(cursor.fetchall())
         
-        rows = cursor.fetchall()
         conn.close()
         
         return [dict(row) for row in rows]
@@ -201,9 +1028,9 @@ def get_weather_by_batch(batch_id: str) -> List[Dict]:
         return []
 
 
-def get_batch_list() -> List[Tuple[str, int, str]]:
+def get_batch_list() -> List[Tuple[int, int, str]]:
     """
-    查詢所有批次列表
+    查詢所有批次列表（已移到分區的批次由 archived_batches 取得，不需附加分區）
     
     Returns:
         List[Tuple]: [(batch_id, count, created_at), ...]
@@ -212,11 +1039,14 @@ def get_batch_list() -> List[Tuple[str, int, str]]:
         conn = get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT batch_id, COUNT(*) as count, MIN(created_at) as created_at
-            FROM weather
+            FROM {weather_source(cursor)}
             GROUP BY batch_id
-            ORDER BY created_at DESC
+            UNION ALL
+            SELECT batch_id, count, created_at
+            FROM archived_batches
+            ORDER BY batch_id DESC
         """)
         
         rows = cursor.fetchall()
@@ -229,6 +1059,190 @@ def get_batch_list() -> List[Tuple[str, int, str]]:
         return []
 
 
+def merge_daily_rollup(rows: List[Dict], rollup: List[Dict]) -> List[Dict]:
+    """
+    將保留策略的每日彙總（weather_daily_rollup）合併進每日彙總結果
+
+    同一天、同一地區同時有彙總與保留的批次時（保留期限當天），
+    以各自的樣本數（非 NULL 的最低溫、最高溫筆數）加權合併平均值，最低/最高溫取兩者的極值。
+    """
+    merged = {(row['day'], row['location']): row for row in rows}
+    for item in rollup:
+        key = (item['day'], item['location'])
+        row = merged.get(key)
+        if row is None:
+            merged[key] = {
+                'day': item['day'], 'location': item['location'],
+                'min_temp': item['min_temp'], 'max_temp': item['max_temp'],
+                'avg_min_temp': item['sum_min_temp'] / item['min_count'] if item['min_count'] else None,
+                'avg_max_temp': item['sum_max_temp'] / item['max_count'] if item['max_count'] else None,
+                'batch_count': item['batch_count'],
+                'min_count': item['min_count'], 'max_count': item['max_count'],
+            }
+            continue
+        
+        for kind, pick in (('min', min), ('max', max)):
+            values = [v for v in (row[f'{kind}_temp'], item[f'{kind}_temp']) if v is not None]
+            row[f'{kind}_temp'] = pick(values) if values else None
+            raw_count = row[f'{kind}_count']
+            total = raw_count + item[f'{kind}_count']
+            if total:
+                raw_sum = (row[f'avg_{kind}_temp'] or 0) * raw_count
+                row[f'avg_{kind}_temp'] = (raw_sum + item[f'sum_{kind}_temp']) / total
+            row[f'{kind}_count'] = total
+        row['batch_count'] += item['batch_count']
+    return list(merged.values())
+
+
+def get_daily_summary(start_date: Optional[str] = None,
+                      end_date: Optional[str] = None) -> List[Dict]:
+    """
+    查詢每日各地區的溫度彙總（跨批次，只附加日期範圍內的分區）
+    
+    保留策略以 rollup 模式刪除的批次由每日彙總（weather_daily_rollup）補回，
+    結果包含已刪除原始資料的日期。
+    
+    Args:
+        start_date: 起始日期（YYYY-MM-DD，含），None 表示不限
+        end_date: 結束日期（YYYY-MM-DD，含），None 表示不限
+        
+    Returns:
+        List[Dict]: [{'day', 'location', 'min_temp', 'max_temp',
+                      'avg_min_temp', 'avg_max_temp', 'batch_count'}, ...]
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        rows = []
+        for source in iter_weather_sources(conn, find_partitions(cursor, start_date, end_date)):
+            cursor.execute(f"""
+                SELECT date(w.created_at) AS day, w.location,
+                       MIN(w.min_temp) AS min_temp, MAX(w.max_temp) AS max_temp,
+                       AVG(w.min_temp) AS avg_min_temp, AVG(w.max_temp) AS avg_max_temp,
+                       COUNT(DISTINCT w.batch_id) AS batch_count,
+                       COUNT(w.min_temp) AS min_count, COUNT(w.max_temp) AS max_count
+                FROM {source} w
+                WHERE (? IS NULL OR w.created_at >= ?)
+                  AND (? IS NULL OR w.created_at < date(?, '+1 day'))
+                GROUP BY day, w.location_id
+            """, (start_date, start_date, end_date, end_date))
+            rows.extend(dict(row) for row in cursor.fetchall())
+        
+        if table_columns(cursor, 'weather_daily_rollup'):
+            cursor.execute("""
+                SELECT r.day, l.name AS location, r.min_temp, r.max_temp,
+                       r.sum_min_temp, r.sum_max_temp, r.min_count, r.max_count, r.batch_count
+                FROM weather_daily_rollup r
+                JOIN locations l ON l.id = r.location_id
+                WHERE (? IS NULL OR r.day >= ?)
+                  AND (? IS NULL OR r.day <= ?)
+            """, (start_date, start_date, end_date, end_date))
+            rows = merge_daily_rollup(rows, [dict(row) for row in cursor.fetchall()])
+        
+        conn.close()
+        
+        # 分區以月份切分，同一天不會分散在不同組，合併後再排序
+        for row in rows:
+            del row['min_count'], row['max_count']
+        rows.sort(key=lambda row: (row['day'], row['location']))
+        return rows
+        
+    except sqlite3.Error as e:
+        print(f"✗ 查詢失敗：{e}")
+        return []
+
+
+def escape_like(text: str) -> str:
+    """跳脫 LIKE 的萬用字元（搭配 ESCAPE '\\'）"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def query_weather(locations: Optional[List[str]] = None,
+                  start_date: Optional[str] = None,
+                  end_date: Optional[str] = None,
+                  description: Optional[str] = None,
+                  sort_by: str = 'created_at',
+                  descending: bool = True,
+                  limit: int = WEATHER_PAGE_SIZE,
+                  offset: int = 0) -> Tuple[List[Dict], int]:
+    """
+    依條件篩選、排序並分頁查詢歷史天氣資料（只讀取目前頁面的資料列）
+    
+    Args:
+        locations: 地區名稱列表，None 或空列表表示不限
+        start_date: 起始日期（YYYY-MM-DD，含），None 表示不限
+        end_date: 結束日期（YYYY-MM-DD，含），None 表示不限
+        description: 天氣描述關鍵字（部分比對）
+        sort_by: 排序欄位（WEATHER_SORT_COLUMNS 之一）
+        descending: 是否遞減排序
+        limit: 每頁筆數
+        offset: 略過的筆數
+        
+    Returns:
+        Tuple[List[Dict], int]: (目前頁面的資料, 符合條件的總筆數)
+    """
+    if sort_by not in WEATHER_SORT_COLUMNS:
+        raise ValueError(f"不支援的排序欄位：{sort_by}")
+    
+    conditions = []
+    params = []
+    if locations:
+        conditions.append(f"location IN ({','.join('?' * len(locations))})")
+        params.extend(locations)
+    if start_date:
+        conditions.append("created_at >= ?")
+        params.append(start_date)
+    if end_date:
+        conditions.append("created_at < date(?, '+1 day')")
+        params.append(end_date)
+    if description:
+        conditions.append("description LIKE ? ESCAPE '\\'")
+        params.append(f"%{escape_like(description)}%")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    direction = "DESC" if descending else "ASC"
+    
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        # 只附加日期範圍內的分區；超過單次可附加的數量時分組查詢
+        partitions = find_partitions(cursor, start_date, end_date)
+        grouped = len(partitions) > PARTITION_ATTACH_LIMIT
+        
+        total = 0
+        rows = []
+        for source in iter_weather_sources(conn, partitions):
+            cursor.execute(f"SELECT COUNT(*) FROM {source} {where}", params)
+            total += cursor.fetchone()[0]
+            
+            # id 作為次要排序鍵，讓相同值的資料列在各頁之間順序固定；
+            # 分組時各組取前 offset + limit 筆，合併排序後再分頁
+            cursor.execute(f"""
+                SELECT id, batch_id, location, min_temp, max_temp, description,
+                       fetch_time, created_at
+                FROM {source}
+                {where}
+                ORDER BY {sort_by} {direction}, id {direction}
+                LIMIT ? OFFSET ?
+            """, params + ([offset + limit, 0] if grouped else [limit, offset]))
+            rows.extend(dict(row) for row in cursor.fetchall())
+        
+        conn.close()
+        
+        if grouped:
+            # 與 SQLite 相同：NULL 在遞增排序時排最前面
+            rows.sort(key=lambda row: (row[sort_by] is not None, row[sort_by], row['id']),
+                      reverse=descending)
+            rows = rows[offset:offset + limit]
+        
+        return rows, total
+        
+    except sqlite3.Error as e:
+        print(f"✗ 查詢失敗：{e}")
+        return [], 0
+
+
 def get_database_stats() -> Dict:
     """
     獲取資料庫統計資訊
@@ -240,26 +1254,44 @@ def get_database_stats() -> Dict:
         conn = get_connection()
         cursor = conn.cursor()
         
-        # 總資料筆數
-        cursor.execute("SELECT COUNT(*) as total FROM weather")
+        # 總資料筆數（差異儲存時為還原後的快照筆數，實際寫入的資料列另計）
+        source = weather_source(cursor)
+        cursor.execute(f"SELECT COUNT(*) as total FROM {source}")
         total = cursor.fetchone()['total']
+        cursor.execute("SELECT COUNT(*) as stored FROM weather")
+        stored = cursor.fetchone()['stored']
         
         # 批次數量
-        cursor.execute("SELECT COUNT(DISTINCT batch_id) as batch_count FROM weather")
+        cursor.execute(f"SELECT COUNT(DISTINCT batch_id) as batch_count FROM {source}")
         batch_count = cursor.fetchone()['batch_count']
         
         # 最早資料時間
-        cursor.execute("SELECT MIN(created_at) as earliest FROM weather")
+        cursor.execute(f"SELECT MIN(created_at) as earliest FROM {source}")
         earliest = cursor.fetchone()['earliest']
         
         # 最新資料時間
-        cursor.execute("SELECT MAX(created_at) as latest FROM weather")
+        cursor.execute(f"SELECT MAX(created_at) as latest FROM {source}")
         latest = cursor.fetchone()['latest']
         
+        # 已移到分區的資料（由目錄取得，不需附加分區）
+        cursor.execute("""
+            SELECT COALESCE(SUM(row_count), 0) AS total, MIN(min_created_at) AS earliest,
+                   MAX(max_created_at) AS latest,
+                   (SELECT COUNT(*) FROM archived_batches) AS batch_count
+            FROM weather_partitions
+        """)
+        archived = cursor.fetchone()
+        total += archived['total']
+        stored += archived['total']
+        batch_count += archived['batch_count']
+        earliest = min(filter(None, (earliest, archived['earliest'])), default=None)
+        latest = max(filter(None, (latest, archived['latest'])), default=None)
+        
         conn.close()
         
         return {
             'total_records': total,
+            'stored_records': stored,
             'total_batches': batch_count,
             'earliest_record': earliest,
             'latest_record': latest
@@ -283,6 +1315,7 @@ if __name__ == "__main__":
         if stats:
             print(f"\n資料庫統計：")
             print(f"  總資料筆數：{stats['total_records']}")
+            print(f"  實際儲存筆數：{stats['stored_records']}")
             print(f"  總批次數：{stats['total_batches']}")
             print(f"  最早資料：{stats['earliest_record']}")
             print(f"  最新資料：{stats['latest_record']}")
@@ -292,6 +1325,6 @@ if __name__ == "__main__":
         if batches:
             print(f"\n批次列表：")
             for batch_id, count, created_at in batches:
-                print(f"  - {batch_id}: {count} 筆資料 ({created_at})")
+                print(f"  - {format_batch_id(batch_id)}: {count} 筆資料 ({created_at})")
     
     print("=" * 60)
@@ -0,0 +1,79 @@
+"""
+時間序列降採樣模組
+功能：以 Largest-Triangle-Three-Buckets（LTTB）演算法將長時間序列縮減為指定點數，
+      保留峰值與轉折，趨勢圖只需傳送與圖表寬度相當的點數給 Plotly
+"""
+
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    以 LTTB 選出要保留的資料點
+
+    第一點與最後一點固定保留，其餘點依序分成 threshold - 2 個桶，每個桶保留與
+    「前一個保留點」及「下一個桶的平均點」構成最大三角形面積的點。
+    桶的邊界與平均點一次以 NumPy 計算；逐桶選點依賴前一個桶的結果，
+    迴圈只執行 threshold - 2 次，每次在桶內以向量運算求面積。
+
+    Args:
+        x: 遞增排序的 x 值（時間以數值表示）
+        y: 對應的 y 值（不可包含 NaN）
+        threshold: 目標點數（小於 3 或不少於資料點數時不降採樣）
+
+    Returns:
+        np.ndarray: 保留點的索引（遞增）
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold < 3 or threshold >= n:
+        return np.arange(n)
+
+    # 中間 n - 2 個點分成 threshold - 2 個桶（threshold < n 時每個桶至少一點；
+    # 以整數運算求邊界，避免浮點誤差產生空桶）
+    edges = 1 + np.arange(threshold - 1, dtype=np.intp) * (n - 2) // (threshold - 2)
+    counts = np.diff(edges)
+    bucket_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    bucket_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+
+    # 每個桶的下一個桶平均點（最後一個桶使用最後一點）
+    next_x = np.append(bucket_x[1:], x[-1])
+    next_y = np.append(bucket_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        # 三角形面積的兩倍（比較大小不需除以 2）
+        area = np.abs((ax - next_x[bucket]) * (y[start:end] - ay)
+                      - (ax - x[start:end]) * (next_y[bucket] - ay))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+# 測試程式碼
+if __name__ == "__main__":
+    import time
+
+    print("=" * 60)
+    print("LTTB 降採樣")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    hours = np.arange(24 * 180, dtype=float)
+    temps = 22 + 6 * np.sin(hours / 24 * 2 * np.pi) + rng.normal(0, 1, len(hours))
+    temps[2000] = 40.0   # 單點極值應被保留
+
+    start = time.perf_counter()
+    indices = lttb_indices(hours, temps, 600)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    print(f"✓ {len(hours)} 點 -> {len(indices)} 點（{elapsed:.1f} ms）")
+    print(f"✓ 保留首尾：{indices[0] == 0 and indices[-1] == len(hours) - 1}")
+    print(f"✓ 保留極值：{2000 in indices}")
+    print("=" * 60)
@@ -13,6 +13,7 @@ if sys.platform == 'win32':
 
 import requests
 import json
+import time
 from datetime import datetime
 from typing import Dict, List, Optional
 import os
@@ -44,64 +45,125 @@ if not API_KEY:
 # API 配置
 API_URL = "https://opendata.cwa.gov.tw/fileapi/v1/opendataapi/F-A0010-001"
 
+# 資料來源配置
+# - cwa：中央氣象局 API（預設）
+# - replay：直接讀取本地錄製的回應檔（CWA_REPLAY_FILE）
+# - http(s)://...：其他端點，例如 replay_server.py 啟動的本地替身伺服器
+WEATHER_SOURCE = os.getenv('CWA_WEATHER_SOURCE', 'cwa')
+REPLAY_FILE = os.getenv('CWA_REPLAY_FILE', 'weather_response.json')
 
-def fetch_weather_data() -> Optional[Dict]:
+# 重試配置（僅針對逾時、連線失敗與 5xx 錯誤）
+FETCH_RETRIES = int(os.getenv('CWA_FETCH_RETRIES', '0'))
+RETRY_BACKOFF = float(os.getenv('CWA_RETRY_BACKOFF', '0.5'))
+
+
+def load_replay_payload(path: str = REPLAY_FILE) -> Optional[Dict]:
     """
-    從中央氣象局 API 下載天氣資料
+    從本地檔案讀取錄製的 API 回應
     
+    Args:
+        path: 錄製的 JSON 檔案路徑
+        
     Returns:
         Dict: JSON 資料，如果失敗則返回 None
     """
     try:
-        # 構建完整的 API URL
-        params = {
-            'Authorization': API_KEY,
-            'downloadType': 'WEB',
-            'format': 'JSON'
-        }
-        
-        print("正在從中央氣象局 API 下載資料...")
-        print(f"API URL: {API_URL}")
-        
-        # 發送 GET 請求（跳過 SSL 驗證以避免證書問題）
-        response = requests.get(API_URL, params=params, timeout=30, verify=False)
-        
-        # 抑制 SSL 警告
-        import urllib3
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        
-        # 檢查 HTTP 狀態碼
-        response.raise_for_status()
-        
-        # 解析 JSON
-        data = response.json()
-        
-        print("✓ 資料下載成功！")
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        print(f"✓ 已讀取錄製資料：{path}")
         return data
-        
-    except requests.exceptions.Timeout:
-        print("✗ 錯誤：API 請求超時")
-        return None
-    except requests.exceptions.ConnectionError:
-        print("✗ 錯誤：網路連接失敗")
-        return None
-    except requests.exceptions.HTTPError as e:
-        print(f"✗ HTTP 錯誤：{e}")
+    except FileNotFoundError:
+        print(f"✗ 錯誤：找不到錄製檔案 {path}")
         return None
     except json.JSONDecodeError:
-        print("✗ 錯誤：無法解析 JSON 資料")
-        return None
-    except Exception as e:
-        print(f"✗ 未預期的錯誤：{e}")
+        print(f"✗ 錯誤：無法解析錄製檔案 {path}")
         return None
 
 
-def parse_weather_json(json_data: Dict) -> List[Dict]:
+def fetch_weather_data(source: Optional[str] = None,
+                       retries: Optional[int] = None,
+                       backoff: Optional[float] = None) -> Optional[Dict]:
+    """
+    從中央氣象局 API（或替代來源）下載天氣資料
+    
+    Args:
+        source: 資料來源（'cwa'、'replay' 或 URL），預設使用 CWA_WEATHER_SOURCE
+        retries: 失敗時的重試次數，預設使用 CWA_FETCH_RETRIES
+        backoff: 重試間隔基數（秒），每次重試加倍
+    
+    Returns:
+        Dict: JSON 資料，如果失敗則返回 None
+    """
+    source = source or WEATHER_SOURCE
+    retries = FETCH_RETRIES if retries is None else retries
+    backoff = RETRY_BACKOFF if backoff is None else backoff
+    
+    if source == 'replay':
+        return load_replay_payload()
+    
+    api_url = API_URL if source == 'cwa' else source
+    
+    # 構建完整的 API URL（API 金鑰只傳給中央氣象局，不送往其他端點）
+    params = {
+        'downloadType': 'WEB',
+        'format': 'JSON'
+    }
+    if source == 'cwa':
+        params['Authorization'] = API_KEY
+    
+    print("正在從中央氣象局 API 下載資料...")
+    print(f"API URL: {api_url}")
+    
+    # 抑制 SSL 警告
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    
+    for attempt in range(retries + 1):
+        # 重試前等待（指數退避）
+        if attempt > 0:
+            wait = backoff * (2 ** (attempt - 1))
+            print(f"⟳ 第 {attempt} 次重試（等待 {wait:.1f} 秒）...")
+            time.sleep(wait)
+        
+        try:
+            # 發送 GET 請求（跳過 SSL 驗證以避免證書問題）
+            response = requests.get(api_url, params=params, timeout=30, verify=False)
+            
+            # 檢查 HTTP 狀態碼
+            response.raise_for_status()
+            
+            # 解析 JSON
+            data = response.json()
+            
+            print("✓ 資料下載成功！")
+            return data
+            
+        except requests.exceptions.Timeout:
+            print("✗ 錯誤：API 請求超時")
+        except requests.exceptions.ConnectionError:
+            print("✗ 錯誤：網路連接失敗")
+        except requests.exceptions.HTTPError as e:
+            print(f"✗ HTTP 錯誤：{e}")
+            # 4xx 錯誤重試也不會成功
+            if e.response is not None and e.response.status_code < 500:
+                return None
+        except json.JSONDecodeError:
+            print("✗ 錯誤：無法解析 JSON 資料")
+            return None
+        except Exception as e:
+            print(f"✗ 未預期的錯誤：{e}")
+            return None
+    
+    return None
+
+
+def parse_weather_json(json_data: Dict, verbose: bool = True) -> List[Dict]:
     """
     解析 JSON 資料，提取各地區的天氣資訊
     
     Args:
         json_data: 從 API 獲取的 JSON 資料
+        verbose: 是否輸出解析進度與資料預覽（大量重新解析時可關閉）
         
     Returns:
         List[Dict]: 解析後的天氣資料列表
@@ -110,7 +172,8 @@ def parse_weather_json(json_data: Dict) -> List[Dict]:
                 'location': '地區名稱',
                 'min_temp': 最低溫度,
                 'max_temp': 最高溫度,
-                'description': '天氣描述'
+                'description': '天氣描述',
+                'weather_id': CWA 天氣代碼
             },
             ...
         ]
@@ -118,7 +181,8 @@ def parse_weather_json(json_data: Dict) -> List[Dict]:
     weather_list = []
     
     try:
-        print("\n正在解析 JSON 資料...")
+        if verbose:
+            print("\n正在解析 JSON 資料...")
         
         # 根據實際 CWA API 結構解析資料
         # 路徑：cwaopendata -> resources -> resource -> data -> agrWeatherForecasts -> weatherForecasts -> location[]
@@ -129,7 +193,8 @@ def parse_weather_json(json_data: Dict) -> List[Dict]:
         weather_forecasts = agr_weather.get('weatherForecasts', {})
         locations = weather_forecasts.get('location', [])
         
-        print(f"找到 {len(locations)} 個地區的資料")
+        if verbose:
+            print(f"找到 {len(locations)} 個地區的資料")
         
         for location in locations:
             location_name = location.get('locationName', '未知地區')
@@ -142,7 +207,8 @@ def parse_weather_json(json_data: Dict) -> List[Dict]:
                 'location': location_name,
                 'min_temp': None,
                 'max_temp': None,
-                'description': None
+                'description': None,
+                'weather_id': None
             }
             
             # 提取最低溫度（MinT）
@@ -162,6 +228,7 @@ def parse_weather_json(json_data: Dict) -> List[Dict]:
             wx_daily = wx.get('daily', [])
             if wx_daily:
                 weather_info['description'] = wx_daily[0].get('weather')
+                weather_info['weather_id'] = wx_daily[0].get('weatherid')
             
             # 轉換溫度為浮點數
             if weather_info['min_temp']:
@@ -176,8 +243,18 @@ def parse_weather_json(json_data: Dict) -> List[Dict]:
                 except ValueError:
                     weather_info['max_temp'] = None
             
+            # 轉換天氣代碼為整數（對應 weather_codes 維度表）
+            if weather_info['weather_id']:
+                try:
+                    weather_info['weather_id'] = int(weather_info['weather_id'])
+                except ValueError:
+                    weather_info['weather_id'] = None
+            
             weather_list.append(weather_info)
         
+        if not verbose:
+            return weather_list
+        
         print(f"✓ 成功解析 {len(weather_list)} 筆天氣資料")
         
         # 顯示前 3 筆資料作為預覽
@@ -195,6 +272,221 @@ def parse_weather_json(json_data: Dict) -> List[Dict]:
         return []
 
 
+def parse_issue_date(json_data: Dict) -> Optional[str]:
+    """
+    取得預報發布日期（台灣時間）
+
+    Returns:
+        str: YYYY-MM-DD，回應沒有 sent 欄位時返回 None
+    """
+    return issue_date_from_sent(json_data.get('cwaopendata', {}).get('sent'))
+
+
+def issue_date_from_sent(sent: Optional[str]) -> Optional[str]:
+    """將發布時間（ISO 8601，含時區）轉為台灣日期 YYYY-MM-DD"""
+    if not sent:
+        return None
+    try:
+        return datetime.fromisoformat(sent).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def to_number(value, cast):
+    try:
+        return cast(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_forecast_days(json_data: Dict) -> List[Dict]:
+    """
+    解析每個地區的整週逐日預報（parse_weather_json 只取第一天）
+
+    Returns:
+        List[Dict]: 每個地區、每個預報日一筆
+        [
+            {
+                'location': '地區名稱',
+                'forecast_date': 'YYYY-MM-DD',
+                'min_temp': 最低溫度,
+                'max_temp': 最高溫度,
+                'description': '天氣描述',
+                'weather_id': CWA 天氣代碼
+            },
+            ...
+        ]
+    """
+    forecast_list = []
+    try:
+        locations = (json_data.get('cwaopendata', {}).get('resources', {})
+                     .get('resource', {}).get('data', {})
+                     .get('agrWeatherForecasts', {}).get('weatherForecasts', {})
+                     .get('location', []))
+
+        for location in locations:
+            location_name = location.get('locationName', '未知地區')
+            weather_elements = location.get('weatherElements', {})
+
+            # 三個元素各自列出預報日，依 dataDate 對齊
+            days = {}
+            for element, key, field, cast in (('MinT', 'temperature', 'min_temp', float),
+                                              ('MaxT', 'temperature', 'max_temp', float),
+                                              ('Wx', 'weather', 'description', str),
+                                              ('Wx', 'weatherid', 'weather_id', int)):
+                for entry in weather_elements.get(element, {}).get('daily', []):
+                    date = entry.get('dataDate')
+                    if not date:
+                        continue
+                    day = days.setdefault(date, {
+                        'location': location_name, 'forecast_date': date,
+                        'min_temp': None, 'max_temp': None,
+                        'description': None, 'weather_id': None
+                    })
+                    day[field] = to_number(entry.get(key), cast)
+
+            forecast_list.extend(days[date] for date in sorted(days))
+
+        return forecast_list
+
+    except (AttributeError, TypeError) as e:
+        print(f"✗ 逐日預報解析錯誤：{e}")
+        return []
+
+
+def get_agr_weather(json_data: Dict) -> Dict:
+    """取得 agrWeatherForecasts 區塊（weatherProfile、weatherForecasts、agrAdvices 的上層）"""
+    return (json_data.get('cwaopendata', {}).get('resources', {})
+            .get('resource', {}).get('data', {})
+            .get('agrWeatherForecasts', {}))
+
+
+def parse_weather_profile(json_data: Dict) -> Optional[str]:
+    """
+    解析天氣概況（weatherProfile，整週天氣的文字說明）
+
+    Returns:
+        str: 天氣概況，沒有資料時返回 None
+    """
+    profile = get_agr_weather(json_data).get('weatherProfile')
+    if not isinstance(profile, str) or not profile.strip():
+        return None
+    return profile.strip()
+
+
+def as_list(value) -> List:
+    """CWA 的 XML 轉 JSON 在只有一筆時不使用陣列，統一轉為列表"""
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def parse_advice_sections(advices: Dict) -> Dict:
+    """
+    解析 agrAdvices 區塊（parse_agr_advices 與 payload_decoder.py 共用）
+
+    Args:
+        advices: agrAdvices 區塊
+
+    Returns:
+        Dict: {
+            'degree_days': [{'location', 'forecast_date', 'degree_day', 'accumulated_temperature'}, ...],
+            'crop_limits': [{'crop', 'description', 'min_temp', 'max_temp'}, ...],
+            'crop_stages': [{'crop', 'location', 'breed', 'period', 'period_description', 'stage',
+                             'dibbling_date', 'start_date', 'end_date', 'growing_days',
+                             'accumulated_temperature'}, ...]
+        }
+    """
+    result = {'degree_days': [], 'crop_limits': [], 'crop_stages': []}
+    if not isinstance(advices, dict):
+        return result
+
+    # 各地區逐日的生長度日與累積溫度
+    for location in as_list((advices.get('agrForecasts') or {}).get('location')):
+        location_name = location.get('locationName', '未知地區')
+        for entry in as_list((location.get('weatherElements') or {}).get('daily')):
+            if not entry.get('dataDate'):
+                continue
+            result['degree_days'].append({
+                'location': location_name,
+                'forecast_date': entry['dataDate'],
+                'degree_day': to_number(entry.get('degreeDay'), float),
+                'accumulated_temperature': to_number(entry.get('accumulatedTemperature'), float)
+            })
+
+    # 作物生育期統計（15 年平均與今年至今）
+    for crop in as_list((advices.get('cropStatistics') or {}).get('crop')):
+        crop_name = crop.get('cropName')
+        if not crop_name:
+            continue
+
+        for key, limits in (crop.get('cardinalTemperatures') or {}).items():
+            result['crop_limits'].append({
+                'crop': crop_name,
+                'description': limits.get('description') or key,
+                'min_temp': to_number(limits.get('minimum'), float),
+                'max_temp': to_number(limits.get('maximum'), float)
+            })
+
+        for location in as_list(crop.get('location')):
+            for period, statistics in (location.get('statistics') or {}).items():
+                for stage in as_list(statistics.get('timePeriod')):
+                    result['crop_stages'].append({
+                        'crop': crop_name,
+                        'location': location.get('locationName', '未知地區'),
+                        'breed': location.get('cropBreed'),
+                        'period': period,
+                        'period_description': statistics.get('description'),
+                        'stage': stage.get('description'),
+                        'dibbling_date': statistics.get('dibblingDate'),
+                        'start_date': stage.get('startDate'),
+                        'end_date': stage.get('endDate'),
+                        'growing_days': to_number(stage.get('growingDays'), int),
+                        'accumulated_temperature': to_number(stage.get('accumulatedTemperature'), float)
+                    })
+
+    return result
+
+
+def parse_agr_advices(json_data: Dict) -> Dict:
+    """
+    解析農業氣象建議（agrAdvices：各地區生長度日與作物生育期積溫）
+
+    與天氣預報在同一份回應中，不需另外下載。
+
+    Returns:
+        Dict: 見 parse_advice_sections()
+    """
+    try:
+        return parse_advice_sections(get_agr_weather(json_data).get('agrAdvices'))
+    except (AttributeError, TypeError) as e:
+        print(f"✗ 農業氣象建議解析錯誤：{e}")
+        return parse_advice_sections({})
+
+
+def save_raw_payload(json_data: Dict, batch_id: int, archive_dir: str) -> Optional[str]:
+    """
+    將原始 API 回應存檔，供日後以 backfill.py 重新解析
+    
+    Args:
+        json_data: 從 API 獲取的 JSON 資料
+        batch_id: 批次識別碼（作為檔名）
+        archive_dir: 存檔目錄
+        
+    Returns:
+        str: 存檔路徑，如果失敗則返回 None
+    """
+    try:
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f"{batch_id}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(json_data, f, ensure_ascii=False)
+        return path
+    except OSError as e:
+        print(f"✗ 原始資料存檔失敗：{e}")
+        return None
+
+
 # 測試程式碼（當直接執行此檔案時運行）
 if __name__ == "__main__":
     print("=" * 60)
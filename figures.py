@@ -0,0 +1,497 @@
+"""
+圖表建構模組
+功能：產生儀表板使用的 Plotly 圖表與 HTML 卡片（不依賴 Streamlit），
+      由 app.py 即時顯示，也由 render_static.py 預先輸出為靜態檔案
+"""
+
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from downsampling import lttb_indices
+
+# ==================== 色彩主題系統 ====================
+COLORS = {
+    'primary': '#1E88E5',      # 主藍色
+    'dark_blue': '#0D47A1',    # 深藍色
+    'light_blue': '#90CAF9',   # 淺藍色
+    'cold': '#42A5F5',         # 低溫（藍色）
+    'moderate': '#FFA726',     # 中溫（橙色）
+    'hot': '#EF5350',          # 高溫（紅色）
+    'background': '#F5F5F5',   # 背景灰
+    'text_dark': '#263238',    # 深色文字
+    'text_light': '#FFFFFF',   # 淺色文字
+}
+
+# ==================== 溫度網格圖層設定 ====================
+HEATMAP_RESOLUTION = float(os.getenv('HEATMAP_RESOLUTION', '0.05'))   # 網格間距（度）
+HEATMAP_PIXELS_PER_DEGREE = 50         # 地圖上每度約佔的像素（決定網格方塊大小）
+HEATMAP_TEMP_RANGE = (10, 30)          # 色階對應的溫度範圍
+HEATMAP_COLORSCALE = [
+    [0.0, COLORS['cold']],
+    [0.5, COLORS['moderate']],
+    [1.0, COLORS['hot']],
+]
+
+# ==================== 趨勢圖降採樣設定 ====================
+TREND_CHART_WIDTH = int(os.getenv('TREND_CHART_WIDTH', '1200'))   # 趨勢圖的預估寬度（像素）
+TREND_PIXELS_PER_POINT = 2             # 每個保留點約佔的像素（每條線最多 寬度 / 此值 個點）
+TREND_MARKER_LIMIT = 60                # 點數超過此值時只畫線，不畫標記
+
+# ==================== 地圖檢視設定 ====================
+MAP_CENTER = {'lat': 23.7, 'lon': 120.9}   # 預設中心點（框住台灣）
+MAP_PROJECTION_SCALE = 25                  # 未放大時的投影縮放
+
+# 儀表板樣式（Streamlit 與靜態頁面共用）
+DASHBOARD_CSS = """
+    /* 整體頁面樣式 */
+    .main {
+        background-color: #FAFAFA;
+    }
+    
+    /* 溫度卡片樣式 */
+    .temp-card {
+        padding: 20px;
+        border-radius: 12px;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+        margin: 10px 0;
+        transition: transform 0.2s, box-shadow 0.2s;
+        height: 100%;
+    }
+    
+    .temp-card:hover {
+        transform: translateY(-5px);
+        box-shadow: 0 4px 16px rgba(0,0,0,0.15);
+    }
+    
+    .temp-card-location {
+        font-size: 20px;
+        font-weight: bold;
+        margin-bottom: 10px;
+        color: #263238;
+    }
+    
+    .temp-card-temp {
+        font-size: 36px;
+        font-weight: bold;
+        margin: 10px 0;
+    }
+    
+    .temp-card-desc {
+        font-size: 14px;
+        color: #546E7A;
+        margin-top: 8px;
+    }
+    
+    .temp-label {
+        font-size: 12px;
+        color: #78909C;
+        margin-right: 5px;
+    }
+    
+    /* 統計卡片增強 */
+    .stat-card {
+        background: linear-gradient(135deg, #1E88E5 0%, #1565C0 100%);
+        padding: 20px;
+        border-radius: 10px;
+        color: white;
+        text-align: center;
+    }
+    
+    /* 標題樣式 */
+    .cwa-title {
+        color: #0D47A1;
+        font-size: 42px;
+        font-weight: 700;
+        margin-bottom: 10px;
+        text-align: center;
+    }
+    
+    .cwa-subtitle {
+        color: #546E7A;
+        font-size: 16px;
+        text-align: center;
+        margin-bottom: 30px;
+    }
+"""
+
+# 圖表共用的座標軸樣式
+AXIS_STYLE = dict(showgrid=True, gridcolor='lightgray', showline=True, linecolor='lightgray')
+LEGEND_STYLE = dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+
+
+def get_temp_color(temp):
+    """根據溫度返回對應的顏色"""
+    if temp is None:
+        return COLORS['moderate']
+    if temp < 15:
+        return COLORS['cold']
+    elif temp < 25:
+        return COLORS['moderate']
+    else:
+        return COLORS['hot']
+
+
+def build_card_html(location_data: Dict) -> str:
+    """產生單一地區的溫度卡片 HTML（樣式類別定義於 DASHBOARD_CSS）"""
+    location = location_data['location']
+    min_temp = location_data['min_temp']
+    max_temp = location_data['max_temp']
+    description = location_data['description']
+
+    # 根據平均溫度決定卡片顏色（缺少溫度時使用中溫色）
+    avg_temp = (min_temp + max_temp) / 2 if min_temp is not None and max_temp is not None else None
+    card_color = get_temp_color(avg_temp)
+
+    return f"""
+        <div class="temp-card" style="background: linear-gradient(135deg, {card_color}22 0%, {card_color}44 100%); border-left: 4px solid {card_color};">
+            <div class="temp-card-location">{location}</div>
+            <div class="temp-card-temp" style="color: {card_color};">
+                {min_temp}°C - {max_temp}°C
+            </div>
+            <div class="temp-card-desc">
+                <span class="temp-label">天氣：</span>{description}
+            </div>
+        </div>
+    """
+
+
+def build_temperature_bar_figure(weather_data: List[Dict]) -> go.Figure:
+    """建立各地區最低/最高溫度的條形圖"""
+    locations = [d['location'] for d in weather_data]
+    min_temps = [d['min_temp'] for d in weather_data]
+    max_temps = [d['max_temp'] for d in weather_data]
+
+    fig = go.Figure()
+
+    # 最低溫度條
+    fig.add_trace(go.Bar(
+        name='最低溫度',
+        x=locations,
+        y=min_temps,
+        marker_color=COLORS['cold'],
+        text=min_temps,
+        texttemplate='%{text}°C',
+        textposition='outside',
+        hovertemplate='<b>%{x}</b><br>最低溫度: %{y}°C<extra></extra>'
+    ))
+
+    # 最高溫度條
+    fig.add_trace(go.Bar(
+        name='最高溫度',
+        x=locations,
+        y=max_temps,
+        marker_color=COLORS['hot'],
+        text=max_temps,
+        texttemplate='%{text}°C',
+        textposition='outside',
+        hovertemplate='<b>%{x}</b><br>最高溫度: %{y}°C<extra></extra>'
+    ))
+
+    fig.update_layout(
+        barmode='group',
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(family="Arial, sans-serif", size=12, color=COLORS['text_dark']),
+        xaxis=dict(title='地區', showgrid=False, showline=True, linecolor='lightgray'),
+        yaxis=dict(title='溫度 (°C)', **AXIS_STYLE),
+        hovermode='x unified',
+        legend=LEGEND_STYLE,
+        height=400
+    )
+    return fig
+
+
+def build_temperature_range_figure(weather_data: List[Dict]) -> go.Figure:
+    """建立各地區溫度區間圖"""
+    locations = [d['location'] for d in weather_data]
+    min_temps = [d['min_temp'] for d in weather_data]
+    max_temps = [d['max_temp'] for d in weather_data]
+    temp_ranges = [max_t - min_t for min_t, max_t in zip(min_temps, max_temps)]
+
+    fig = go.Figure()
+
+    # 添加範圍條
+    for i, location in enumerate(locations):
+        avg_temp = (min_temps[i] + max_temps[i]) / 2
+        color = get_temp_color(avg_temp)
+
+        fig.add_trace(go.Scatter(
+            x=[min_temps[i], max_temps[i]],
+            y=[location, location],
+            mode='lines+markers',
+            name=location,
+            line=dict(color=color, width=8),
+            marker=dict(size=12, color=color),
+            hovertemplate=f'<b>{location}</b><br>溫度範圍: {min_temps[i]}°C - {max_temps[i]}°C<br>溫差: {temp_ranges[i]}°C<extra></extra>',
+            showlegend=False
+        ))
+
+    fig.update_layout(
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(family="Arial, sans-serif", size=12, color=COLORS['text_dark']),
+        xaxis=dict(title='溫度 (°C)', **AXIS_STYLE),
+        yaxis=dict(title='', showgrid=False, showline=False),
+        height=300,
+        hovermode='closest'
+    )
+    return fig
+
+
+def build_map_points(weather_data: List[Dict], coordinates: Dict[str, Dict]) -> List[Dict]:
+    """
+    將批次資料對應到地圖座標（缺少座標的地區會被略過，見 missing_map_locations）
+
+    缺少最低或最高溫度的地區仍會標示在地圖上，但 avg_temp 為 None，
+    不列入溫度網格的內插（見 interpolation_points）
+
+    Args:
+        weather_data: 批次資料
+        coordinates: {地區名稱: {'lat', 'lon', 'city'}}（stations.StationRegistry.coordinates()）
+    """
+    map_data = []
+    for location_data in weather_data:
+        location = location_data['location']
+        if location in coordinates:
+            coords = coordinates[location]
+            min_temp = location_data['min_temp']
+            max_temp = location_data['max_temp']
+            has_temps = min_temp is not None and max_temp is not None
+            avg_temp = (min_temp + max_temp) / 2 if has_temps else None
+
+            map_data.append({
+                'location': location,
+                'city': coords['city'],
+                'lat': coords['lat'],
+                'lon': coords['lon'],
+                'min_temp': min_temp,
+                'max_temp': max_temp,
+                'avg_temp': avg_temp,
+                'description': location_data['description'],
+                'color': get_temp_color(avg_temp)
+            })
+    return map_data
+
+
+def interpolation_points(map_data: List[Dict]) -> Dict[str, List[float]]:
+    """
+    溫度網格的內插輸入：只使用有實際溫度的地區
+
+    Returns:
+        Dict: {'lon': [...], 'lat': [...], 'value': [...]}（對應 spatial.temperature_surface 的參數）
+    """
+    measured = [d for d in map_data if d['avg_temp'] is not None]
+    return {
+        'lon': [d['lon'] for d in measured],
+        'lat': [d['lat'] for d in measured],
+        'value': [d['avg_temp'] for d in measured]
+    }
+
+
+def format_temp(temp) -> str:
+    """地圖標籤的溫度文字（缺少資料時顯示 —）"""
+    return f"{temp:.1f}°C" if temp is not None else "—"
+
+
+def missing_map_locations(weather_data: List[Dict], coordinates: Dict[str, Dict]) -> List[str]:
+    """批次資料中沒有座標、因此不會出現在地圖上的地區"""
+    return sorted({d['location'] for d in weather_data} - set(coordinates))
+
+
+def build_temperature_map_figure(map_data: List[Dict], surface: Dict,
+                                 resolution: float = HEATMAP_RESOLUTION,
+                                 zoom: float = 1,
+                                 center: Optional[Dict] = None) -> go.Figure:
+    """
+    建立台灣溫度分布地圖
+
+    Args:
+        map_data: build_map_points() 的結果（可先篩選為可見的地區）
+        surface: spatial.temperature_surface() 的內插網格
+        resolution: 網格間距（決定方塊大小）
+        zoom: 放大倍數（1 為全台灣）
+        center: 放大時的中心點 {'lat', 'lon'}，None 時使用 MAP_CENTER
+    """
+    fig = go.Figure()
+
+    # 熱力圖效果 (A): 以 IDW 內插的溫度網格作為單一圖層
+    fig.add_trace(go.Scattergeo(
+        lon=surface['lon'],
+        lat=surface['lat'],
+        mode='markers',
+        marker=dict(
+            symbol='square',
+            size=max(3, resolution * HEATMAP_PIXELS_PER_DEGREE * zoom),
+            color=surface['value'],
+            colorscale=HEATMAP_COLORSCALE,
+            cmin=HEATMAP_TEMP_RANGE[0],
+            cmax=HEATMAP_TEMP_RANGE[1],
+            opacity=0.45,
+            line=dict(width=0)
+        ),
+        showlegend=False,
+        hoverinfo='skip'
+    ))
+
+    # 中心標記點（所有地區合併為單一圖層）
+    fig.add_trace(go.Scattergeo(
+        lon=[d['lon'] for d in map_data],
+        lat=[d['lat'] for d in map_data],
+        text=[f"{d['city']}<br>{format_temp(d['avg_temp'])}" for d in map_data],
+        customdata=[
+            [d['location'], d['city'], format_temp(d['min_temp']), format_temp(d['max_temp']),
+             format_temp(d['avg_temp']), d['description']]
+            for d in map_data
+        ],
+        mode='markers+text',
+        marker=dict(
+            size=[max(20, min(20 + (d['avg_temp'] - 15) * 1.5, 45)) if d['avg_temp'] is not None else 20
+                  for d in map_data],
+            color=[d['color'] for d in map_data],
+            line=dict(width=3, color='white'),
+            opacity=0.9
+        ),
+        textposition='top center',
+        textfont=dict(
+            size=13,
+            color=COLORS['text_dark'],
+            family='Arial Black',
+        ),
+        hovertemplate=(
+            "<b>%{customdata[0]}</b> (%{customdata[1]})<br>"
+            "🌡️ 溫度範圍: %{customdata[2]} - %{customdata[3]}<br>"
+            "📊 平均溫度: %{customdata[4]}<br>"
+            "☁️ 天氣: %{customdata[5]}<br>"
+            "<extra></extra>"
+        ),
+        showlegend=False
+    ))
+
+    # 改進地圖樣式 (B): 更詳細的台灣地圖設定
+    fig.update_geos(
+        center=center or MAP_CENTER,       # 調整中心點以更好地框住台灣
+        projection_scale=MAP_PROJECTION_SCALE * zoom,   # 增加縮放以顯示更多細節
+        showcountries=True,
+        countrycolor='#CCCCCC',
+        showland=True,
+        landcolor='#F0F0F0',              # 淺灰色陸地
+        showocean=True,
+        oceancolor='#E3F2FD',             # 淺藍色海洋
+        coastlinecolor='#78909C',         # 深灰色海岸線
+        coastlinewidth=1.5,
+        showlakes=True,
+        lakecolor='#BBDEFB',
+        projection_type='mercator',
+        visible=True,
+        resolution=50,                     # 提高解析度
+        showframe=True,
+        framecolor='#BDBDBD',
+        framewidth=1
+    )
+
+    fig.update_layout(
+        height=550,
+        margin=dict(l=0, r=0, t=10, b=0),
+        paper_bgcolor='#FAFAFA',
+        font=dict(family="Arial", size=12),
+        geo=dict(
+            bgcolor='#FFFFFF',
+        ),
+        hoverlabel=dict(
+            bgcolor="white",
+            font_size=13,
+            font_family="Arial"
+        )
+    )
+    if zoom > 1:
+        # 放大時只傳送可見範圍內的資料，停用拖曳平移以免移到沒有資料的區域
+        fig.update_layout(dragmode=False)
+    return fig
+
+
+def build_trend_figure(df: pd.DataFrame, locations: List[str],
+                       temp_col: str, temp_type: str,
+                       chart_width: int = TREND_CHART_WIDTH) -> go.Figure:
+    """
+    建立多批次的溫度趨勢圖
+
+    每條線以 LTTB 降採樣為 chart_width / TREND_PIXELS_PER_POINT 個點後才加入圖表，
+    數個月的批次也只傳送與圖表寬度相當的點數，並保留峰值與轉折。
+
+    Args:
+        df: 需包含 location、batch_time 與溫度欄位
+        locations: 要顯示的地區
+        temp_col: min_temp 或 max_temp
+        temp_type: 溫度類型標籤（顯示用）
+        chart_width: 圖表寬度（像素），決定每條線保留的點數
+    """
+    fig = go.Figure()
+    max_points = max(3, chart_width // TREND_PIXELS_PER_POINT)
+
+    for location in locations:
+        location_df = df[df['location'] == location].sort_values('batch_time')
+        if len(location_df) > max_points:
+            location_df = location_df.dropna(subset=[temp_col])
+            times = pd.to_datetime(location_df['batch_time']).to_numpy(dtype='datetime64[s]')
+            keep = lttb_indices(times.astype(np.int64), location_df[temp_col].to_numpy(), max_points)
+            location_df = location_df.iloc[keep]
+
+        fig.add_trace(go.Scatter(
+            x=location_df['batch_time'],
+            y=location_df[temp_col],
+            mode='lines+markers' if len(location_df) <= TREND_MARKER_LIMIT else 'lines',
+            name=location,
+            line=dict(width=2),
+            marker=dict(size=8),
+            hovertemplate=f'<b>{location}</b><br>時間: %{{x}}<br>{temp_type}: %{{y}}°C<extra></extra>'
+        ))
+
+    fig.update_layout(
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(family="Arial, sans-serif", size=12, color=COLORS['text_dark']),
+        xaxis=dict(title='批次時間', **AXIS_STYLE),
+        yaxis=dict(title=f'{temp_type} (°C)', **AXIS_STYLE),
+        hovermode='x unified',
+        legend=LEGEND_STYLE,
+        height=400
+    )
+    return fig
+
+
+def build_forecast_skill_figure(skill: pd.DataFrame) -> go.Figure:
+    """建立依預報時效的校驗圖（偏差與平均絕對誤差）"""
+    fig = go.Figure()
+    for kind, label, color in (('max', '最高溫', COLORS['hot']), ('min', '最低溫', COLORS['cold'])):
+        fig.add_trace(go.Bar(
+            x=skill['lead_days'],
+            y=skill[f'mae_{kind}'],
+            name=f'{label} MAE',
+            marker_color=color,
+            opacity=0.8,
+            hovertemplate=f'時效 %{{x}} 天<br>{label} MAE: %{{y:.2f}}°C<extra></extra>'
+        ))
+        fig.add_trace(go.Scatter(
+            x=skill['lead_days'],
+            y=skill[f'bias_{kind}'],
+            name=f'{label}偏差',
+            mode='lines+markers',
+            line=dict(color=color, width=2, dash='dot'),
+            hovertemplate=f'時效 %{{x}} 天<br>{label}偏差: %{{y:+.2f}}°C<extra></extra>'
+        ))
+
+    fig.update_layout(
+        barmode='group',
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(family="Arial, sans-serif", size=12, color=COLORS['text_dark']),
+        xaxis=dict(title='預報時效（天）', dtick=1, showline=True, linecolor='lightgray'),
+        yaxis=dict(title='誤差 (°C)', showgrid=True, gridcolor='lightgray', zeroline=True),
+        legend=LEGEND_STYLE,
+        height=400
+    )
+    return fig
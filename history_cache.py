@@ -0,0 +1,211 @@
+"""
+歷史資料共享快取模組
+功能：匯入後將完整歷史輸出為 Arrow IPC 檔案（以原子方式取代），
+      多個 Streamlit 伺服器行程以記憶體映射（memory map）零複製讀取，
+      共用作業系統的頁面快取，不必各自查詢資料庫並在記憶體中保存一份
+"""
+
+import functools
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from storage import get_all_weather, get_batch_list, get_weather_by_batch
+
+# pyarrow 為選用套件（pip install pyarrow）
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+
+# 未設定時不輸出快取，app.py 直接查詢資料庫
+HISTORY_CACHE_PATH = os.getenv('WEATHER_HISTORY_CACHE')
+HISTORY_APPEND_LIMIT = 50   # 快取缺少的批次超過此數量時改為完整重建（單一查詢比逐批次查詢快）
+
+_cache = {'key': None, 'table': None, 'batch_ids': None}
+_cache_lock = threading.Lock()
+
+
+def history_schema():
+    """快取檔案的欄位（文字欄位以字典編碼儲存）"""
+    return pa.schema([
+        ('batch_id', pa.int64()),
+        ('location', pa.dictionary(pa.int32(), pa.string())),
+        ('min_temp', pa.float64()),
+        ('max_temp', pa.float64()),
+        ('description', pa.dictionary(pa.int32(), pa.string())),
+        ('created_at', pa.timestamp('s')),
+    ])
+
+
+def rows_to_table(rows: List[Dict]):
+    """天氣資料列轉為快取格式（時間欄位以 pandas 向量化轉換）"""
+    schema = history_schema()
+    df = pd.DataFrame(rows, columns=schema.names)
+    df['created_at'] = pd.to_datetime(df['created_at'].astype(str).str[:19], format="%Y-%m-%d %H:%M:%S")
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False).replace_schema_metadata()
+
+
+def publish_history_cache(path: Optional[str] = None, rebuild: bool = False) -> int:
+    """
+    更新歷史資料的 Arrow IPC 檔案
+
+    既有快取只補上缺少的批次、移除資料庫中已刪除的批次（保留策略），
+    不必每次重新查詢並轉換全部歷史；沒有快取、缺少的批次太多或 rebuild 時完整重建。
+    先寫入暫存檔再以 os.replace 取代：已映射舊檔案的行程繼續讀取舊內容，
+    下次開啟時才切換到新檔案。檔案不壓縮，才能直接映射使用。
+
+    Args:
+        path: 快取檔案路徑，None 時使用 WEATHER_HISTORY_CACHE
+        rebuild: 完整重建（既有批次的內容被改寫時使用，例如 backfill.py）
+
+    Returns:
+        int: 快取中的資料筆數
+    """
+    path = path or HISTORY_CACHE_PATH
+    if not path:
+        return 0
+    if pa is None:
+        raise ImportError("使用歷史快取需要先安裝：pip install pyarrow")
+
+    current = {batch_id for batch_id, _, _ in get_batch_list()}
+    existing = None if rebuild else load_history_cache(path)
+    if existing is not None:
+        cached = _cache['batch_ids']
+        missing = sorted(current - cached)
+        if not missing and cached == current:
+            return existing.num_rows
+        if len(missing) > HISTORY_APPEND_LIMIT:
+            existing = None
+
+    if existing is None:
+        # 由舊到新排列，趨勢圖可直接使用
+        table = rows_to_table(get_all_weather()[::-1])
+    else:
+        kept = existing
+        if cached - current:
+            kept = existing.filter(pc.is_in(existing['batch_id'],
+                                            value_set=pa.array(sorted(current), pa.int64())))
+        added = rows_to_table([row for batch_id in missing for row in get_weather_by_batch(batch_id)])
+        # IPC 檔案格式的每個字典欄位只能有一個字典，合併後統一
+        table = pa.concat_tables([kept, added]).unify_dictionaries().combine_chunks()
+        if missing and cached and missing[0] < max(cached):
+            table = table.sort_by('batch_id')
+
+    schema = history_schema()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return table.num_rows
+
+
+def load_history_cache(path: Optional[str] = None):
+    """
+    以記憶體映射開啟快取檔案（零複製）
+
+    每個行程只保留一個映射，檔案被取代（inode 或修改時間改變）後才重新開啟。
+
+    Returns:
+        pyarrow.Table: 快取內容，未設定、未安裝 pyarrow 或檔案不存在時返回 None
+    """
+    path = path or HISTORY_CACHE_PATH
+    if not path or pa is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        if _cache['key'] != key:
+            try:
+                source = pa.memory_map(path, 'r')
+                table = pa.ipc.open_file(source).read_all()
+                _cache['batch_ids'] = set(pc.unique(table['batch_id']).to_pylist())
+                _cache['table'] = table
+                _cache['key'] = key
+            except (OSError, pa.ArrowInvalid) as e:
+                print(f"✗ 歷史快取讀取失敗：{e}")
+                return None
+        return _cache['table']
+
+
+def get_history_frame(batch_ids: Optional[List[int]] = None,
+                      path: Optional[str] = None,
+                      start_date: Optional[str] = None,
+                      columns: Optional[List[str]] = None,
+                      locations: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    從快取取出歷史資料（在 Arrow 端選取欄位並篩選，只轉換需要的資料）
+
+    映射的資料表由各行程共用作業系統的頁面快取；篩選條件直接在映射的欄位上計算，
+    只有選取的欄位、符合條件的資料列會複製並轉換為 pandas。結果是行程私有的複本，
+    呼叫端應只取需要的部分，不要再以 st.cache_data 保存。
+
+    快取必須包含所有要求的批次（未指定時需與 get_batch_list() 的批次完全相同），
+    否則視為過期或不完整，返回 None 由呼叫端改為查詢資料庫。
+
+    Args:
+        batch_ids: 只取這些批次，None 表示全部
+        start_date: 只取此日期（YYYY-MM-DD，UTC）之後建立的資料
+        columns: 要轉換的欄位，None 表示全部
+        locations: 只取這些地區，None 表示全部
+
+    Returns:
+        pd.DataFrame: 選取的欄位，無法使用快取時返回 None
+    """
+    table = load_history_cache(path)
+    if table is None:
+        return None
+    with _cache_lock:
+        cached = _cache['batch_ids']
+
+    conditions = []
+    if batch_ids is not None:
+        if not cached.issuperset(batch_ids):
+            return None
+        conditions.append(pc.is_in(table['batch_id'], value_set=pa.array(list(batch_ids), pa.int64())))
+    elif cached != {batch_id for batch_id, _, _ in get_batch_list()}:
+        return None
+    if start_date:
+        conditions.append(pc.greater_equal(
+            table['created_at'], pa.scalar(datetime.strptime(start_date, "%Y-%m-%d"), pa.timestamp('s'))
+        ))
+    if locations is not None:
+        conditions.append(pc.is_in(table['location'], value_set=pa.array(list(locations), pa.string())))
+
+    # 先選取欄位（零複製），篩選時只複製需要的欄位
+    if columns is not None:
+        table = table.select(list(columns))
+    if conditions:
+        table = table.filter(functools.reduce(pc.and_, conditions))
+    return table.to_pandas()
+
+
+# 測試程式碼
+if __name__ == "__main__":
+    import time
+
+    print("=" * 60)
+    print("歷史資料共享快取")
+    print("=" * 60)
+
+    target = HISTORY_CACHE_PATH or 'history.arrow'
+    start = time.perf_counter()
+    count = publish_history_cache(target, rebuild=True)
+    print(f"✓ 已輸出 {count} 筆資料到 {target}（{(time.perf_counter() - start) * 1000:.1f}ms）")
+
+    start = time.perf_counter()
+    table = load_history_cache(target)
+    print(f"✓ 映射開啟：{(time.perf_counter() - start) * 1000:.2f}ms，"
+          f"{table.nbytes / 1024:.0f} KB（不佔用行程私有記憶體）")
+
+    print("=" * 60)
@@ -0,0 +1,163 @@
+"""
+批次匯入流程模組
+功能：將下載的原始回應存檔、解析並寫入新批次，再執行每個批次之後的後續處理
+      （氣候統計、預報校驗、農業氣象、保留策略、月分區、歷史快取、靜態儀表板），
+      main.py 與背景更新（refresh_worker.py）共用同一個流程
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from agr_advices import init_advice_tables, insert_advice_rows
+from batch_keys import generate_batch_id
+from database import batch_exists, get_connection, insert_weather_rows
+from fetch_weather import issue_date_from_sent, save_raw_payload
+from payload_decoder import extract_payload
+from storage import get_repository, insert_weather_data
+from verification import init_forecast_tables, insert_forecast_rows, update_verification
+
+
+def insert_payload_batch(payload: Dict, batch_id: int) -> int:
+    """
+    在單一交易中寫入一個批次的天氣資料、逐日預報與農業氣象資料（SQLite 後端）
+
+    任一部分寫入失敗時整個批次回復，不會留下缺少預報或農業氣象資料的批次；
+    逐日預報與農業氣象資料表在此建立（讀取端不執行結構變更）。
+
+    Args:
+        payload: extract_payload() 的結果
+        batch_id: 批次識別碼
+
+    Returns:
+        int: 寫入的天氣資料筆數，失敗或批次 ID 已存在時返回 0
+    """
+    issued_date = issue_date_from_sent(payload['sent']) or datetime.now().strftime("%Y-%m-%d")
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+
+        # 與 database.insert_weather_data() 相同，先取得寫入鎖再檢查批次 ID
+        cursor.execute("BEGIN IMMEDIATE")
+        if batch_exists(cursor, batch_id):
+            conn.rollback()
+            conn.close()
+            print(f"✗ 資料插入失敗：批次 ID 已存在（{batch_id}）")
+            return 0
+
+        try:
+            init_forecast_tables(conn)
+            init_advice_tables(conn)
+            inserted_count = insert_weather_rows(cursor, payload['weather'], batch_id)
+            insert_forecast_rows(cursor, payload['forecasts'], batch_id, issued_date)
+            insert_advice_rows(cursor, batch_id, issued_date, payload['profile'], payload['advices'])
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        print(f"✓ 成功插入 {inserted_count} 筆資料（批次 ID: {batch_id}）")
+        return inserted_count
+
+    except sqlite3.Error as e:
+        print(f"✗ 資料插入失敗：{e}")
+        return 0
+
+
+def ingest_batch(json_data: Dict, batch_id: Optional[int] = None,
+                 verbose: bool = True,
+                 on_stage: Optional[Callable[[], None]] = None) -> Dict:
+    """
+    匯入一份 F-A0010-001 回應為新批次
+
+    Args:
+        json_data: fetch_weather_data() 取得的原始回應
+        batch_id: 批次 ID，None 時自動產生
+        verbose: 是否輸出解析與後續處理的訊息
+        on_stage: 每個後續處理階段開始前呼叫（背景更新以此延長跨行程鎖）
+
+    Returns:
+        Dict: {'batch_id': 批次 ID, 'rows': 寫入筆數, 'error': 失敗原因（成功為 None）}
+    """
+    if batch_id is None:
+        batch_id = generate_batch_id()
+    result = {'batch_id': batch_id, 'rows': 0, 'error': None}
+
+    # 保存原始資料（設定 CWA_ARCHIVE_DIR 時），供 backfill.py 重新解析
+    archive_dir = os.getenv('CWA_ARCHIVE_DIR')
+    if archive_dir:
+        archive_path = save_raw_payload(json_data, batch_id, archive_dir)
+        if archive_path and verbose:
+            print(f"✓ 原始資料已存檔：{archive_path}")
+
+    # 一次擷取天氣、逐日預報與農業氣象資料
+    try:
+        payload = extract_payload(json_data)
+    except (TypeError, AttributeError, ValueError) as e:
+        print(f"✗ 解析錯誤：{e}")
+        payload = {'weather': []}
+    if not payload['weather']:
+        result['error'] = '無法解析資料'
+        return result
+    if verbose:
+        print(f"✓ 成功解析 {len(payload['weather'])} 筆天氣資料")
+
+    sqlite_backend = get_repository().name == 'sqlite'
+
+    # SQLite 後端在同一個交易中寫入逐日預報與農業氣象資料；其他後端只保存天氣資料
+    if sqlite_backend:
+        result['rows'] = insert_payload_batch(payload, batch_id)
+    else:
+        result['rows'] = insert_weather_data(payload['weather'], batch_id)
+    if not result['rows']:
+        result['error'] = '無法寫入資料庫'
+        return result
+
+    def next_stage():
+        if on_stage is not None:
+            on_stage()
+
+    # 更新氣候統計與預報校驗（增量累加本批次，僅 SQLite 後端）
+    if sqlite_backend:
+        from analytics import update_climatology
+        next_stage()
+        update_climatology()
+        update_verification()
+
+    # 套用保留策略（設定 WEATHER_RETENTION_DAYS 時，僅 SQLite 後端）
+    if os.getenv('WEATHER_RETENTION_DAYS') and sqlite_backend:
+        from retention import apply_retention, incremental_vacuum
+        next_stage()
+        retention = apply_retention()
+        if retention['batches'] and verbose:
+            print(f"✓ 保留策略：清理 {retention['batches']} 個過期批次（{retention['rows']} 筆）")
+        incremental_vacuum(max_steps=10)
+
+    # 將已結束的月份移到分區（設定 WEATHER_HOT_MONTHS 時，僅 SQLite 後端）
+    if os.getenv('WEATHER_HOT_MONTHS') and sqlite_backend:
+        from partitions import roll_partitions
+        next_stage()
+        rolled = roll_partitions()
+        if rolled['months'] and verbose:
+            print(f"✓ 月分區：移動 {', '.join(rolled['months'])}（{rolled['rows']} 筆）")
+
+    # 更新共享歷史快取（設定 WEATHER_HISTORY_CACHE 時）
+    if os.getenv('WEATHER_HISTORY_CACHE'):
+        from history_cache import publish_history_cache
+        next_stage()
+        cached = publish_history_cache()
+        if verbose:
+            print(f"✓ 歷史快取已更新（{cached} 筆）")
+
+    # 輸出靜態儀表板（設定 WEATHER_STATIC_DIR 時）
+    if os.getenv('WEATHER_STATIC_DIR'):
+        from render_static import render_static
+        next_stage()
+        entry = render_static(batch_id)
+        if entry and verbose:
+            print(f"✓ 靜態儀表板已輸出：{entry['html']}")
+
+    return result
@@ -3,27 +3,16 @@
 功能：整合所有模組，完成天氣資料的下載、解析和存儲
 """
 
-from datetime import datetime
-from fetch_weather import fetch_weather_data, parse_weather_json
-from database import (
+from batch_keys import format_batch_id, generate_batch_id
+from fetch_weather import fetch_weather_data
+from ingest import ingest_batch
+from storage import (
     init_database,
-    insert_weather_data,
     get_database_stats,
     get_batch_list
 )
 
 
-def generate_batch_id() -> str:
-    """
-    生成批次 ID
-    格式：YYYYMMDD_HHMMSS
-    
-    Returns:
-        str: 批次識別碼
-    """
-    return datetime.now().strftime("%Y%m%d_%H%M%S")
-
-
 def main():
     """主執行函數"""
     print("=" * 70)
@@ -32,40 +21,33 @@ def main():
     
     # 1. 生成批次 ID
     batch_id = generate_batch_id()
-    print(f"\n批次 ID: {batch_id}")
+    print(f"\n批次 ID: {batch_id}（{format_batch_id(batch_id)}）")
     print("-" * 70)
     
     # 2. 初始化資料庫
-    print("\n[步驟 1/4] 初始化資料庫...")
+    print("\n[步驟 1/3] 初始化資料庫...")
     if not init_database():
         print("✗ 資料庫初始化失敗，程式終止")
         return
     
     # 3. 下載資料
-    print("\n[步驟 2/4] 下載天氣資料...")
+    print("\n[步驟 2/3] 下載天氣資料...")
     json_data = fetch_weather_data()
     
     if not json_data:
         print("✗ 資料下載失敗，程式終止")
         return
     
-    # 4. 解析資料
-    print("\n[步驟 3/4] 解析 JSON 資料...")
-    weather_list = parse_weather_json(json_data)
-    
-    if not weather_list:
-        print("✗ 資料解析失敗，程式終止")
-        return
-    
-    # 5. 存入資料庫
-    print(f"\n[步驟 4/4] 將資料存入資料庫...")
-    inserted_count = insert_weather_data(weather_list, batch_id)
+    # 4. 解析、存入資料庫並執行後續處理（與背景更新共用 ingest.ingest_batch）
+    print("\n[步驟 3/3] 解析資料並存入資料庫...")
+    result = ingest_batch(json_data, batch_id)
     
-    if inserted_count == 0:
-        print("✗ 資料存儲失敗")
+    if result['error']:
+        print(f"✗ {result['error']}，程式終止")
         return
+    inserted_count = result['rows']
     
-    # 6. 顯示執行摘要
+    # 5. 顯示執行摘要
     print("\n" + "=" * 70)
     print("執行摘要")
     print("=" * 70)
@@ -75,7 +57,7 @@ def main():
     
     if stats:
         print(f"\n批次資訊：")
-        print(f"  - 批次 ID：{batch_id}")
+        print(f"  - 批次 ID：{batch_id}（{format_batch_id(batch_id)}）")
         print(f"  - 新增資料筆數：{inserted_count}")
         
         print(f"\n資料庫統計：")
@@ -87,7 +69,7 @@ def main():
         if batches and len(batches) > 1:
             print(f"\n歷史批次：")
             for i, (bid, count, created) in enumerate(batches[:5], 1):
-                print(f"  {i}. {bid} ({count} 筆) - {created}")
+                print(f"  {i}. {format_batch_id(bid)} ({count} 筆) - {created}")
             if len(batches) > 5:
                 print(f"  ... 還有 {len(batches) - 5} 個批次")
     
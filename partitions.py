@@ -0,0 +1,201 @@
+"""
+月分區模組
+功能：將已結束的月份從主資料庫的 weather 移到獨立的 SQLite 檔案（weather_YYYYMM.db），
+      移出後設為唯讀，可直接備份或封存；主資料庫只保留近期的熱資料，
+      database.py 的查詢路由只在需要時附加相關月份的分區
+"""
+
+import sys
+import io
+
+# 設置 Windows 終端輸出為 UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+import argparse
+import os
+import sqlite3
+import stat
+from typing import Dict, List
+
+import database
+from database import (WEATHER_COLUMN_NAMES, WEATHER_COLUMNS_SQL, delete_weather_batches,
+                      get_connection, refresh_partition_catalog, weather_source)
+
+
+# 主資料庫保留的月份數（含本月），較舊的月份移到分區；0 表示不分區
+HOT_MONTHS = int(os.getenv('WEATHER_HOT_MONTHS', '0'))
+
+
+def partition_file(month: str) -> str:
+    """分區檔名（month 為 YYYY-MM）"""
+    return f"weather_{month.replace('-', '')}.db"
+
+
+def find_closed_batches(conn: sqlite3.Connection, hot_months: int) -> Dict[str, List[int]]:
+    """
+    找出需要移到分區的批次（以批次的建立時間決定月份，同一批次不會被拆開）
+
+    Returns:
+        Dict[str, List[int]]: {月份 YYYY-MM: [batch_id, ...]}
+    """
+    rows = conn.execute(f"""
+        SELECT batch_id, strftime('%Y-%m', MIN(created_at)) AS month
+        FROM {weather_source(conn.cursor())}
+        GROUP BY batch_id
+        HAVING MIN(created_at) < date('now', 'start of month', ?)
+        ORDER BY batch_id
+    """, (f"-{hot_months - 1} months",)).fetchall()
+
+    months = {}
+    for row in rows:
+        months.setdefault(row['month'], []).append(row['batch_id'])
+    return months
+
+
+def archive_month(conn: sqlite3.Connection, month: str, batch_ids: List[int]) -> int:
+    """
+    將一個月份的批次移到分區檔案並更新目錄
+
+    分區已存在時（例如之後補匯入了同月份的批次）先開放寫入，取代同批次的舊資料後合併。
+    主資料庫使用 WAL 時跨檔案的提交不是原子的，中斷後重新執行即可
+    （同批次在分區中會被取代，不會重複）。
+    主資料庫使用差異儲存時，分區寫入還原後的完整批次，分區檔案可獨立查詢。
+
+    Returns:
+        int: 移動的資料筆數
+    """
+    os.makedirs(database.PARTITION_DIR, exist_ok=True)
+    file = partition_file(month)
+    path = os.path.join(database.PARTITION_DIR, file)
+    if os.path.exists(path):
+        os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+
+    columns = ", ".join(WEATHER_COLUMN_NAMES)
+    # 附加分區前先決定來源（差異儲存的子查詢中未指定資料庫的資料表都解析為主資料庫）
+    # 還原的快照中沿用的資料列 id 會重複，分區重新編號
+    source = weather_source(conn.cursor())
+    if source == 'weather':
+        source = 'main.weather'
+    else:
+        columns = ", ".join(name for name in WEATHER_COLUMN_NAMES if name != 'id')
+    conn.execute("ATTACH DATABASE ? AS part", (path,))
+    try:
+        # 分區使用一般日誌模式，提交後只有單一檔案，可直接複製封存
+        conn.execute("PRAGMA part.journal_mode = DELETE").fetchall()
+        conn.execute(f"CREATE TABLE IF NOT EXISTS part.weather ({WEATHER_COLUMNS_SQL})")
+        conn.execute("CREATE INDEX IF NOT EXISTS part.idx_weather_batch_id ON weather (batch_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS part.idx_weather_created_at ON weather (created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS part.idx_weather_code_id ON weather (weather_code_id)")
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS roll_batches (batch_id INTEGER PRIMARY KEY)")
+
+        try:
+            conn.execute("DELETE FROM temp.roll_batches")
+            conn.executemany("INSERT INTO temp.roll_batches (batch_id) VALUES (?)",
+                             [(batch_id,) for batch_id in batch_ids])
+            conn.execute("""
+                DELETE FROM part.weather
+                WHERE batch_id IN (SELECT batch_id FROM temp.roll_batches)
+            """)
+            moved = conn.execute(f"""
+                INSERT INTO part.weather ({columns})
+                SELECT {columns} FROM {source}
+                WHERE batch_id IN (SELECT batch_id FROM temp.roll_batches)
+            """).rowcount
+            delete_weather_batches(conn.cursor(), batch_ids)
+
+            # 目錄：批次清單與分區範圍（查詢路由依此決定要附加哪些分區）
+            refresh_partition_catalog(conn, month, file)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute("DETACH DATABASE part")
+
+    # 已結束的月份不再寫入
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    return moved
+
+
+def roll_partitions(hot_months: int = HOT_MONTHS) -> Dict:
+    """
+    將超過保留月份數的已結束月份移到分區
+
+    Args:
+        hot_months: 主資料庫保留的月份數（含本月），0 表示不處理
+
+    Returns:
+        Dict: {'months': 處理的月份列表, 'rows': 移動的資料筆數}
+    """
+    result = {'months': [], 'rows': 0}
+    if hot_months <= 0:
+        return result
+
+    try:
+        conn = get_connection()
+        for month, batch_ids in find_closed_batches(conn, hot_months).items():
+            result['rows'] += archive_month(conn, month, batch_ids)
+            result['months'].append(month)
+        conn.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"✗ 分區移動失敗：{e}")
+
+    return result
+
+
+def list_partitions() -> List[Dict]:
+    """
+    列出目錄中的分區
+
+    Returns:
+        List[Dict]: [{'month', 'file', 'row_count', 'batches', 'exists', ...}, ...]
+    """
+    try:
+        conn = get_connection()
+        rows = conn.execute("""
+            SELECT p.*, (SELECT COUNT(*) FROM archived_batches a WHERE a.month = p.month) AS batches
+            FROM weather_partitions p
+            ORDER BY p.month
+        """).fetchall()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"✗ 查詢失敗：{e}")
+        return []
+
+    return [dict(row, exists=os.path.exists(os.path.join(database.PARTITION_DIR, row['file'])))
+            for row in rows]
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='將較舊的月份移到獨立的分區檔案')
+    parser.add_argument('--hot-months', type=int, default=HOT_MONTHS or 2,
+                        help='主資料庫保留的月份數（含本月）')
+    parser.add_argument('--list', action='store_true', help='只列出目前的分區')
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+
+    print("=" * 60)
+    print("月分區")
+    print("=" * 60)
+
+    if not args.list:
+        if not database.init_database():
+            sys.exit(1)
+        result = roll_partitions(args.hot_months)
+        print(f"✓ 已移動 {len(result['months'])} 個月份，共 {result['rows']} 筆資料")
+
+        from retention import incremental_vacuum
+        print(f"✓ 已回收 {incremental_vacuum()} 個頁面")
+
+    print(f"\n分區目錄：{database.PARTITION_DIR}")
+    for partition in list_partitions():
+        status = '✓' if partition['exists'] else '✗ 檔案不存在（已封存）'
+        print(f"  {partition['month']}  {partition['file']}  "
+              f"{partition['batches']} 個批次 / {partition['row_count']} 筆  {status}")
+
+    print("=" * 60)
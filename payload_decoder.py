@@ -0,0 +1,392 @@
+"""
+CWA 回應快速解碼模組
+功能：直接從原始 JSON 位元組解碼出需要的欄位（地區、逐日溫度與天氣、天氣概況與農業氣象建議），
+      供大量重新解析（backfill.py）使用；與 fetch_weather.py 的解析結果相同
+
+解碼器：
+- msgspec：以型別化結構只解碼 agrWeatherForecasts 中需要的欄位（含農業氣象建議）並驗證型別
+- orjson：完整解碼後以預先建立的路徑擷取欄位（未安裝 msgspec 時使用）
+- default：json + parse_weather_json / parse_forecast_days（原實作）
+"""
+
+import json
+import os
+from typing import Callable, Dict, List, Optional, Union
+
+from fetch_weather import (
+    as_list,
+    parse_advice_sections,
+    parse_agr_advices,
+    parse_forecast_days,
+    parse_weather_json,
+    parse_weather_profile
+)
+
+# msgspec 與 orjson 為選用套件（pip install msgspec 或 pip install orjson）
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# auto 依序選擇 msgspec、orjson、default
+PAYLOAD_DECODER = os.getenv('CWA_PAYLOAD_DECODER', 'auto')
+
+# agrWeatherForecasts 的位置（各地區資料在其下的 weatherForecasts.location）
+AGR_WEATHER_PATH = ('cwaopendata', 'resources', 'resource', 'data', 'agrWeatherForecasts')
+
+
+def build_rows(sent: Optional[str], locations: List,
+               profile: Optional[str] = None, advices: Optional[Dict] = None) -> Dict:
+    """
+    將各地區的逐日資料組成與 parse_weather_json / parse_forecast_days 相同的結果
+
+    Args:
+        sent: 發布時間
+        locations: [(地區名稱, MinT 列表, MaxT 列表, Wx 列表), ...]，
+                   列表元素為 (dataDate, 數值) 或 (dataDate, 描述, 代碼)
+        profile: weatherProfile 文字
+        advices: agrAdvices 區塊（與 parse_agr_advices 相同方式解析）
+
+    Returns:
+        Dict: {'sent', 'weather', 'forecasts', 'profile', 'advices'}
+    """
+    weather = []
+    forecasts = []
+    for name, min_t, max_t, wx in locations:
+        # 第一天（各元素分別取第一筆，與 parse_weather_json 相同）
+        weather.append({
+            'location': name,
+            'min_temp': min_t[0][1] if min_t else None,
+            'max_temp': max_t[0][1] if max_t else None,
+            'description': wx[0][1] if wx else None,
+            'weather_id': wx[0][2] if wx else None
+        })
+
+        # 整週逐日預報，依 dataDate 對齊
+        days = {}
+        for entries, fields in ((min_t, ('min_temp',)), (max_t, ('max_temp',)),
+                                (wx, ('description', 'weather_id'))):
+            for date, *values in entries:
+                if not date:
+                    continue
+                day = days.setdefault(date, {
+                    'location': name, 'forecast_date': date,
+                    'min_temp': None, 'max_temp': None,
+                    'description': None, 'weather_id': None
+                })
+                day.update(zip(fields, values))
+        forecasts.extend(days[date] for date in sorted(days))
+
+    # 與 parse_weather_profile 相同：去除前後空白，空字串視為沒有資料
+    profile = profile.strip() if isinstance(profile, str) else ''
+    return {'sent': sent, 'weather': weather, 'forecasts': forecasts,
+            'profile': profile or None, 'advices': parse_advice_sections(advices)}
+
+
+# ==================== msgspec ====================
+
+if msgspec is not None:
+    class TemperatureDay(msgspec.Struct):
+        dataDate: Optional[str] = None
+        temperature: Optional[float] = None
+
+    class WeatherDay(msgspec.Struct):
+        dataDate: Optional[str] = None
+        weather: Optional[str] = None
+        weatherid: Optional[int] = None
+
+    class TemperatureElement(msgspec.Struct):
+        daily: List[TemperatureDay] = []
+
+    class WeatherElement(msgspec.Struct):
+        daily: List[WeatherDay] = []
+
+    class WeatherElements(msgspec.Struct):
+        MinT: TemperatureElement = msgspec.field(default_factory=TemperatureElement)
+        MaxT: TemperatureElement = msgspec.field(default_factory=TemperatureElement)
+        Wx: WeatherElement = msgspec.field(default_factory=WeatherElement)
+
+    class Location(msgspec.Struct):
+        locationName: str = '未知地區'
+        weatherElements: WeatherElements = msgspec.field(default_factory=WeatherElements)
+
+    class WeatherForecasts(msgspec.Struct):
+        location: List[Location] = []
+
+    # 農業氣象建議：CWA 的 XML 轉 JSON 只有一筆時不使用陣列，列表欄位同時接受單一物件
+    class DegreeDay(msgspec.Struct):
+        dataDate: Optional[str] = None
+        degreeDay: Optional[float] = None
+        accumulatedTemperature: Optional[float] = None
+
+    class DegreeDayElements(msgspec.Struct):
+        daily: Union[List[DegreeDay], DegreeDay, None] = None
+
+    class AdviceLocation(msgspec.Struct):
+        locationName: str = '未知地區'
+        weatherElements: DegreeDayElements = msgspec.field(default_factory=DegreeDayElements)
+
+    class AgrForecasts(msgspec.Struct):
+        location: Union[List[AdviceLocation], AdviceLocation, None] = None
+
+    class CardinalTemperature(msgspec.Struct):
+        description: Optional[str] = None
+        minimum: Optional[float] = None
+        maximum: Optional[float] = None
+
+    class CropPeriod(msgspec.Struct):
+        description: Optional[str] = None
+        startDate: Optional[str] = None
+        endDate: Optional[str] = None
+        growingDays: Optional[int] = None
+        accumulatedTemperature: Optional[float] = None
+
+    class CropStatistics(msgspec.Struct):
+        description: Optional[str] = None
+        dibblingDate: Optional[str] = None
+        timePeriod: Union[List[CropPeriod], CropPeriod, None] = None
+
+    class CropLocation(msgspec.Struct):
+        locationName: str = '未知地區'
+        cropBreed: Optional[str] = None
+        # 鍵為統計期間（fifteenYears、thisYear）
+        statistics: Dict[str, CropStatistics] = {}
+
+    class Crop(msgspec.Struct):
+        cropName: Optional[str] = None
+        cardinalTemperatures: Dict[str, CardinalTemperature] = {}
+        location: Union[List[CropLocation], CropLocation, None] = None
+
+    class CropStatisticsSection(msgspec.Struct):
+        crop: Union[List[Crop], Crop, None] = None
+
+    class AgrAdvices(msgspec.Struct):
+        agrForecasts: AgrForecasts = msgspec.field(default_factory=AgrForecasts)
+        cropStatistics: CropStatisticsSection = msgspec.field(default_factory=CropStatisticsSection)
+
+    class AgrWeatherForecasts(msgspec.Struct):
+        weatherProfile: Optional[str] = None
+        weatherForecasts: WeatherForecasts = msgspec.field(default_factory=WeatherForecasts)
+        agrAdvices: AgrAdvices = msgspec.field(default_factory=AgrAdvices)
+
+    class ResourceData(msgspec.Struct):
+        agrWeatherForecasts: AgrWeatherForecasts = msgspec.field(default_factory=AgrWeatherForecasts)
+
+    class Resource(msgspec.Struct):
+        data: ResourceData = msgspec.field(default_factory=ResourceData)
+
+    class Resources(msgspec.Struct):
+        resource: Resource = msgspec.field(default_factory=Resource)
+
+    class CwaOpenData(msgspec.Struct):
+        sent: Optional[str] = None
+        resources: Resources = msgspec.field(default_factory=Resources)
+
+    class Payload(msgspec.Struct):
+        cwaopendata: CwaOpenData = msgspec.field(default_factory=CwaOpenData)
+
+    # strict=False：溫度與代碼在 API 中為字串，解碼時直接轉為數值並驗證
+    _msgspec_decoder = msgspec.json.Decoder(Payload, strict=False)
+
+
+def advices_from_structs(advices) -> Dict:
+    """將型別化的 agrAdvices 組成與 parse_advice_sections 相同的結果"""
+    result = {'degree_days': [], 'crop_limits': [], 'crop_stages': []}
+
+    for location in as_list(advices.agrForecasts.location):
+        for day in as_list(location.weatherElements.daily):
+            if not day.dataDate:
+                continue
+            result['degree_days'].append({
+                'location': location.locationName,
+                'forecast_date': day.dataDate,
+                'degree_day': day.degreeDay,
+                'accumulated_temperature': day.accumulatedTemperature
+            })
+
+    for crop in as_list(advices.cropStatistics.crop):
+        if not crop.cropName:
+            continue
+
+        for key, limits in crop.cardinalTemperatures.items():
+            result['crop_limits'].append({
+                'crop': crop.cropName,
+                'description': limits.description or key,
+                'min_temp': limits.minimum,
+                'max_temp': limits.maximum
+            })
+
+        for location in as_list(crop.location):
+            for period, statistics in location.statistics.items():
+                for stage in as_list(statistics.timePeriod):
+                    result['crop_stages'].append({
+                        'crop': crop.cropName,
+                        'location': location.locationName,
+                        'breed': location.cropBreed,
+                        'period': period,
+                        'period_description': statistics.description,
+                        'stage': stage.description,
+                        'dibbling_date': statistics.dibblingDate,
+                        'start_date': stage.startDate,
+                        'end_date': stage.endDate,
+                        'growing_days': stage.growingDays,
+                        'accumulated_temperature': stage.accumulatedTemperature
+                    })
+
+    return result
+
+
+def decode_with_msgspec(raw: bytes) -> Dict:
+    """以型別化結構解碼（未宣告的欄位直接略過，不建立 Python 物件）"""
+    payload = _msgspec_decoder.decode(raw).cwaopendata
+    agr_weather = payload.resources.resource.data.agrWeatherForecasts
+    locations = [
+        (
+            location.locationName,
+            [(d.dataDate, d.temperature) for d in location.weatherElements.MinT.daily],
+            [(d.dataDate, d.temperature) for d in location.weatherElements.MaxT.daily],
+            [(d.dataDate, d.weather, d.weatherid) for d in location.weatherElements.Wx.daily],
+        )
+        for location in agr_weather.weatherForecasts.location
+    ]
+    rows = build_rows(payload.sent, locations, agr_weather.weatherProfile)
+    rows['advices'] = advices_from_structs(agr_weather.agrAdvices)
+    return rows
+
+
+# ==================== orjson ====================
+
+def to_float(value) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def to_int(value) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_path(data, path):
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def extract_payload(data: Dict) -> Dict:
+    """
+    從已解碼的回應一次擷取所有需要的欄位（天氣、逐日預報、天氣概況與農業氣象建議）
+
+    ingest.py 以此解析下載的回應，不必對同一份資料分別執行各個 parse_* 函數。
+
+    Returns:
+        Dict: 與 decode_payload() 相同
+    """
+    sent = extract_path(data, ('cwaopendata', 'sent'))
+    agr_weather = extract_path(data, AGR_WEATHER_PATH) or {}
+
+    locations = []
+    for location in extract_path(agr_weather, ('weatherForecasts', 'location')) or []:
+        elements = location.get('weatherElements') or {}
+        min_t = (elements.get('MinT') or {}).get('daily') or []
+        max_t = (elements.get('MaxT') or {}).get('daily') or []
+        wx = (elements.get('Wx') or {}).get('daily') or []
+        locations.append((
+            location.get('locationName', '未知地區'),
+            [(d.get('dataDate'), to_float(d.get('temperature'))) for d in min_t],
+            [(d.get('dataDate'), to_float(d.get('temperature'))) for d in max_t],
+            [(d.get('dataDate'), d.get('weather'), to_int(d.get('weatherid'))) for d in wx],
+        ))
+    return build_rows(sent, locations, agr_weather.get('weatherProfile'), agr_weather.get('agrAdvices'))
+
+
+def decode_with_orjson(raw: bytes) -> Dict:
+    """以 orjson 解碼後依固定路徑擷取欄位"""
+    data = orjson.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError("回應的最上層不是 JSON 物件")
+    return extract_payload(data)
+
+
+# ==================== 原實作 ====================
+
+def decode_with_default(raw: bytes) -> Dict:
+    """標準 json 模組 + fetch_weather.py 的解析函數"""
+    data = json.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError("回應的最上層不是 JSON 物件")
+    return {
+        'sent': data.get('cwaopendata', {}).get('sent'),
+        'weather': parse_weather_json(data, verbose=False),
+        'forecasts': parse_forecast_days(data),
+        'profile': parse_weather_profile(data),
+        'advices': parse_agr_advices(data)
+    }
+
+
+DECODERS = {
+    'msgspec': decode_with_msgspec,
+    'orjson': decode_with_orjson,
+    'default': decode_with_default,
+}
+
+
+def available_decoders() -> List[str]:
+    """目前環境可使用的解碼器"""
+    names = []
+    if msgspec is not None:
+        names.append('msgspec')
+    if orjson is not None:
+        names.append('orjson')
+    names.append('default')
+    return names
+
+
+def get_decoder(name: Optional[str] = None) -> Callable[[bytes], Dict]:
+    """
+    取得解碼函數
+
+    Args:
+        name: msgspec、orjson、default 或 auto（None 時使用 CWA_PAYLOAD_DECODER）
+    """
+    name = name or PAYLOAD_DECODER
+    if name == 'auto':
+        name = available_decoders()[0]
+    if name not in DECODERS:
+        raise ValueError(f"未知的解碼器：{name}")
+    if name not in available_decoders():
+        raise ImportError(f"使用 {name} 解碼器需要先安裝：pip install {name}")
+    return DECODERS[name]
+
+
+def decode_payload(raw: bytes, decoder: Optional[str] = None) -> Dict:
+    """
+    解碼原始 CWA 回應
+
+    快速解碼器遇到型別不符的資料（例如非數字的溫度）時，改用原實作解析該筆回應。
+
+    Raises:
+        ValueError: 不是 JSON，或最上層不是物件
+
+    Returns:
+        Dict: {'sent': 發布時間, 'weather': 第一天資料列表, 'forecasts': 逐日預報列表,
+               'profile': 天氣概況, 'advices': 農業氣象建議}
+    """
+    decode = get_decoder(decoder)
+    if decode is decode_with_msgspec:
+        try:
+            return decode(raw)
+        except msgspec.ValidationError:
+            return decode_with_default(raw)
+    return decode(raw)
@@ -0,0 +1,148 @@
+"""
+儀表板效能分析模組
+功能：記錄一次重新執行（rerun）中每個 render_* / load_* 函數與 database.py 查詢函數的耗時，
+      以及執行的 SQL 陳述式，供 app.py 的側邊欄效能面板顯示；可選擇將每次重新執行的
+      cProfile 結果存檔（python -m pstats 或 snakeviz 檢視）
+
+開啟方式：環境變數 WEATHER_PROFILE=1（所有工作階段），或網址加上 ?profile=1（單一工作階段）。
+未開啟時包裝函數只多一次 ContextVar 查詢。
+"""
+
+import contextvars
+import cProfile
+import functools
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional
+
+import pandas as pd
+
+import database
+
+
+PROFILE_ENABLED = os.getenv('WEATHER_PROFILE', '0') == '1'
+PROFILE_DUMP_DIR = os.getenv('WEATHER_PROFILE_DIR')   # 設定時每次重新執行輸出 .prof 檔
+
+# database.py 中要計時的查詢函數（SQLite 後端經由 storage.py 呼叫）
+DATABASE_QUERY_FUNCTIONS = ('get_latest_weather', 'get_all_weather', 'get_weather_by_batch',
+                            'get_batch_list', 'get_daily_summary', 'query_weather',
+                            'get_database_stats')
+
+# Streamlit 每個工作階段在各自的執行緒中重新執行，以 ContextVar 區分各工作階段的紀錄
+_active = contextvars.ContextVar('weather_profile', default=None)
+
+
+class RerunProfile:
+    """一次重新執行的計時紀錄"""
+
+    def __init__(self):
+        self.calls = []             # [(類型, 名稱, 秒數), ...]，巢狀呼叫各自記錄（含內層時間）
+        self.statements = {}        # SQL 陳述式 -> 執行次數
+        self.elapsed = 0.0
+        self.dump_path = None
+
+    def record(self, kind: str, name: str, seconds: float):
+        self.calls.append((kind, name, seconds))
+
+    def record_statement(self, sql: str):
+        statement = " ".join(sql.split())
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def call_frame(self) -> pd.DataFrame:
+        """依函數彙總（次數、總耗時、最長耗時），依總耗時遞減排序"""
+        frame = pd.DataFrame(self.calls, columns=['kind', 'name', 'seconds'])
+        if frame.empty:
+            return pd.DataFrame(columns=['kind', 'name', 'calls', 'total_ms', 'max_ms'])
+        summary = frame.groupby(['kind', 'name'], as_index=False).agg(
+            calls=('seconds', 'size'), total_ms=('seconds', 'sum'), max_ms=('seconds', 'max'))
+        summary[['total_ms', 'max_ms']] *= 1000
+        return summary.sort_values('total_ms', ascending=False, ignore_index=True)
+
+    def statement_frame(self) -> pd.DataFrame:
+        """SQL 陳述式與執行次數（依次數遞減排序）"""
+        return pd.DataFrame(sorted(self.statements.items(), key=lambda item: -item[1]),
+                            columns=['sql', 'count'])
+
+
+def _trace_statement(sql: str):
+    profile = _active.get()
+    if profile is not None:
+        profile.record_statement(sql)
+
+
+def timed(kind: str, func: Callable) -> Callable:
+    """包裝函數：在效能分析中的重新執行內記錄耗時"""
+    if getattr(func, '__profiled__', False):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _active.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.record(kind, func.__name__, time.perf_counter() - start)
+
+    wrapper.__profiled__ = True
+    return wrapper
+
+
+def instrument_functions(namespace: Dict, prefixes: Iterable[str], kind: str):
+    """
+    包裝命名空間中以指定前綴開頭、且在該模組中定義的函數（app.py 每次重新執行時呼叫）
+    """
+    module = namespace.get('__name__')
+    for name, value in list(namespace.items()):
+        if (name.startswith(tuple(prefixes)) and callable(value)
+                and getattr(value, '__module__', None) == module):
+            namespace[name] = timed(kind, value)
+
+
+def instrument_database():
+    """包裝 database.py 的查詢函數並安裝 SQL 追蹤（重複呼叫不會重複包裝）"""
+    for name in DATABASE_QUERY_FUNCTIONS:
+        setattr(database, name, timed('query', getattr(database, name)))
+    database.set_query_trace(_trace_statement)
+
+
+@contextmanager
+def profile_rerun(enabled: bool, dump_dir: Optional[str] = PROFILE_DUMP_DIR):
+    """
+    在區塊內記錄本次重新執行（未開啟時產生 None）
+
+    Args:
+        enabled: 是否開啟
+        dump_dir: cProfile 輸出目錄（None 表示不輸出）
+    """
+    if not enabled:
+        yield None
+        return
+
+    instrument_database()
+    profile = RerunProfile()
+    token = _active.set(profile)
+    profiler = cProfile.Profile() if dump_dir else None
+    if profiler:
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12 起同一時間只能有一個 cProfile（其他工作階段正在分析）
+            profiler = None
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        if profiler:
+            profiler.disable()
+        profile.elapsed = time.perf_counter() - start
+        _active.reset(token)
+        if profiler:
+            os.makedirs(dump_dir, exist_ok=True)
+            profile.dump_path = os.path.join(
+                dump_dir, f"rerun_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.prof")
+            profiler.dump_stats(profile.dump_path)
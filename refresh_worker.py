@@ -0,0 +1,153 @@
+"""
+背景更新工作執行緒
+功能：在 Streamlit 行程內定期下載、解析並寫入新批次，
+      讓使用者的請求不必等待 CWA 下載
+"""
+
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from database import acquire_lock, release_lock, renew_lock
+from storage import get_database_stats
+from fetch_weather import fetch_weather_data
+from ingest import ingest_batch
+
+
+# 更新間隔（秒），0 表示停用排程更新（仍可手動觸發，例如資料庫為空時）
+REFRESH_INTERVAL = int(os.getenv('WEATHER_REFRESH_INTERVAL', '3600'))
+REFRESH_LOCK_NAME = 'weather_refresh'   # 跨行程鎖，多個伺服器行程只會有一個在下載
+REFRESH_LOCK_TTL = 300                  # 持有者當機時，鎖自動失效的秒數（下載後與匯入的每個階段前延長）
+REFRESH_RETRIES = 2
+RECENT_BATCH_SECONDS = 60               # 強制更新時，此秒數內的批次視為剛由其他行程寫入
+
+
+def latest_batch_age() -> Optional[float]:
+    """
+    最新批次距今的秒數
+
+    Returns:
+        float: 秒數，資料庫沒有資料時返回 None
+    """
+    stats = get_database_stats()
+    latest = stats.get('latest_record') if stats else None
+    if not latest:
+        return None
+    # created_at 由 SQLite CURRENT_TIMESTAMP 產生，為 UTC
+    latest_time = datetime.strptime(latest[:19], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - latest_time).total_seconds()
+
+
+class RefreshWorker:
+    """定期更新天氣資料的背景執行緒（每個行程一個）"""
+
+    def __init__(self, interval: int = REFRESH_INTERVAL):
+        self.interval = interval
+        self._wake = threading.Event()
+        self._force = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self.last_run = None
+        self.last_batch_id = None
+        self.last_error = None
+        self.running = False
+
+    def start(self):
+        """啟動背景執行緒（重複呼叫不會建立第二個執行緒）"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='weather-refresh', daemon=True
+                )
+                self._thread.start()
+
+    def request_refresh(self, force: bool = True):
+        """要求立即更新（不等待結果）"""
+        with self._lock:
+            self._force = self._force or force
+        self._wake.set()
+
+    def status(self) -> Dict:
+        """目前的更新狀態"""
+        return {
+            'running': self.running,
+            'last_run': self.last_run,
+            'last_batch_id': self.last_batch_id,
+            'last_error': self.last_error,
+            'interval': self.interval
+        }
+
+    def _run(self):
+        # 啟動時先檢查一次，之後依間隔或手動觸發執行
+        while True:
+            with self._lock:
+                force = self._force
+                self._force = False
+            try:
+                self.refresh_once(force=force)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"✗ 背景更新失敗：{e}")
+
+            timeout = self.interval if self.interval > 0 else None
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def refresh_once(self, force: bool = False) -> bool:
+        """
+        執行一次更新：下載、解析並以單一交易寫入新批次
+
+        新批次在交易提交後才對其他連線可見，因此儀表板不會讀到寫一半的批次。
+
+        Args:
+            force: 忽略更新間隔，立即下載
+
+        Returns:
+            bool: 有寫入新批次返回 True
+        """
+        age = latest_batch_age()
+        if not force:
+            if self.interval <= 0:
+                return False
+            if age is not None and age < self.interval:
+                return False
+
+        owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        if not acquire_lock(REFRESH_LOCK_NAME, owner, REFRESH_LOCK_TTL):
+            # 其他行程正在更新
+            return False
+
+        self.running = True
+        try:
+            # 取得鎖後再確認，避免在其他行程剛完成後重複下載
+            age = latest_batch_age()
+            if age is not None and age < (RECENT_BATCH_SECONDS if force else self.interval):
+                return False
+
+            json_data = fetch_weather_data(retries=REFRESH_RETRIES)
+            if not json_data:
+                self.last_error = '無法下載資料'
+                return False
+
+            # 存檔、寫入與後續處理（保留策略、月分區等）與 main.py 相同；
+            # 整個流程可能超過鎖的有效期限，每個階段前延長，其他行程不會在匯入途中取得鎖
+            def renew():
+                if not renew_lock(REFRESH_LOCK_NAME, owner, REFRESH_LOCK_TTL):
+                    print("✗ 背景更新的鎖已失效，其他行程可能同時更新")
+
+            renew()
+            result = ingest_batch(json_data, verbose=False, on_stage=renew)
+            if result['error']:
+                self.last_error = result['error']
+                return False
+
+            self.last_batch_id = result['batch_id']
+            self.last_error = None
+            return True
+        finally:
+            self.last_run = time.time()
+            self.running = False
+            release_lock(REFRESH_LOCK_NAME, owner)
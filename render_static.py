@@ -0,0 +1,289 @@
+"""
+靜態儀表板輸出腳本
+功能：將批次的儀表板內容（溫度卡片、條形圖、範圍圖、地圖、趨勢圖）預先輸出為
+      靜態 HTML/JSON，檔名含內容雜湊，可直接交由 CDN 長期快取；
+      manifest.json 與 index.html 指向最新批次（應設定為短快取）
+"""
+
+import sys
+import io
+
+# 設置 Windows 終端輸出為 UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+import argparse
+import hashlib
+import html
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+from batch_keys import format_batch_id, resolve_batch_id
+from figures import (
+    DASHBOARD_CSS,
+    HEATMAP_RESOLUTION,
+    build_card_html,
+    build_map_points,
+    interpolation_points,
+    build_temperature_bar_figure,
+    build_temperature_map_figure,
+    build_temperature_range_figure,
+    build_trend_figure
+)
+from spatial import temperature_surface
+from stations import load_station_registry
+from storage import get_batch_list, get_weather_by_batch
+
+
+STATIC_DIR = os.getenv('WEATHER_STATIC_DIR', 'static_site')
+STATIC_KEEP_BATCHES = int(os.getenv('WEATHER_STATIC_KEEP', '48'))   # 保留最近幾個批次的檔案
+ASSETS_DIR = 'assets'
+MANIFEST_FILE = 'manifest.json'
+TREND_BATCHES = 10          # 趨勢圖包含的批次數（與 app.py 相同）
+HASH_LENGTH = 12
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def write_atomic(path: str, data: bytes):
+    """先寫暫存檔再取代，讀取端不會看到寫一半的檔案"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_hashed_asset(out_dir: str, stem: str, ext: str, data: bytes) -> str:
+    """
+    以內容雜湊命名寫入資產檔（內容相同時不重寫）
+
+    Returns:
+        str: 相對於輸出目錄的路徑
+    """
+    name = f"{ASSETS_DIR}/{stem}.{content_hash(data)}.{ext}"
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path):
+        write_atomic(path, data)
+    return name
+
+
+def build_batch_figures(batch_id: int, weather_data: List[Dict],
+                        batches: List[Tuple[int, int, str]]) -> Dict:
+    """
+    建立單一批次的所有圖表（與 app.py 使用相同的建構函數）
+
+    Returns:
+        Dict: {名稱: plotly Figure}
+    """
+    map_data = build_map_points(weather_data, load_station_registry().coordinates())
+    points = interpolation_points(map_data)
+    surface = temperature_surface(
+        points['lon'],
+        points['lat'],
+        points['value'],
+        resolution=HEATMAP_RESOLUTION
+    )
+    figures = {
+        'bar': build_temperature_bar_figure(weather_data),
+        'range': build_temperature_range_figure(weather_data),
+        'map': build_temperature_map_figure(map_data, surface, HEATMAP_RESOLUTION),
+    }
+
+    # 趨勢圖：此批次（含）之前的最近幾個批次，所有地區
+    position = next(i for i, batch in enumerate(batches) if batch[0] == batch_id)
+    trend_batches = batches[position:position + TREND_BATCHES]
+    if len(trend_batches) >= 2:
+        rows = []
+        for trend_batch_id, _, created_at in trend_batches:
+            for item in get_weather_by_batch(trend_batch_id):
+                item['batch_time'] = created_at[:16]
+                rows.append(item)
+        df = pd.DataFrame(rows)
+        locations = list(df['location'].unique())
+        figures['trend_max'] = build_trend_figure(df, locations, 'max_temp', '最高溫度')
+        figures['trend_min'] = build_trend_figure(df, locations, 'min_temp', '最低溫度')
+
+    return figures
+
+
+def render_batch_html(batch_id: int, created_at: str, weather_data: List[Dict],
+                      figures: Dict, plotly_js: str) -> str:
+    """組合單一批次的靜態頁面"""
+    sections = [
+        ('🌡️ 各地區溫度概況',
+         '<div class="cards">' + "".join(build_card_html(d) for d in weather_data) + '</div>'),
+        ('🗺️ 台灣溫度分布地圖', 'map'),
+        ('📊 溫度對比圖', 'bar'),
+        ('🌡️ 溫度範圍分布', 'range'),
+        ('📈 歷史溫度趨勢（最高溫度）', 'trend_max'),
+        ('📈 歷史溫度趨勢（最低溫度）', 'trend_min'),
+    ]
+
+    body = []
+    for title, content in sections:
+        if content in figures:
+            # 固定 div_id，內容相同時雜湊（檔名）也相同
+            content = pio.to_html(figures[content], full_html=False, include_plotlyjs=False,
+                                  div_id=f"figure-{content}", config={'responsive': True})
+        elif content in ('trend_max', 'trend_min'):
+            continue
+        body.append(f"<section><h2>{title}</h2>{content}</section>")
+
+    return f"""<!DOCTYPE html>
+<html lang="zh-Hant">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>中央氣象局天氣資料 - {format_batch_id(batch_id)}</title>
+<script src="../{plotly_js}"></script>
+<style>
+body {{ font-family: Arial, sans-serif; max-width: 1200px; margin: 0 auto; padding: 20px; background: #FAFAFA; }}
+.cards {{ display: grid; grid-template-columns: repeat(3, 1fr); gap: 10px; }}
+{DASHBOARD_CSS}
+</style>
+</head>
+<body>
+<div class="cwa-title">🌤️ 中央氣象局天氣資料</div>
+<div class="cwa-subtitle">批次時間：{html.escape(created_at or '')} | 批次 ID: {format_batch_id(batch_id)}</div>
+{"".join(body)}
+</body>
+</html>
+"""
+
+
+def load_manifest(out_dir: str) -> Dict:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'latest': None, 'batches': {}}
+
+
+def prune_assets(out_dir: str, manifest: Dict, keep: int):
+    """只保留最近 keep 個批次，並刪除不再被引用的資產檔"""
+    ordered = sorted(manifest['batches'].items(),
+                     key=lambda item: (item[1]['created_at'] or '', item[0]), reverse=True)
+    manifest['batches'] = dict(ordered[:keep])
+
+    referenced = {manifest.get('plotly_js')}
+    for entry in manifest['batches'].values():
+        referenced.update((entry['html'], entry['json']))
+
+    assets_path = os.path.join(out_dir, ASSETS_DIR)
+    for name in os.listdir(assets_path):
+        if f"{ASSETS_DIR}/{name}" not in referenced and not name.endswith('.tmp'):
+            os.remove(os.path.join(assets_path, name))
+
+
+def render_static(batch_id: Optional[int] = None, out_dir: str = STATIC_DIR,
+                  keep: int = STATIC_KEEP_BATCHES) -> Optional[Dict]:
+    """
+    輸出單一批次的靜態儀表板並更新 manifest
+
+    Args:
+        batch_id: 批次 ID，None 表示最新批次
+        out_dir: 輸出目錄
+        keep: 保留的批次數
+
+    Returns:
+        Dict: 此批次在 manifest 中的項目，沒有資料時返回 None
+    """
+    batches = get_batch_list()
+    if not batches:
+        return None
+    batch_id = batch_id or batches[0][0]
+    created_at = next((b[2] for b in batches if b[0] == batch_id), None)
+    weather_data = get_weather_by_batch(batch_id)
+    if not weather_data:
+        print(f"✗ 找不到批次：{batch_id}")
+        return None
+
+    os.makedirs(os.path.join(out_dir, ASSETS_DIR), exist_ok=True)
+    manifest = load_manifest(out_dir)
+    manifest['plotly_js'] = write_hashed_asset(out_dir, 'plotly', 'js', get_plotlyjs().encode('utf-8'))
+
+    figures = build_batch_figures(batch_id, weather_data, batches)
+
+    # JSON：資料與圖表規格（供其他前端直接使用）；
+    # 批次 ID 為 63 位元整數，超過 JavaScript 數字的精確範圍（2^53），一律輸出為十進位字串
+    bundle = {
+        'batch_id': str(batch_id),
+        'label': format_batch_id(batch_id),
+        'created_at': created_at,
+        'weather': [dict(item, batch_id=str(item['batch_id'])) for item in weather_data],
+        'figures': {name: json.loads(fig.to_json()) for name, fig in figures.items()}
+    }
+    json_name = write_hashed_asset(out_dir, batch_id, 'json',
+                                   json.dumps(bundle, ensure_ascii=False).encode('utf-8'))
+    html_name = write_hashed_asset(out_dir, batch_id, 'html',
+                                   render_batch_html(batch_id, created_at, weather_data, figures,
+                                                     manifest['plotly_js']).encode('utf-8'))
+
+    entry = {'label': format_batch_id(batch_id), 'created_at': created_at,
+             'html': html_name, 'json': json_name}
+    # 與 JSON 中的批次 ID 相同，以十進位字串為鍵
+    manifest['batches'][str(batch_id)] = entry
+    prune_assets(out_dir, manifest, keep)
+
+    latest_id = next(iter(manifest['batches']))
+    manifest['latest'] = latest_id
+    manifest['generated_at'] = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    # 資產檔先寫入，最後才更新入口檔案，讀取端不會拿到指向不存在檔案的 manifest
+    latest_html = manifest['batches'][latest_id]['html']
+    write_atomic(os.path.join(out_dir, 'index.html'), f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8">
+<meta http-equiv="refresh" content="0; url={latest_html}">
+</head><body><a href="{latest_html}">最新批次</a></body></html>
+""".encode('utf-8'))
+    write_atomic(os.path.join(out_dir, MANIFEST_FILE),
+                 json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+    return entry
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='輸出靜態儀表板（供 CDN 服務）')
+    parser.add_argument('--batch', default=None,
+                        help='批次 ID（整數或顯示的 YYYYMMDD_HHMMSS[-序號]，預設為最新批次）')
+    parser.add_argument('--all', action='store_true', help='輸出最近 --keep 個批次')
+    parser.add_argument('--out', default=STATIC_DIR, help='輸出目錄')
+    parser.add_argument('--keep', type=int, default=STATIC_KEEP_BATCHES, help='保留的批次數')
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+
+    print("=" * 60)
+    print("輸出靜態儀表板")
+    print("=" * 60)
+
+    if args.all:
+        # 由舊到新輸出，最後一個即為最新批次
+        batch_ids = [b[0] for b in get_batch_list()[:args.keep]][::-1]
+    elif args.batch:
+        # 顯示文字只精確到秒，對應到該秒內的既有批次
+        batch_id = resolve_batch_id(args.batch, [b[0] for b in get_batch_list()])
+        if batch_id is None:
+            print(f"✗ 找不到批次：{args.batch}")
+            sys.exit(1)
+        batch_ids = [batch_id]
+    else:
+        batch_ids = [None]
+
+    for batch_id in batch_ids:
+        entry = render_static(batch_id, args.out, args.keep)
+        if entry:
+            print(f"✓ {entry['html']}")
+
+    print(f"✓ 輸出目錄：{args.out}")
+    print("=" * 60)
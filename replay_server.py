@@ -0,0 +1,269 @@
+"""
+本地替身伺服器（Replay Server）
+功能：以錄製的 CWA 回應模擬 API，支援延遲、頻寬限制與錯誤注入，
+      讓資料擷取流程可以在離線環境下進行壓力測試與效能量測
+"""
+
+import sys
+import io
+
+# 設置 Windows 終端輸出為 UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+import argparse
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+class ReplayConfig:
+    """替身伺服器的行為設定"""
+
+    def __init__(self, payload_paths: List[str], latency: float = 0.0,
+                 bandwidth: Optional[int] = None, error_rate: float = 0.0,
+                 error_status: int = 503, seed: int = 0):
+        """
+        Args:
+            payload_paths: 錄製的 JSON 檔案（多個時依序輪流回應）
+            latency: 每次回應前的固定延遲（秒）
+            bandwidth: 頻寬限制（bytes/秒），None 表示不限制
+            error_rate: 注入錯誤的機率（0.0 - 1.0）
+            error_status: 注入錯誤時回傳的 HTTP 狀態碼
+            seed: 亂數種子（相同種子產生相同的錯誤序列）
+        """
+        self.payloads = []
+        for path in payload_paths:
+            with open(path, 'rb') as f:
+                self.payloads.append(f.read())
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.seed = seed
+
+
+class ReplayState:
+    """替身伺服器的執行狀態與統計（跨請求執行緒共用）"""
+
+    def __init__(self, config: ReplayConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.random = random.Random(config.seed)
+        self.request_count = 0
+        self.error_count = 0
+        self.bytes_sent = 0
+
+    def next_response(self):
+        """
+        決定下一個請求的回應（在鎖內決定，確保錯誤序列可重現）
+
+        Returns:
+            Tuple[int, bytes]: (HTTP 狀態碼, 回應內容)
+        """
+        with self.lock:
+            index = self.request_count
+            self.request_count += 1
+            if self.random.random() < self.config.error_rate:
+                self.error_count += 1
+                return self.config.error_status, b'{"error": "injected failure"}'
+            payloads = self.config.payloads
+            return 200, payloads[index % len(payloads)]
+
+    def add_bytes(self, count: int):
+        with self.lock:
+            self.bytes_sent += count
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'requests': self.request_count,
+                'errors': self.error_count,
+                'bytes_sent': self.bytes_sent
+            }
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """處理 GET 請求，忽略路徑與查詢參數，一律回傳錄製資料"""
+
+    state: ReplayState = None
+
+    def do_GET(self):
+        status, body = self.state.next_response()
+        config = self.state.config
+
+        if config.latency > 0:
+            time.sleep(config.latency)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        # 依頻寬限制分段傳送
+        if config.bandwidth:
+            chunk_size = max(1, config.bandwidth // 10)
+            for start in range(0, len(body), chunk_size):
+                chunk = body[start:start + chunk_size]
+                self.wfile.write(chunk)
+                time.sleep(len(chunk) / config.bandwidth)
+        else:
+            self.wfile.write(body)
+
+        self.state.add_bytes(len(body))
+
+    def log_message(self, format, *args):
+        # 壓力測試時避免輸出大量存取紀錄
+        pass
+
+
+def start_replay_server(config: ReplayConfig, host: str = '127.0.0.1',
+                        port: int = 0):
+    """
+    在背景執行緒啟動替身伺服器
+
+    Args:
+        config: 伺服器行為設定
+        host: 綁定位址
+        port: 綁定埠號（0 表示自動選擇）
+
+    Returns:
+        Tuple[ThreadingHTTPServer, ReplayState, str]: (伺服器, 狀態, 服務 URL)
+    """
+    state = ReplayState(config)
+    handler = type('BoundReplayHandler', (ReplayHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    url = f"http://{server.server_address[0]}:{server.server_address[1]}/F-A0010-001"
+    return server, state, url
+
+
+def run_fetch_benchmark(config: ReplayConfig, requests_count: int,
+                        retries: int = 0, backoff: float = 0.0) -> Dict:
+    """
+    對替身伺服器執行擷取與解析流程，量測吞吐量與重試行為
+
+    Args:
+        config: 伺服器行為設定
+        requests_count: 擷取次數
+        retries: 每次擷取的重試次數
+        backoff: 重試間隔基數（秒）
+
+    Returns:
+        Dict: 量測結果
+    """
+    from fetch_weather import fetch_weather_data, parse_weather_json
+
+    server, state, url = start_replay_server(config)
+    succeeded = 0
+    parsed_rows = 0
+
+    # 擷取流程會輸出進度訊息，量測時暫時關閉
+    real_stdout = sys.stdout
+    start = time.perf_counter()
+    try:
+        sys.stdout = io.StringIO()
+        for _ in range(requests_count):
+            data = fetch_weather_data(source=url, retries=retries, backoff=backoff)
+            if data:
+                succeeded += 1
+                parsed_rows += len(parse_weather_json(data))
+    finally:
+        sys.stdout = real_stdout
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        server.server_close()
+
+    server_stats = state.stats()
+    return {
+        'attempted': requests_count,
+        'succeeded': succeeded,
+        'failed': requests_count - succeeded,
+        'http_requests': server_stats['requests'],
+        'injected_errors': server_stats['errors'],
+        'retries': server_stats['requests'] - requests_count,
+        'parsed_rows': parsed_rows,
+        'bytes_sent': server_stats['bytes_sent'],
+        'elapsed': elapsed,
+        'fetches_per_second': requests_count / elapsed if elapsed else 0.0
+    }
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='CWA API 本地替身伺服器')
+    parser.add_argument('--payload', action='append',
+                        help='錄製的 JSON 檔案或目錄（可重複指定，預設 weather_response.json）')
+    parser.add_argument('--host', default='127.0.0.1', help='綁定位址')
+    parser.add_argument('--port', type=int, default=8765, help='綁定埠號')
+    parser.add_argument('--latency', type=float, default=0.0, help='每次回應延遲（秒）')
+    parser.add_argument('--bandwidth', type=int, default=None, help='頻寬限制（bytes/秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='錯誤注入機率（0-1）')
+    parser.add_argument('--error-status', type=int, default=503, help='注入錯誤的 HTTP 狀態碼')
+    parser.add_argument('--seed', type=int, default=0, help='錯誤序列的亂數種子')
+    parser.add_argument('--bench', type=int, default=0,
+                        help='執行 N 次擷取量測後結束（不提供服務）')
+    parser.add_argument('--retries', type=int, default=0, help='量測時每次擷取的重試次數')
+    return parser
+
+
+def collect_payload_paths(entries: Optional[List[str]]) -> List[str]:
+    """展開檔案與目錄參數為 JSON 檔案列表"""
+    paths = []
+    for entry in entries or ['weather_response.json']:
+        if os.path.isdir(entry):
+            paths.extend(
+                os.path.join(entry, name)
+                for name in sorted(os.listdir(entry))
+                if name.endswith('.json')
+            )
+        else:
+            paths.append(entry)
+    return paths
+
+
+# 當直接執行此檔案時啟動伺服器或執行量測
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+
+    config = ReplayConfig(
+        collect_payload_paths(args.payload),
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed
+    )
+
+    print("=" * 60)
+    print("CWA API 本地替身伺服器")
+    print("=" * 60)
+
+    if args.bench:
+        result = run_fetch_benchmark(config, args.bench, retries=args.retries)
+        print(f"擷取次數：{result['attempted']}（成功 {result['succeeded']}，失敗 {result['failed']}）")
+        print(f"HTTP 請求數：{result['http_requests']}（重試 {result['retries']}，注入錯誤 {result['injected_errors']}）")
+        print(f"解析資料筆數：{result['parsed_rows']}")
+        print(f"傳輸量：{result['bytes_sent'] / 1024:.1f} KB")
+        print(f"耗時：{result['elapsed']:.2f} 秒（{result['fetches_per_second']:.1f} 次/秒）")
+    else:
+        server, state, url = start_replay_server(config, args.host, args.port)
+        print(f"✓ 伺服器已啟動：{url}")
+        print(f"  設定 CWA_WEATHER_SOURCE={url} 即可讓 main.py 使用此伺服器")
+        print("  按 Ctrl+C 停止")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            stats = state.stats()
+            print(f"\n共處理 {stats['requests']} 個請求（注入錯誤 {stats['errors']} 個）")
+            server.shutdown()
+
+    print("=" * 60)
@@ -0,0 +1,289 @@
+"""
+資料保留策略模組
+功能：保留近期原始批次、將較舊批次降採樣（每日一批或彙總），
+      並以 incremental_vacuum 分段回收空間，避免長時間鎖定資料庫
+"""
+
+import sys
+import io
+
+# 設置 Windows 終端輸出為 UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from database import delete_weather_batches, get_connection, table_columns, weather_source
+
+
+# 保留策略配置
+RETENTION_RAW_DAYS = int(os.getenv('WEATHER_RETENTION_DAYS', '30'))
+RETENTION_MODE = os.getenv('WEATHER_RETENTION_MODE', 'daily')   # daily 或 rollup
+RETENTION_CHUNK_BATCHES = 20                                     # 每個刪除交易處理的批次數
+VACUUM_PAGES_PER_STEP = 200                                      # 每次回收的頁數
+
+# 以批次 ID 對應天氣資料的明細表（逐日預報、天氣概況與農業氣象），隨批次一起刪除
+BATCH_DETAIL_TABLES = ('forecast_days', 'weather_profiles', 'degree_days',
+                       'crop_limits', 'crop_stages')
+
+
+def init_rollup_table(conn: sqlite3.Connection):
+    """創建每日彙總資料表（rollup 模式使用）"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS weather_daily_rollup (
+            day TEXT NOT NULL,
+            location_id INTEGER NOT NULL REFERENCES locations (id),
+            min_temp REAL,
+            max_temp REAL,
+            sum_min_temp REAL NOT NULL DEFAULT 0,
+            sum_max_temp REAL NOT NULL DEFAULT 0,
+            min_count INTEGER NOT NULL DEFAULT 0,
+            max_count INTEGER NOT NULL DEFAULT 0,
+            batch_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, location_id)
+        )
+    """)
+
+
+def find_expired_batches(conn: sqlite3.Connection, cutoff: str, mode: str) -> List[int]:
+    """
+    找出需要刪除原始資料的批次
+
+    Args:
+        conn: 資料庫連接
+        cutoff: 截止時間（UTC，早於此時間的批次才會處理）
+        mode: daily 保留每日最後一批；rollup 全部彙總後刪除
+
+    Returns:
+        List[int]: 批次 ID 列表
+    """
+    source = weather_source(conn.cursor())
+    if mode == 'rollup':
+        rows = conn.execute(f"""
+            SELECT batch_id
+            FROM {source}
+            GROUP BY batch_id
+            HAVING MIN(created_at) < ?
+        """, (cutoff,)).fetchall()
+        return [row['batch_id'] for row in rows]
+
+    # daily：同一天內除了最後一批之外都刪除
+    rows = conn.execute(f"""
+        WITH batches AS (
+            SELECT batch_id, MIN(created_at) AS created_at
+            FROM {source}
+            GROUP BY batch_id
+            HAVING MIN(created_at) < ?
+        ),
+        ranked AS (
+            SELECT batch_id,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY date(created_at)
+                       ORDER BY created_at DESC, batch_id DESC
+                   ) AS rank_in_day
+            FROM batches
+        )
+        SELECT batch_id FROM ranked WHERE rank_in_day > 1
+    """, (cutoff,)).fetchall()
+    return [row['batch_id'] for row in rows]
+
+
+def rollup_batches(conn: sqlite3.Connection, batch_ids: List[int]):
+    """
+    將批次合併進每日彙總（可重複合併，統計值以加總方式累積）
+
+    最低溫與最高溫各自記錄非 NULL 的樣本數，平均值只除以有數值的資料列。
+    """
+    placeholders = ",".join("?" * len(batch_ids))
+    conn.execute(f"""
+        INSERT INTO weather_daily_rollup (day, location_id, min_temp, max_temp,
+                                          sum_min_temp, sum_max_temp,
+                                          min_count, max_count, batch_count)
+        SELECT date(created_at), location_id, MIN(min_temp), MAX(max_temp),
+               TOTAL(min_temp), TOTAL(max_temp),
+               COUNT(min_temp), COUNT(max_temp), COUNT(DISTINCT batch_id)
+        FROM {weather_source(conn.cursor())}
+        WHERE batch_id IN ({placeholders})
+        GROUP BY date(created_at), location_id
+        ON CONFLICT (day, location_id) DO UPDATE SET
+            min_temp = MIN(COALESCE(min_temp, excluded.min_temp),
+                           COALESCE(excluded.min_temp, min_temp)),
+            max_temp = MAX(COALESCE(max_temp, excluded.max_temp),
+                           COALESCE(excluded.max_temp, max_temp)),
+            sum_min_temp = sum_min_temp + excluded.sum_min_temp,
+            sum_max_temp = sum_max_temp + excluded.sum_max_temp,
+            min_count = min_count + excluded.min_count,
+            max_count = max_count + excluded.max_count,
+            batch_count = batch_count + excluded.batch_count
+    """, batch_ids)
+
+
+def delete_batch_details(conn: sqlite3.Connection, batch_ids: List[int]) -> int:
+    """
+    刪除批次在 BATCH_DETAIL_TABLES 中的資料（尚未建立的資料表略過，不提交交易）
+
+    Returns:
+        int: 刪除的資料筆數
+    """
+    placeholders = ",".join("?" * len(batch_ids))
+    deleted = 0
+    for table in BATCH_DETAIL_TABLES:
+        if table_columns(conn.cursor(), table):
+            deleted += conn.execute(f"DELETE FROM {table} WHERE batch_id IN ({placeholders})",
+                                    batch_ids).rowcount
+    return deleted
+
+
+def apply_retention(raw_days: int = RETENTION_RAW_DAYS, mode: str = RETENTION_MODE,
+                    chunk_batches: int = RETENTION_CHUNK_BATCHES) -> Dict:
+    """
+    執行保留策略：刪除超過保留期限的原始批次與其明細（分段交易）
+
+    rollup 模式的每日彙總由 database.get_daily_summary() 與保留的批次合併查詢。
+
+    Args:
+        raw_days: 原始批次保留天數
+        mode: daily（每日保留一批）或 rollup（彙總後刪除）
+        chunk_batches: 每個交易處理的批次數
+
+    Returns:
+        Dict: {'batches': 刪除批次數, 'rows': 刪除資料筆數}
+    """
+    if mode not in ('daily', 'rollup'):
+        raise ValueError(f"未知的保留模式：{mode}")
+
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=raw_days)).strftime("%Y-%m-%d %H:%M:%S")
+    result = {'batches': 0, 'rows': 0}
+
+    try:
+        conn = get_connection()
+        if mode == 'rollup':
+            init_rollup_table(conn)
+            conn.commit()
+
+        expired = find_expired_batches(conn, cutoff, mode)
+
+        # 每個交易只處理少量批次，讓儀表板的讀取不被長時間阻擋
+        for start in range(0, len(expired), chunk_batches):
+            chunk = expired[start:start + chunk_batches]
+            if mode == 'rollup':
+                rollup_batches(conn, chunk)
+            # 差異儲存時仍被較新批次沿用的資料列會保留
+            deleted = delete_weather_batches(conn.cursor(), chunk)
+            delete_batch_details(conn, chunk)
+            conn.commit()
+            result['batches'] += len(chunk)
+            result['rows'] += deleted
+
+        conn.close()
+        return result
+
+    except sqlite3.Error as e:
+        print(f"✗ 保留策略執行失敗：{e}")
+        return result
+
+
+def enable_incremental_vacuum() -> bool:
+    """
+    將既有資料庫切換為 auto_vacuum=INCREMENTAL
+
+    既有資料庫需要執行一次完整 VACUUM 才能切換模式（僅需一次）；
+    init_database() 建立的新資料庫已預設為增量模式。
+
+    Returns:
+        bool: 目前是否為增量模式
+    """
+    try:
+        conn = get_connection()
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode != 2:
+            print("正在切換為增量空間回收模式（一次性 VACUUM）...")
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        conn.close()
+        return mode == 2
+
+    except sqlite3.Error as e:
+        print(f"✗ 無法切換空間回收模式：{e}")
+        return False
+
+
+def incremental_vacuum(pages_per_step: int = VACUUM_PAGES_PER_STEP,
+                       max_steps: Optional[int] = None,
+                       pause: float = 0.05) -> int:
+    """
+    分段回收空閒頁面，每一步都是獨立的短交易
+
+    Args:
+        pages_per_step: 每一步回收的頁數
+        max_steps: 最多執行的步數（None 表示回收到沒有空閒頁面為止）
+        pause: 每步之間的暫停秒數，讓其他連線有機會取得鎖
+
+    Returns:
+        int: 回收的頁數
+    """
+    reclaimed = 0
+    try:
+        conn = get_connection()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.close()
+            print("✗ 資料庫不是增量模式，請先執行 enable_incremental_vacuum()")
+            return 0
+
+        steps = 0
+        while max_steps is None or steps < max_steps:
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if free_pages == 0:
+                break
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages_per_step)})").fetchall()
+            reclaimed += free_pages - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            steps += 1
+            time.sleep(pause)
+
+        conn.close()
+        return reclaimed
+
+    except sqlite3.Error as e:
+        print(f"✗ 空間回收失敗：{e}")
+        return reclaimed
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='執行資料保留策略與空間回收')
+    parser.add_argument('--days', type=int, default=RETENTION_RAW_DAYS,
+                        help='原始批次保留天數')
+    parser.add_argument('--mode', choices=['daily', 'rollup'], default=RETENTION_MODE,
+                        help='較舊批次的處理方式')
+    parser.add_argument('--vacuum-pages', type=int, default=VACUUM_PAGES_PER_STEP,
+                        help='每步回收的頁數')
+    parser.add_argument('--vacuum-steps', type=int, default=None,
+                        help='最多回收步數（預設回收全部空閒頁面）')
+    parser.add_argument('--enable-incremental', action='store_true',
+                        help='將既有資料庫切換為增量空間回收模式（一次性 VACUUM）')
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+
+    print("=" * 60)
+    print("資料保留策略")
+    print("=" * 60)
+
+    if args.enable_incremental:
+        enable_incremental_vacuum()
+
+    result = apply_retention(args.days, args.mode)
+    print(f"✓ 已處理 {result['batches']} 個過期批次，刪除 {result['rows']} 筆原始資料")
+
+    pages = incremental_vacuum(args.vacuum_pages, args.vacuum_steps)
+    print(f"✓ 已回收 {pages} 個頁面")
+
+    print("=" * 60)
@@ -0,0 +1,169 @@
+"""
+全文檢索模組
+功能：以 text_index（FTS5 trigram 索引，見 database.init_text_index）搜尋天氣描述與天氣概況，
+      找出所有提到關鍵字的批次與地區（當日資料、一週預報與天氣概況）
+"""
+
+import sqlite3
+from typing import Dict, List
+
+from database import (
+    escape_like,
+    find_partitions,
+    get_connection,
+    iter_weather_sources,
+    table_columns
+)
+
+
+SEARCH_LIMIT = 500          # 最多返回的結果筆數
+TRIGRAM_LENGTH = 3          # trigram 索引只能查詢 3 個字以上的詞
+EXCERPT_WIDTH = 30          # 長文字（天氣概況）只顯示關鍵字前後的字數
+
+
+def split_terms(query: str) -> List[str]:
+    """以空白分隔的多個關鍵字（全部符合才算命中）"""
+    return [term for term in query.split() if term]
+
+
+def uses_fts(cursor: sqlite3.Cursor) -> bool:
+    """text_index 是否為 FTS5 虛擬資料表（未編譯 FTS5 時為一般資料表）"""
+    row = cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'text_index'").fetchone()
+    return row is not None and row[0].upper().startswith('CREATE VIRTUAL TABLE')
+
+
+def excerpt(text: str, terms: List[str], width: int = EXCERPT_WIDTH) -> str:
+    """擷取第一個關鍵字前後的文字"""
+    positions = [text.find(term) for term in terms if term in text]
+    if not positions:
+        return text[:width * 2]
+    start = max(0, min(positions) - width)
+    end = min(len(text), min(positions) + width)
+    return ("…" if start > 0 else "") + text[start:end] + ("…" if end < len(text) else "")
+
+
+def match_text(cursor: sqlite3.Cursor, query: str) -> Dict[str, List[int]]:
+    """
+    查詢符合關鍵字的文字來源
+
+    所有關鍵字都至少 3 個字時以 FTS5 MATCH 查詢索引；
+    較短的關鍵字（例如「雨」）trigram 無法索引，改以 LIKE 比對索引中的文字。
+
+    Returns:
+        Dict[str, List[int]]: {來源名稱: [ref_id, ...]}
+    """
+    terms = split_terms(query)
+    if not terms:
+        return {}
+
+    if uses_fts(cursor) and all(len(term) >= TRIGRAM_LENGTH for term in terms):
+        # 每個關鍵字作為片語（雙引號跳脫），以 AND 組合
+        match = " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        rows = cursor.execute(
+            "SELECT kind, ref_id FROM text_index WHERE text_index MATCH ?", (match,)
+        ).fetchall()
+    else:
+        conditions = " AND ".join(["body LIKE ? ESCAPE '\\'"] * len(terms))
+        rows = cursor.execute(
+            f"SELECT kind, ref_id FROM text_index WHERE {conditions}",
+            [f"%{escape_like(term)}%" for term in terms]
+        ).fetchall()
+
+    matches = {}
+    for kind, ref_id in rows:
+        matches.setdefault(kind, []).append(ref_id)
+    return matches
+
+
+def search_weather(query: str, limit: int = SEARCH_LIMIT) -> List[Dict]:
+    """
+    搜尋提到關鍵字的所有批次與地區
+
+    先由 text_index 找出符合的天氣描述，再以 weather_code_id 索引找出使用這些描述的
+    當日資料（包含所有月分區）與一週預報，不需逐列比對文字；
+    符合的天氣概況（agr_advices.py）直接以 id 取回，只顯示關鍵字前後的文字。
+
+    Args:
+        query: 關鍵字（以空白分隔多個關鍵字）
+        limit: 最多返回的筆數（由新到舊）
+
+    Returns:
+        List[Dict]: [{'source', 'batch_id', 'location', 'date', 'text'}, ...]
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+
+        matches = match_text(cursor, query)
+        code_ids = matches.get('weather_code', [])
+        profile_ids = matches.get('weather_profile', [])
+        results = []
+
+        if code_ids:
+            placeholders = ",".join("?" * len(code_ids))
+            for source in iter_weather_sources(conn, find_partitions(cursor)):
+                cursor.execute(f"""
+                    SELECT '當日預報' AS source, batch_id, location,
+                           date(created_at) AS date, description AS text
+                    FROM {source}
+                    WHERE weather_code_id IN ({placeholders})
+                    ORDER BY batch_id DESC
+                    LIMIT ?
+                """, code_ids + [limit])
+                results.extend(dict(row) for row in cursor.fetchall())
+
+        # 一週預報（資料表在匯入時建立，還沒有匯入過時略過）
+        if code_ids and table_columns(cursor, 'forecast_days'):
+            cursor.execute(f"""
+                SELECT '一週預報' AS source, f.batch_id, l.name AS location,
+                       f.forecast_date AS date, c.description AS text
+                FROM forecast_days f
+                JOIN locations l ON l.id = f.location_id
+                JOIN weather_codes c ON c.id = f.weather_code_id
+                WHERE f.weather_code_id IN ({placeholders})
+                ORDER BY f.batch_id DESC
+                LIMIT ?
+            """, code_ids + [limit])
+            results.extend(dict(row) for row in cursor.fetchall())
+
+        if profile_ids:
+            placeholders = ",".join("?" * len(profile_ids))
+            cursor.execute(f"""
+                SELECT '天氣概況' AS source, batch_id, '全區' AS location,
+                       COALESCE(issued_date, '') AS date, profile AS text
+                FROM weather_profiles
+                WHERE id IN ({placeholders})
+                ORDER BY batch_id DESC
+                LIMIT ?
+            """, profile_ids + [limit])
+            terms = split_terms(query)
+            results.extend(dict(row, text=excerpt(row['text'], terms)) for row in cursor.fetchall())
+
+        conn.close()
+
+    except sqlite3.Error as e:
+        print(f"✗ 搜尋失敗：{e}")
+        return []
+
+    results.sort(key=lambda row: (row['batch_id'], row['date']), reverse=True)
+    return results[:limit]
+
+
+# 測試程式碼
+if __name__ == "__main__":
+    import sys
+    import time
+
+    print("=" * 60)
+    print("全文檢索")
+    print("=" * 60)
+
+    for query in sys.argv[1:] or ['短暫雨', '雨', '冷氣團']:
+        start = time.perf_counter()
+        rows = search_weather(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"✓ 「{query}」：{len(rows)} 筆（{elapsed:.1f}ms）")
+        for row in rows[:3]:
+            print(f"  {row['source']} {row['date']} {row['location']}：{row['text']}")
+
+    print("=" * 60)
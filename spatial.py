@@ -0,0 +1,299 @@
+"""
+空間內插模組
+功能：以 NumPy 向量化的反距離加權法（IDW）將各測站溫度內插為台灣陸地網格
+"""
+
+import math
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# 台灣本島範圍（經度、緯度）
+TAIWAN_BOUNDS = {'lon_min': 119.9, 'lon_max': 122.1, 'lat_min': 21.8, 'lat_max': 25.4}
+
+# 台灣本島簡化海岸線（經度、緯度），用於遮罩海面上的網格點
+TAIWAN_OUTLINE = np.array([
+    (121.54, 25.30), (121.75, 25.15), (122.00, 25.01), (121.85, 24.60),
+    (121.87, 24.45), (121.62, 23.98), (121.52, 23.60), (121.38, 23.10),
+    (121.15, 22.75), (120.90, 22.35), (120.85, 21.90), (120.73, 21.95),
+    (120.58, 22.37), (120.45, 22.46), (120.27, 22.62), (120.10, 23.05),
+    (120.15, 23.38), (120.20, 23.75), (120.38, 24.10), (120.50, 24.30),
+    (120.70, 24.60), (120.90, 24.85), (121.05, 25.05), (121.40, 25.18),
+])
+
+DEFAULT_RESOLUTION = 0.05   # 網格間距（度）
+DEFAULT_POWER = 2.0         # IDW 距離權重指數
+CHUNK_SIZE = 4096           # 每次計算的網格點數（限制距離矩陣的記憶體用量）
+INDEX_CELL_SIZE = 0.1       # 空間索引的網格大小（度，約 11 公里）
+KM_PER_DEGREE = 111.2       # 緯度每度約 111.2 公里
+
+
+def points_in_polygon(lons: np.ndarray, lats: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """
+    判斷多個點是否位於多邊形內（向量化射線法）
+
+    Args:
+        lons: 點的經度陣列
+        lats: 點的緯度陣列
+        polygon: 多邊形頂點 [(lon, lat), ...]
+
+    Returns:
+        np.ndarray: 布林陣列
+    """
+    inside = np.zeros(lons.shape, dtype=bool)
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+    # 對每一條邊檢查水平射線是否相交（邊數固定，迴圈次數很少）
+    for ax, ay, bx, by in zip(x1, y1, x2, y2):
+        crosses = (ay > lats) != (by > lats)
+        x_intersect = ax + (lats - ay) * (bx - ax) / (by - ay + 1e-12)
+        inside ^= crosses & (lons < x_intersect)
+    return inside
+
+
+def build_grid(resolution: float = DEFAULT_RESOLUTION,
+               bounds: Dict = TAIWAN_BOUNDS,
+               land_only: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    建立台灣範圍的網格點
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (經度陣列, 緯度陣列)，均為一維
+    """
+    lon_axis = np.arange(bounds['lon_min'], bounds['lon_max'] + 1e-9, resolution)
+    lat_axis = np.arange(bounds['lat_min'], bounds['lat_max'] + 1e-9, resolution)
+    grid_lons, grid_lats = np.meshgrid(lon_axis, lat_axis)
+    grid_lons, grid_lats = grid_lons.ravel(), grid_lats.ravel()
+
+    if land_only:
+        mask = points_in_polygon(grid_lons, grid_lats, TAIWAN_OUTLINE)
+        grid_lons, grid_lats = grid_lons[mask], grid_lats[mask]
+    return grid_lons, grid_lats
+
+
+def idw_interpolate(station_lons: Sequence[float], station_lats: Sequence[float],
+                    values: Sequence[float], grid_lons: np.ndarray, grid_lats: np.ndarray,
+                    power: float = DEFAULT_POWER) -> np.ndarray:
+    """
+    反距離加權內插
+
+    Args:
+        station_lons: 測站經度
+        station_lats: 測站緯度
+        values: 測站數值
+        grid_lons: 網格點經度
+        grid_lats: 網格點緯度
+        power: 距離權重指數
+
+    Returns:
+        np.ndarray: 每個網格點的內插值
+    """
+    station_lons = np.asarray(station_lons, dtype=float)
+    station_lats = np.asarray(station_lats, dtype=float)
+    values = np.asarray(values, dtype=float)
+
+    # 經度依緯度縮放，讓距離近似等距
+    lon_scale = np.cos(np.radians(np.mean(station_lats)))
+    result = np.empty(grid_lons.shape, dtype=float)
+
+    for start in range(0, len(grid_lons), CHUNK_SIZE):
+        stop = start + CHUNK_SIZE
+        dx = (grid_lons[start:stop, None] - station_lons[None, :]) * lon_scale
+        dy = grid_lats[start:stop, None] - station_lats[None, :]
+        dist_sq = dx * dx + dy * dy
+
+        # 與測站重合的網格點直接取測站值
+        exact = dist_sq < 1e-12
+        weights = 1.0 / np.maximum(dist_sq, 1e-12) ** (power / 2.0)
+        weights[exact.any(axis=1)] = exact[exact.any(axis=1)]
+
+        result[start:stop] = (weights @ values) / weights.sum(axis=1)
+    return result
+
+
+def temperature_surface(station_lons: Sequence[float], station_lats: Sequence[float],
+                        values: Sequence[float],
+                        resolution: float = DEFAULT_RESOLUTION,
+                        power: float = DEFAULT_POWER) -> Dict:
+    """
+    計算台灣陸地的溫度網格
+
+    Returns:
+        Dict: {'lon': [...], 'lat': [...], 'value': [...]}（可直接快取與序列化）
+    """
+    if len(values) == 0:
+        return {'lon': [], 'lat': [], 'value': []}
+
+    grid_lons, grid_lats = build_grid(resolution)
+    grid_values = idw_interpolate(station_lons, station_lats, values,
+                                  grid_lons, grid_lats, power)
+    return {
+        'lon': grid_lons.round(4).tolist(),
+        'lat': grid_lats.round(4).tolist(),
+        'value': grid_values.round(2).tolist()
+    }
+
+
+def crop_surface(surface: Dict, bounds: Dict) -> Dict:
+    """只保留位於範圍內的網格點（地圖放大時不傳送畫面外的網格）"""
+    lons = np.asarray(surface['lon'], dtype=float)
+    lats = np.asarray(surface['lat'], dtype=float)
+    inside = ((lons >= bounds['lon_min']) & (lons <= bounds['lon_max'])
+              & (lats >= bounds['lat_min']) & (lats <= bounds['lat_max']))
+    return {key: np.asarray(values)[inside].tolist() for key, values in surface.items()}
+
+
+def view_bounds(center_lon: float, center_lat: float, zoom: float,
+                bounds: Dict = TAIWAN_BOUNDS) -> Dict:
+    """
+    計算地圖放大 zoom 倍後的可見範圍
+
+    zoom 為 1 時即 bounds；放大時以 center 為中心、邊長依比例縮小，並平移到不超出 bounds。
+    """
+    if zoom <= 1:
+        return dict(bounds)
+
+    view = {}
+    for axis, center in (('lon', center_lon), ('lat', center_lat)):
+        low, high = bounds[f'{axis}_min'], bounds[f'{axis}_max']
+        half = (high - low) / zoom / 2
+        center = min(max(center, low + half), high - half)
+        view[f'{axis}_min'], view[f'{axis}_max'] = center - half, center + half
+    return view
+
+
+class GridIndex:
+    """
+    均勻網格空間索引（範圍查詢、最近點查詢與依距離疏化）
+
+    經度依平均緯度縮放後以 cell_size 切成網格，每個點依所在網格排序存放；
+    查詢時只檢查相關網格內的點。距離以「緯度度數」為單位（乘以 KM_PER_DEGREE 約為公里）。
+    """
+
+    def __init__(self, lons: Sequence[float], lats: Sequence[float],
+                 cell_size: float = INDEX_CELL_SIZE):
+        self.lons = np.asarray(lons, dtype=float)
+        self.lats = np.asarray(lats, dtype=float)
+        self.cell_size = cell_size
+        self.lon_scale = math.cos(math.radians(self.lats.mean())) if len(self.lats) else 1.0
+
+        cell_x, cell_y = self._cells_of(self.lons, self.lats)
+        self._order = np.lexsort((cell_y, cell_x))
+        keys = np.column_stack([cell_x[self._order], cell_y[self._order]])
+        starts = np.flatnonzero(np.r_[len(keys) > 0, np.any(keys[1:] != keys[:-1], axis=1)])
+        stops = np.r_[starts[1:], len(keys)]
+        self._cells = {(int(keys[start, 0]), int(keys[start, 1])): (int(start), int(stop))
+                       for start, stop in zip(starts, stops)}
+        self._extent = ((cell_x.min(), cell_x.max(), cell_y.min(), cell_y.max())
+                        if len(keys) else (0, -1, 0, -1))
+
+    def __len__(self) -> int:
+        return len(self.lons)
+
+    def _cells_of(self, lons, lats) -> Tuple[np.ndarray, np.ndarray]:
+        cell_x = np.floor(np.asarray(lons) * self.lon_scale / self.cell_size).astype(np.int64)
+        cell_y = np.floor(np.asarray(lats) / self.cell_size).astype(np.int64)
+        return cell_x, cell_y
+
+    def _points_in_cells(self, cells) -> np.ndarray:
+        ranges = [self._cells[cell] for cell in cells if cell in self._cells]
+        if not ranges:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate([self._order[start:stop] for start, stop in ranges])
+
+    def _distances(self, indices: np.ndarray, lon: float, lat: float) -> np.ndarray:
+        dx = (self.lons[indices] - lon) * self.lon_scale
+        dy = self.lats[indices] - lat
+        return np.sqrt(dx * dx + dy * dy)
+
+    def query_bbox(self, bounds: Dict) -> np.ndarray:
+        """範圍內的點（索引遞增排序）"""
+        x_min, y_min = (int(value) for value in self._cells_of(bounds['lon_min'], bounds['lat_min']))
+        x_max, y_max = (int(value) for value in self._cells_of(bounds['lon_max'], bounds['lat_max']))
+        x_min, x_max = max(x_min, self._extent[0]), min(x_max, self._extent[1])
+        y_min, y_max = max(y_min, self._extent[2]), min(y_max, self._extent[3])
+        if x_min > x_max or y_min > y_max:
+            return np.empty(0, dtype=np.intp)
+
+        # 範圍涵蓋的網格比有資料的網格多時，直接逐一檢查有資料的網格
+        if (x_max - x_min + 1) * (y_max - y_min + 1) > len(self._cells):
+            cells = [cell for cell in self._cells
+                     if x_min <= cell[0] <= x_max and y_min <= cell[1] <= y_max]
+        else:
+            cells = [(x, y) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1)]
+
+        candidates = self._points_in_cells(cells)
+        inside = ((self.lons[candidates] >= bounds['lon_min'])
+                  & (self.lons[candidates] <= bounds['lon_max'])
+                  & (self.lats[candidates] >= bounds['lat_min'])
+                  & (self.lats[candidates] <= bounds['lat_max']))
+        return np.sort(candidates[inside])
+
+    def nearest(self, lon: float, lat: float, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        最近的 k 個點
+
+        由查詢點所在的網格向外逐圈搜尋：第 r 圈之外的點距離至少 r 個網格，
+        已找到的第 k 近距離不超過此值時即可停止。
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (索引, 距離)，依距離遞增
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        cell_x, cell_y = (int(value) for value in self._cells_of(lon, lat))
+        max_ring = max(abs(cell_x - self._extent[0]), abs(cell_x - self._extent[1]),
+                       abs(cell_y - self._extent[2]), abs(cell_y - self._extent[3]))
+        found = []
+        for ring in range(max_ring + 1):
+            ring_cells = [(x, y)
+                          for x in range(cell_x - ring, cell_x + ring + 1)
+                          for y in range(cell_y - ring, cell_y + ring + 1)
+                          if max(abs(x - cell_x), abs(y - cell_y)) == ring]
+            found.append(self._points_in_cells(ring_cells))
+            candidates = np.concatenate(found)
+            if len(candidates) >= k:
+                distances = self._distances(candidates, lon, lat)
+                if np.partition(distances, k - 1)[k - 1] <= ring * self.cell_size:
+                    break
+
+        candidates = np.concatenate(found)
+        distances = self._distances(candidates, lon, lat)
+        order = np.argsort(distances, kind='stable')[:k]
+        return candidates[order], distances[order]
+
+    def thin(self, candidates: np.ndarray, min_distance: float,
+             priority: Optional[Sequence[float]] = None) -> np.ndarray:
+        """
+        依距離疏化：依優先順序（高者先，同優先時依索引）逐一保留與已保留點
+        距離不小於 min_distance 的點
+
+        已保留的點放在邊長 min_distance 的網格中，每個候選點只需檢查相鄰 3×3 個網格。
+
+        Returns:
+            np.ndarray: 保留的點（索引遞增排序）
+        """
+        candidates = np.asarray(candidates, dtype=np.intp)
+        if min_distance <= 0 or len(candidates) <= 1:
+            return np.sort(candidates)
+
+        if priority is not None:
+            candidates = candidates[np.argsort(-np.asarray(priority, dtype=float)[candidates],
+                                               kind='stable')]
+        xs = self.lons[candidates] * self.lon_scale
+        ys = self.lats[candidates]
+        kept_cells = {}
+        kept = []
+        for index, x, y in zip(candidates, xs, ys):
+            cell_x, cell_y = int(x // min_distance), int(y // min_distance)
+            if any((x - kx) ** 2 + (y - ky) ** 2 < min_distance ** 2
+                   for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                   for kx, ky in kept_cells.get((cell_x + dx, cell_y + dy), ())):
+                continue
+            kept_cells.setdefault((cell_x, cell_y), []).append((x, y))
+            kept.append(index)
+        return np.sort(np.array(kept, dtype=np.intp))
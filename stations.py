@@ -0,0 +1,199 @@
+"""
+測站登錄模組
+功能：從隨附的 stations.csv（或 WEATHER_STATION_FILE 指定的檔案）載入地區/測站座標到 stations 資料表，
+      以 spatial.GridIndex 建立空間索引，提供最近測站查詢，以及地圖的可見範圍篩選與依縮放疏化
+"""
+
+import sys
+import io
+
+# 設置 Windows 終端輸出為 UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+import argparse
+import csv
+import os
+import sqlite3
+from typing import Dict, Iterable, List
+
+from database import get_connection
+from spatial import KM_PER_DEGREE, GridIndex
+
+
+STATION_FILE = os.getenv('WEATHER_STATION_FILE',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stations.csv'))
+THINNING_PIXELS = 16        # 地圖上兩個標記之間的最小距離（像素），較近的標記只顯示優先順序高者
+
+
+def init_station_table(conn: sqlite3.Connection):
+    """
+    創建測站資料表（name 對應 locations.name；priority 較高者在疏化時優先保留）
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stations (
+            name TEXT PRIMARY KEY,
+            city TEXT,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def read_station_file(path: str) -> List[Dict]:
+    """
+    讀取測站 CSV（欄位：name, city, lat, lon, priority；city 與 priority 可省略）
+
+    Raises:
+        ValueError: 缺少欄位或座標不是數字
+    """
+    stations = []
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                stations.append({
+                    'name': row['name'].strip(),
+                    'city': (row.get('city') or '').strip() or None,
+                    'lat': float(row['lat']),
+                    'lon': float(row['lon']),
+                    'priority': int(row.get('priority') or 0),
+                })
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                raise ValueError(f"{path} 第 {line} 行格式錯誤：{e}") from e
+    return stations
+
+
+def load_station_file(path: str = STATION_FILE) -> int:
+    """
+    以檔案內容取代 stations 資料表（單一交易）
+
+    Returns:
+        int: 載入的測站數，失敗返回 0
+    """
+    try:
+        stations = read_station_file(path)
+        conn = get_connection()
+        init_station_table(conn)
+        conn.execute("DELETE FROM stations")
+        conn.executemany("""
+            INSERT OR REPLACE INTO stations (name, city, lat, lon, priority)
+            VALUES (:name, :city, :lat, :lon, :priority)
+        """, stations)
+        conn.commit()
+        conn.close()
+        return len(stations)
+
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"✗ 測站資料載入失敗：{e}")
+        return 0
+
+
+def get_stations() -> List[Dict]:
+    """
+    查詢所有測站（資料表為空時先載入 STATION_FILE）
+
+    Returns:
+        List[Dict]: [{'name', 'city', 'lat', 'lon', 'priority'}, ...]
+    """
+    try:
+        conn = get_connection()
+        init_station_table(conn)
+        conn.commit()
+        empty = conn.execute("SELECT 1 FROM stations LIMIT 1").fetchone() is None
+        conn.close()
+        if empty:
+            load_station_file()
+
+        conn = get_connection()
+        rows = conn.execute("""
+            SELECT name, city, lat, lon, priority
+            FROM stations
+            ORDER BY priority DESC, name
+        """).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    except sqlite3.Error as e:
+        print(f"✗ 查詢失敗：{e}")
+        return []
+
+
+class StationRegistry:
+    """測站座標與空間索引（建立後不變，可在行程內共用）"""
+
+    def __init__(self, stations: List[Dict]):
+        self.stations = stations
+        self.positions = {station['name']: i for i, station in enumerate(stations)}
+        self.index = GridIndex([s['lon'] for s in stations], [s['lat'] for s in stations])
+        self.priority = [s['priority'] for s in stations]
+
+    def coordinates(self) -> Dict[str, Dict]:
+        """{地區名稱: {'lat', 'lon', 'city'}}（figures.build_map_points 使用）"""
+        return {s['name']: {'lat': s['lat'], 'lon': s['lon'], 'city': s['city'] or s['name']}
+                for s in self.stations}
+
+    def nearest(self, lon: float, lat: float, k: int = 1) -> List[Dict]:
+        """最近的 k 個測站（附 distance_km，依距離遞增）"""
+        indices, distances = self.index.nearest(lon, lat, k)
+        return [dict(self.stations[i], distance_km=round(float(d) * KM_PER_DEGREE, 2))
+                for i, d in zip(indices, distances)]
+
+    def visible(self, names: Iterable[str], bounds: Dict, pixels_per_degree: float,
+                min_pixels: float = THINNING_PIXELS) -> List[str]:
+        """
+        地圖上實際要顯示的地區：位於可見範圍內，且依縮放疏化後保留者
+
+        Args:
+            names: 有資料的地區（不在登錄中的地區不會出現在結果中）
+            bounds: 可見範圍（spatial.view_bounds）
+            pixels_per_degree: 目前縮放下每度的像素數
+            min_pixels: 標記之間的最小像素距離
+
+        Returns:
+            List[str]: 地區名稱（依登錄順序）
+        """
+        wanted = {self.positions[name] for name in names if name in self.positions}
+        candidates = [i for i in self.index.query_bbox(bounds) if i in wanted]
+        kept = self.index.thin(candidates, min_pixels / pixels_per_degree, self.priority)
+        return [self.stations[i]['name'] for i in kept]
+
+
+def load_station_registry() -> StationRegistry:
+    """由 stations 資料表建立測站登錄"""
+    return StationRegistry(get_stations())
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='測站座標登錄與最近測站查詢')
+    parser.add_argument('--load', metavar='CSV', default=None,
+                        help='以 CSV 檔案取代測站資料（欄位：name, city, lat, lon, priority）')
+    parser.add_argument('--nearest', nargs=2, type=float, metavar=('LAT', 'LON'), default=None,
+                        help='查詢最近的測站')
+    parser.add_argument('-k', type=int, default=3, help='最近測站的數量')
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+
+    print("=" * 60)
+    print("測站登錄")
+    print("=" * 60)
+
+    if args.load:
+        count = load_station_file(args.load)
+        if count:
+            print(f"✓ 已載入 {count} 個測站（{args.load}）")
+
+    registry = load_station_registry()
+    print(f"✓ 共 {len(registry.stations)} 個測站")
+
+    if args.nearest:
+        lat, lon = args.nearest
+        print(f"\n最接近 ({lat}, {lon}) 的測站：")
+        for station in registry.nearest(lon, lat, args.k):
+            print(f"  - {station['name']}（{station['city']}）：{station['distance_km']} 公里")
+
+    print("=" * 60)
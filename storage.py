@@ -0,0 +1,435 @@
+"""
+儲存後端模組
+功能：定義天氣資料儲存介面，提供 SQLite（預設）與 DuckDB 兩種實作，
+      由 WEATHER_STORAGE_BACKEND 選擇；main.py 與 app.py 透過本模組存取資料
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import database
+from batch_keys import legacy_batch_id
+
+# DuckDB 為選用套件（pip install duckdb）
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+STORAGE_BACKEND = os.getenv('WEATHER_STORAGE_BACKEND', 'sqlite')   # sqlite 或 duckdb
+DUCKDB_PATH = os.getenv('WEATHER_DUCKDB_PATH', 'data.duckdb')
+
+
+class WeatherRepository(ABC):
+    """天氣資料儲存介面（函數簽名與 database.py 相同）"""
+
+    name = ''
+
+    @abstractmethod
+    def init_database(self) -> bool:
+        """初始化資料表"""
+
+    @abstractmethod
+    def insert_weather_data(self, data_list: List[Dict], batch_id: int) -> int:
+        """寫入一個批次，返回寫入筆數"""
+
+    @abstractmethod
+    def get_latest_weather(self) -> List[Dict]:
+        """查詢最新一批天氣資料"""
+
+    @abstractmethod
+    def get_all_weather(self) -> List[Dict]:
+        """查詢所有歷史天氣資料"""
+
+    @abstractmethod
+    def get_weather_by_batch(self, batch_id: int) -> List[Dict]:
+        """查詢特定批次的天氣資料"""
+
+    @abstractmethod
+    def get_batch_list(self) -> List[Tuple[int, int, str]]:
+        """查詢所有批次列表 [(batch_id, count, created_at), ...]"""
+
+    @abstractmethod
+    def get_daily_summary(self, start_date: Optional[str] = None,
+                          end_date: Optional[str] = None) -> List[Dict]:
+        """查詢每日各地區的溫度彙總"""
+
+    @abstractmethod
+    def get_database_stats(self) -> Dict:
+        """獲取資料庫統計資訊"""
+
+    @abstractmethod
+    def query_weather(self, locations: Optional[List[str]] = None,
+                      start_date: Optional[str] = None, end_date: Optional[str] = None,
+                      description: Optional[str] = None, sort_by: str = 'created_at',
+                      descending: bool = True, limit: int = database.WEATHER_PAGE_SIZE,
+                      offset: int = 0) -> Tuple[List[Dict], int]:
+        """篩選、排序並分頁查詢歷史資料，返回 (目前頁面, 總筆數)"""
+
+
+class SQLiteRepository(WeatherRepository):
+    """SQLite 實作（直接使用 database.py 的函數）"""
+
+    name = 'sqlite'
+
+    def init_database(self) -> bool:
+        return database.init_database()
+
+    def insert_weather_data(self, data_list: List[Dict], batch_id: int) -> int:
+        return database.insert_weather_data(data_list, batch_id)
+
+    def get_latest_weather(self) -> List[Dict]:
+        return database.get_latest_weather()
+
+    def get_all_weather(self) -> List[Dict]:
+        return database.get_all_weather()
+
+    def get_weather_by_batch(self, batch_id: int) -> List[Dict]:
+        return database.get_weather_by_batch(batch_id)
+
+    def get_batch_list(self) -> List[Tuple[int, int, str]]:
+        return database.get_batch_list()
+
+    def get_daily_summary(self, start_date: Optional[str] = None,
+                          end_date: Optional[str] = None) -> List[Dict]:
+        return database.get_daily_summary(start_date, end_date)
+
+    def get_database_stats(self) -> Dict:
+        return database.get_database_stats()
+
+    def query_weather(self, locations: Optional[List[str]] = None,
+                      start_date: Optional[str] = None, end_date: Optional[str] = None,
+                      description: Optional[str] = None, sort_by: str = 'created_at',
+                      descending: bool = True, limit: int = database.WEATHER_PAGE_SIZE,
+                      offset: int = 0) -> Tuple[List[Dict], int]:
+        return database.query_weather(locations, start_date, end_date, description,
+                                      sort_by, descending, limit, offset)
+
+
+class DuckDBRepository(WeatherRepository):
+    """
+    DuckDB 實作（欄式儲存，適合跨批次的歷史彙總查詢）
+
+    DuckDB 同一時間只允許一個行程以讀寫模式開啟檔案，因此行程內共用單一連線，
+    跨行程的鎖仍記錄在 SQLite（database.DATABASE_NAME）中。
+    """
+
+    name = 'duckdb'
+
+    # 時間欄位輸出為與 SQLite 相同的字串格式
+    SELECT_COLUMNS = """
+        id, batch_id, location, min_temp, max_temp, description,
+        strftime(fetch_time, '%Y-%m-%d %H:%M:%S') AS fetch_time,
+        strftime(created_at, '%Y-%m-%d %H:%M:%S') AS created_at
+    """
+
+    def __init__(self, path: str = DUCKDB_PATH):
+        if duckdb is None:
+            raise ImportError("使用 DuckDB 後端需要先安裝：pip install duckdb")
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _cursor(self):
+        """取得執行緒專用的游標（共用同一個資料庫連線）"""
+        with self._lock:
+            if self._conn is None:
+                self._conn = duckdb.connect(self.path)
+        return self._conn.cursor()
+
+    def _fetch_dicts(self, sql: str, params: Tuple = ()) -> List[Dict]:
+        cursor = self._cursor()
+        try:
+            cursor.execute(sql, list(params))
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def init_database(self) -> bool:
+        try:
+            cursor = self._cursor()
+            cursor.execute("CREATE SEQUENCE IF NOT EXISTS weather_id_seq")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS weather (
+                    id BIGINT PRIMARY KEY DEFAULT nextval('weather_id_seq'),
+                    batch_id BIGINT NOT NULL,
+                    location VARCHAR NOT NULL,
+                    min_temp DOUBLE,
+                    max_temp DOUBLE,
+                    description VARCHAR,
+                    weather_id INTEGER,
+                    fetch_time TIMESTAMP,
+                    created_at TIMESTAMP
+                )
+            """)
+            self._migrate_batch_keys(cursor)
+            cursor.close()
+
+            conn = database.get_connection()
+            database.init_lock_table(conn.cursor())
+            conn.commit()
+            conn.close()
+
+            print("✓ 資料庫初始化成功（DuckDB）")
+            return True
+
+        except (duckdb.Error, database.sqlite3.Error) as e:
+            print(f"✗ 資料庫初始化失敗：{e}")
+            return False
+
+    def _migrate_batch_keys(self, cursor):
+        """將舊版的文字批次 ID 轉換為整數批次 ID（見 batch_keys.py）"""
+        cursor.execute("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'weather' AND column_name = 'batch_id'
+        """)
+        if cursor.fetchone()[0] != 'VARCHAR':
+            return
+
+        print("正在將 weather 的批次 ID 轉換為整數...")
+        cursor.execute("SELECT DISTINCT batch_id FROM weather")
+        labels = [row[0] for row in cursor.fetchall()]
+        cursor.execute("CREATE OR REPLACE TEMP TABLE batch_key_map (label VARCHAR, batch_key BIGINT)")
+        if labels:
+            cursor.executemany("INSERT INTO batch_key_map VALUES (?, ?)",
+                               [[label, legacy_batch_id(label)] for label in labels])
+        # DuckDB 不允許在同一交易中修改資料表結構後再更新，各步驟分別提交
+        cursor.execute("ALTER TABLE weather ADD COLUMN IF NOT EXISTS batch_key BIGINT")
+        cursor.execute("""
+            UPDATE weather SET batch_key = m.batch_key
+            FROM batch_key_map m WHERE m.label = weather.batch_id
+        """)
+        cursor.execute("ALTER TABLE weather DROP COLUMN batch_id")
+        cursor.execute("ALTER TABLE weather RENAME COLUMN batch_key TO batch_id")
+        cursor.execute("DROP TABLE batch_key_map")
+
+    def insert_weather_data(self, data_list: List[Dict], batch_id: int) -> int:
+        # 與 SQLite 的 CURRENT_TIMESTAMP 一致，使用 UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        cursor = self._cursor()
+        try:
+            cursor.execute("BEGIN TRANSACTION")
+            # 與 SQLite 後端相同，兩個行程產生相同批次 ID 時（見 batch_keys.py）不合併批次
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM weather WHERE batch_id = ?)", [batch_id])
+            if cursor.fetchone()[0]:
+                cursor.execute("ROLLBACK")
+                print(f"✗ 資料插入失敗：批次 ID 已存在（{batch_id}）")
+                return 0
+            cursor.executemany("""
+                INSERT INTO weather (batch_id, location, min_temp, max_temp, description,
+                                     weather_id, fetch_time, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                [
+                    batch_id,
+                    weather.get('location'),
+                    weather.get('min_temp'),
+                    weather.get('max_temp'),
+                    weather.get('description'),
+                    weather.get('weather_id'),
+                    now,
+                    now
+                ]
+                for weather in data_list
+            ])
+            cursor.execute("COMMIT")
+            print(f"✓ 成功插入 {len(data_list)} 筆資料（批次 ID: {batch_id}）")
+            return len(data_list)
+
+        except duckdb.Error as e:
+            cursor.execute("ROLLBACK")
+            print(f"✗ 資料插入失敗：{e}")
+            return 0
+        finally:
+            cursor.close()
+
+    def get_latest_weather(self) -> List[Dict]:
+        try:
+            return self._fetch_dicts(f"""
+                SELECT {self.SELECT_COLUMNS}
+                FROM weather
+                WHERE batch_id = (SELECT MAX(batch_id) FROM weather)
+                ORDER BY location
+            """)
+        except duckdb.Error as e:
+            print(f"✗ 查詢失敗：{e}")
+            return []
+
+    def get_all_weather(self) -> List[Dict]:
+        try:
+            return self._fetch_dicts(f"""
+                SELECT {self.SELECT_COLUMNS}
+                FROM weather
+                ORDER BY batch_id DESC, location
+            """)
+        except duckdb.Error as e:
+            print(f"✗ 查詢失敗：{e}")
+            return []
+
+    def get_weather_by_batch(self, batch_id: int) -> List[Dict]:
+        try:
+            return self._fetch_dicts(f"""
+                SELECT {self.SELECT_COLUMNS}
+                FROM weather
+                WHERE batch_id = ?
+                ORDER BY location
+            """, (batch_id,))
+        except duckdb.Error as e:
+            print(f"✗ 查詢失敗：{e}")
+            return []
+
+    def get_batch_list(self) -> List[Tuple[int, int, str]]:
+        try:
+            rows = self._fetch_dicts("""
+                SELECT batch_id, COUNT(*) AS count,
+                       strftime(MIN(created_at), '%Y-%m-%d %H:%M:%S') AS created_at
+                FROM weather
+                GROUP BY batch_id
+                ORDER BY batch_id DESC
+            """)
+            return [(row['batch_id'], row['count'], row['created_at']) for row in rows]
+        except duckdb.Error as e:
+            print(f"✗ 查詢失敗：{e}")
+            return []
+
+    def get_daily_summary(self, start_date: Optional[str] = None,
+                          end_date: Optional[str] = None) -> List[Dict]:
+        try:
+            return self._fetch_dicts("""
+                SELECT strftime(CAST(created_at AS DATE), '%Y-%m-%d') AS day, location,
+                       MIN(min_temp) AS min_temp, MAX(max_temp) AS max_temp,
+                       AVG(min_temp) AS avg_min_temp, AVG(max_temp) AS avg_max_temp,
+                       COUNT(DISTINCT batch_id) AS batch_count
+                FROM weather
+                WHERE (CAST(? AS DATE) IS NULL OR CAST(created_at AS DATE) >= CAST(? AS DATE))
+                  AND (CAST(? AS DATE) IS NULL OR CAST(created_at AS DATE) <= CAST(? AS DATE))
+                GROUP BY day, location
+                ORDER BY day, location
+            """, (start_date, start_date, end_date, end_date))
+        except duckdb.Error as e:
+            print(f"✗ 查詢失敗：{e}")
+            return []
+
+    def get_database_stats(self) -> Dict:
+        try:
+            row = self._fetch_dicts("""
+                SELECT COUNT(*) AS total_records,
+                       COUNT(*) AS stored_records,
+                       COUNT(DISTINCT batch_id) AS total_batches,
+                       strftime(MIN(created_at), '%Y-%m-%d %H:%M:%S') AS earliest_record,
+                       strftime(MAX(created_at), '%Y-%m-%d %H:%M:%S') AS latest_record
+                FROM weather
+            """)[0]
+            return row
+        except duckdb.Error as e:
+            print(f"✗ 統計查詢失敗：{e}")
+            return {}
+
+    def query_weather(self, locations: Optional[List[str]] = None,
+                      start_date: Optional[str] = None, end_date: Optional[str] = None,
+                      description: Optional[str] = None, sort_by: str = 'created_at',
+                      descending: bool = True, limit: int = database.WEATHER_PAGE_SIZE,
+                      offset: int = 0) -> Tuple[List[Dict], int]:
+        if sort_by not in database.WEATHER_SORT_COLUMNS:
+            raise ValueError(f"不支援的排序欄位：{sort_by}")
+
+        conditions = []
+        params = []
+        if locations:
+            conditions.append(f"location IN ({','.join('?' * len(locations))})")
+            params.extend(locations)
+        if start_date:
+            conditions.append("created_at >= CAST(? AS DATE)")
+            params.append(start_date)
+        if end_date:
+            conditions.append("created_at < CAST(? AS DATE) + INTERVAL 1 DAY")
+            params.append(end_date)
+        if description:
+            conditions.append("description LIKE ? ESCAPE '\\'")
+            params.append(f"%{database.escape_like(description)}%")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = "DESC" if descending else "ASC"
+
+        try:
+            total = self._fetch_dicts(f"SELECT COUNT(*) AS total FROM weather {where}",
+                                      tuple(params))[0]['total']
+            rows = self._fetch_dicts(f"""
+                SELECT {self.SELECT_COLUMNS}
+                FROM weather
+                {where}
+                ORDER BY {sort_by} {direction}, id {direction}
+                LIMIT ? OFFSET ?
+            """, tuple(params) + (limit, offset))
+            return rows, total
+        except duckdb.Error as e:
+            print(f"✗ 查詢失敗：{e}")
+            return [], 0
+
+
+REPOSITORY_CLASSES = {
+    SQLiteRepository.name: SQLiteRepository,
+    DuckDBRepository.name: DuckDBRepository,
+}
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def get_repository() -> WeatherRepository:
+    """取得目前設定的儲存後端（行程內共用同一個實例）"""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            if STORAGE_BACKEND not in REPOSITORY_CLASSES:
+                raise ValueError(f"未知的儲存後端：{STORAGE_BACKEND}")
+            _repository = REPOSITORY_CLASSES[STORAGE_BACKEND]()
+        return _repository
+
+
+# ==================== 與 database.py 相同的函數介面 ====================
+
+def init_database() -> bool:
+    return get_repository().init_database()
+
+
+def insert_weather_data(data_list: List[Dict], batch_id: int) -> int:
+    return get_repository().insert_weather_data(data_list, batch_id)
+
+
+def get_latest_weather() -> List[Dict]:
+    return get_repository().get_latest_weather()
+
+
+def get_all_weather() -> List[Dict]:
+    return get_repository().get_all_weather()
+
+
+def get_weather_by_batch(batch_id: int) -> List[Dict]:
+    return get_repository().get_weather_by_batch(batch_id)
+
+
+def get_batch_list() -> List[Tuple[int, int, str]]:
+    return get_repository().get_batch_list()
+
+
+def get_daily_summary(start_date: Optional[str] = None,
+                      end_date: Optional[str] = None) -> List[Dict]:
+    return get_repository().get_daily_summary(start_date, end_date)
+
+
+def get_database_stats() -> Dict:
+    return get_repository().get_database_stats()
+
+
+def query_weather(locations: Optional[List[str]] = None,
+                  start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  description: Optional[str] = None, sort_by: str = 'created_at',
+                  descending: bool = True, limit: int = database.WEATHER_PAGE_SIZE,
+                  offset: int = 0) -> Tuple[List[Dict], int]:
+    return get_repository().query_weather(locations, start_date, end_date, description,
+                                          sort_by, descending, limit, offset)
@@ -8,25 +8,14 @@ import io
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-import requests
 import json
 
-# API 配置
-API_URL = "https://opendata.cwa.gov.tw/fileapi/v1/opendataapi/F-A0010-001"
-API_KEY = "CWA-1FFDDAEC-161F-46A3-BE71-93C32C52829F"
+from fetch_weather import fetch_weather_data
 
-# 下載資料
-params = {
-    'Authorization': API_KEY,
-    'downloadType': 'WEB',
-    'format': 'JSON'
-}
-
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-response = requests.get(API_URL, params=params, timeout=30, verify=False)
-data = response.json()
+# 下載資料（資料來源由 CWA_WEATHER_SOURCE 決定，可指向本地替身伺服器）
+data = fetch_weather_data()
+if not data:
+    sys.exit("無法下載資料")
 
 # 保存完整 JSON 以便檢視
 with open('weather_response.json', 'w', encoding='utf-8') as f:
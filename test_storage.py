@@ -0,0 +1,83 @@
+"""
+儲存後端測試：對每個後端（SQLite、SQLite 差異儲存、DuckDB）執行相同的操作，
+確認 WeatherRepository 的查詢結果正確且各後端一致
+
+執行：python -m pytest test_storage.py（未安裝 duckdb 時略過 DuckDB）
+"""
+
+import pytest
+
+import database
+import storage
+from bench_storage import LOCATIONS, generate_batches, run_suite
+
+
+BATCH_COUNT = 30
+BACKENDS = [
+    'sqlite',
+    'sqlite-delta',
+    pytest.param('duckdb', marks=pytest.mark.skipif(storage.duckdb is None,
+                                                    reason='未安裝 duckdb')),
+]
+
+
+@pytest.fixture
+def make_repository(tmp_path, monkeypatch):
+    """在暫存目錄建立指定後端（每個測試使用獨立的資料庫檔案）"""
+    def make(backend: str) -> storage.WeatherRepository:
+        monkeypatch.setattr(database, 'DATABASE_NAME', str(tmp_path / f"{backend}.db"))
+        monkeypatch.setattr(database, 'DELTA_STORAGE', backend == 'sqlite-delta')
+        if backend == 'duckdb':
+            return storage.DuckDBRepository(str(tmp_path / "weather.duckdb"))
+        return storage.SQLiteRepository()
+    return make
+
+
+@pytest.fixture
+def batches():
+    return generate_batches(BATCH_COUNT)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_repository_suite(backend, make_repository, batches):
+    """寫入、批次查詢、歷史查詢、每日彙總、統計與篩選分頁（run_suite 內含內容檢查）"""
+    result = run_suite(make_repository(backend), batches)
+    assert result['snapshot']['stats'] == {'total_records': BATCH_COUNT * len(LOCATIONS),
+                                           'total_batches': BATCH_COUNT}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_query_weather_filters(backend, make_repository, batches):
+    repo = make_repository(backend)
+    assert repo.init_database()
+    for index, rows in enumerate(batches):
+        repo.insert_weather_data(rows, index + 1)
+
+    expected = [row for rows in batches for row in rows
+                if row['location'] in LOCATIONS[:2] and '雨' in row['description']]
+    rows, total = repo.query_weather(LOCATIONS[:2], None, None, '雨', 'min_temp', False,
+                                     len(expected) + 1, 0)
+    assert total == len(rows) == len(expected)
+    assert [row['min_temp'] for row in rows] == sorted(row['min_temp'] for row in expected)
+    assert {row['location'] for row in rows} <= set(LOCATIONS[:2])
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_existing_batch_id_is_rejected(backend, make_repository, batches):
+    """相同批次 ID 的第二次寫入失敗，不會與既有批次合併（見 batch_keys.py）"""
+    repo = make_repository(backend)
+    assert repo.init_database()
+    assert repo.insert_weather_data(batches[0], 1) == len(LOCATIONS)
+    assert repo.insert_weather_data(batches[1], 1) == 0
+    fields = ('location', 'min_temp', 'max_temp', 'description')
+    stored = [tuple(row[key] for key in fields) for row in repo.get_weather_by_batch(1)]
+    assert stored == sorted(tuple(row[key] for key in fields) for row in batches[0])
+
+
+def test_backends_agree(make_repository, batches):
+    """所有可用後端的查詢結果相同"""
+    names = [name for name in ('sqlite', 'sqlite-delta', 'duckdb')
+             if name != 'duckdb' or storage.duckdb is not None]
+    snapshots = {name: run_suite(make_repository(name), batches)['snapshot'] for name in names}
+    for name in names[1:]:
+        assert snapshots[name] == snapshots[names[0]], f"{name} 與 {names[0]} 的結果不一致"
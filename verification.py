@@ -0,0 +1,296 @@
+"""
+預報校驗模組
+功能：保存每個批次的整週逐日預報，將不同批次對同一（地區、日期）的預報配對，
+      以 SQL 一次彙總各預報時效（lead time）的偏差（bias）與平均絕對誤差（MAE）
+"""
+
+import sqlite3
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from database import get_connection, resolve_dimension_ids, table_columns
+
+
+# 以前一天發布的預報（時效 1 天）作為校驗基準，評估更長時效預報的誤差
+REFERENCE_LEAD_DAYS = 1
+
+
+def init_forecast_tables(conn: sqlite3.Connection):
+    """
+    創建逐日預報與校驗統計資料表
+
+    forecast_skill 只存放誤差的加總值，新日期可校驗時直接累加，
+    不需重新配對整段歷史。
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_days (
+            batch_id INTEGER NOT NULL,
+            location_id INTEGER NOT NULL REFERENCES locations (id),
+            issued_date TEXT NOT NULL,
+            forecast_date TEXT NOT NULL,
+            lead_days INTEGER NOT NULL,
+            min_temp REAL,
+            max_temp REAL,
+            weather_code_id INTEGER REFERENCES weather_codes (id),
+            PRIMARY KEY (batch_id, location_id, forecast_date)
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_forecast_days_date
+        ON forecast_days (forecast_date, location_id)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_forecast_days_code_id
+        ON forecast_days (weather_code_id)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_skill (
+            location_id INTEGER NOT NULL REFERENCES locations (id),
+            lead_days INTEGER NOT NULL,
+            n_min INTEGER NOT NULL DEFAULT 0,
+            sum_err_min REAL NOT NULL DEFAULT 0,
+            sum_abs_err_min REAL NOT NULL DEFAULT 0,
+            sumsq_err_min REAL NOT NULL DEFAULT 0,
+            n_max INTEGER NOT NULL DEFAULT 0,
+            sum_err_max REAL NOT NULL DEFAULT 0,
+            sum_abs_err_max REAL NOT NULL DEFAULT 0,
+            sumsq_err_max REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (location_id, lead_days)
+        )
+    """)
+    # 已校驗到的預報日期（之後的日期才需要累加）
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS verification_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_verified_date TEXT NOT NULL
+        )
+    """)
+
+
+def insert_forecast_rows(cursor: sqlite3.Cursor, forecast_list: List[Dict],
+                         batch_id: int, issued_date: str) -> int:
+    """
+    將一個批次的逐日預報寫入 forecast_days（不提交交易）
+
+    同一批次 ID 的舊資料會先被刪除，重複寫入不會產生重複資料。
+
+    Args:
+        cursor: 資料庫游標
+        forecast_list: parse_forecast_days() 的結果
+        batch_id: 批次識別碼
+        issued_date: 發布日期（YYYY-MM-DD，台灣時間）
+
+    Returns:
+        int: 寫入的資料筆數
+    """
+    cursor.execute("DELETE FROM forecast_days WHERE batch_id = ?", (batch_id,))
+    if not forecast_list:
+        return 0
+
+    location_ids, code_ids = resolve_dimension_ids(cursor, forecast_list)
+    issued = date.fromisoformat(issued_date)
+
+    cursor.executemany("""
+        INSERT INTO forecast_days (batch_id, location_id, issued_date, forecast_date,
+                                   lead_days, min_temp, max_temp, weather_code_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (
+            batch_id,
+            location_ids[forecast['location']],
+            issued_date,
+            forecast['forecast_date'],
+            (date.fromisoformat(forecast['forecast_date']) - issued).days,
+            forecast['min_temp'],
+            forecast['max_temp'],
+            code_ids.get(forecast['description'])
+        )
+        for forecast in forecast_list
+    ])
+    return len(forecast_list)
+
+
+def insert_forecast_batches(batches: List[Tuple[int, str, List[Dict]]]) -> int:
+    """
+    在單一交易中寫入多個批次的逐日預報
+
+    Args:
+        batches: [(batch_id, issued_date, 逐日預報列表), ...]
+
+    Returns:
+        int: 成功插入的資料筆數，失敗返回 0
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        init_forecast_tables(conn)
+
+        inserted_count = 0
+        for batch_id, issued_date, forecast_list in batches:
+            inserted_count += insert_forecast_rows(cursor, forecast_list, batch_id, issued_date)
+
+        conn.commit()
+        conn.close()
+        return inserted_count
+
+    except sqlite3.Error as e:
+        print(f"✗ 逐日預報寫入失敗：{e}")
+        return 0
+
+
+def update_verification() -> int:
+    """
+    將新可校驗的預報日期累加到校驗統計
+
+    某日期的基準預報在前一天發布，因此只要已有當天（或之後）發布的批次，
+    該日期的所有預報都已到齊，可以一次配對。
+
+    Returns:
+        int: 本次校驗的預報日期數
+    """
+    try:
+        conn = get_connection()
+        init_forecast_tables(conn)
+
+        row = conn.execute("SELECT last_verified_date FROM verification_state WHERE id = 1").fetchone()
+        last_date = row['last_verified_date'] if row else ''
+        latest_issue = conn.execute("SELECT MAX(issued_date) FROM forecast_days").fetchone()[0]
+        if not latest_issue or latest_issue <= last_date:
+            conn.close()
+            return 0
+
+        # 基準預報與其他時效的預報以（地區、日期）配對，依地區與時效一次彙總
+        conn.execute("""
+            WITH reference AS (
+                SELECT location_id, forecast_date,
+                       AVG(min_temp) AS ref_min, AVG(max_temp) AS ref_max
+                FROM forecast_days
+                WHERE lead_days = ? AND forecast_date > ? AND forecast_date <= ?
+                GROUP BY location_id, forecast_date
+            ),
+            errors AS (
+                SELECT f.location_id, f.lead_days,
+                       f.min_temp - r.ref_min AS err_min,
+                       f.max_temp - r.ref_max AS err_max
+                FROM forecast_days f
+                JOIN reference r
+                  ON r.location_id = f.location_id AND r.forecast_date = f.forecast_date
+                WHERE f.lead_days > ?
+            )
+            INSERT INTO forecast_skill (location_id, lead_days,
+                                        n_min, sum_err_min, sum_abs_err_min, sumsq_err_min,
+                                        n_max, sum_err_max, sum_abs_err_max, sumsq_err_max)
+            SELECT location_id, lead_days,
+                   COUNT(err_min), TOTAL(err_min), TOTAL(ABS(err_min)), TOTAL(err_min * err_min),
+                   COUNT(err_max), TOTAL(err_max), TOTAL(ABS(err_max)), TOTAL(err_max * err_max)
+            FROM errors
+            WHERE true
+            GROUP BY location_id, lead_days
+            ON CONFLICT (location_id, lead_days) DO UPDATE SET
+                n_min = n_min + excluded.n_min,
+                sum_err_min = sum_err_min + excluded.sum_err_min,
+                sum_abs_err_min = sum_abs_err_min + excluded.sum_abs_err_min,
+                sumsq_err_min = sumsq_err_min + excluded.sumsq_err_min,
+                n_max = n_max + excluded.n_max,
+                sum_err_max = sum_err_max + excluded.sum_err_max,
+                sum_abs_err_max = sum_abs_err_max + excluded.sum_abs_err_max,
+                sumsq_err_max = sumsq_err_max + excluded.sumsq_err_max
+        """, (REFERENCE_LEAD_DAYS, last_date, latest_issue, REFERENCE_LEAD_DAYS))
+
+        verified = conn.execute("""
+            SELECT COUNT(DISTINCT forecast_date) FROM forecast_days
+            WHERE forecast_date > ? AND forecast_date <= ?
+        """, (last_date, latest_issue)).fetchone()[0]
+        conn.execute("""
+            INSERT INTO verification_state (id, last_verified_date) VALUES (1, ?)
+            ON CONFLICT (id) DO UPDATE SET last_verified_date = excluded.last_verified_date
+        """, (latest_issue,))
+
+        conn.commit()
+        conn.close()
+        return verified
+
+    except sqlite3.Error as e:
+        print(f"✗ 預報校驗更新失敗：{e}")
+        return 0
+
+
+def rebuild_verification() -> int:
+    """清空並從目前的 forecast_days 資料表重新累積校驗統計"""
+    try:
+        conn = get_connection()
+        init_forecast_tables(conn)
+        conn.execute("DELETE FROM forecast_skill")
+        conn.execute("DELETE FROM verification_state")
+        conn.commit()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"✗ 預報校驗重建失敗：{e}")
+        return 0
+    return update_verification()
+
+
+def get_skill_by_lead(location: Optional[str] = None) -> pd.DataFrame:
+    """
+    查詢各預報時效的校驗結果
+
+    Args:
+        location: 地區名稱，None 表示彙總所有地區
+
+    Returns:
+        pd.DataFrame: 欄位 lead_days, n, bias_min, mae_min, rmse_min,
+                      bias_max, mae_max, rmse_max（誤差 = 預報 - 基準）
+    """
+    try:
+        conn = get_connection()
+        # 資料表在匯入時建立（ingest.py），還沒有匯入過時沒有校驗結果
+        if not table_columns(conn.cursor(), 'forecast_skill'):
+            conn.close()
+            return pd.DataFrame()
+        skill = pd.read_sql_query("""
+            SELECT s.lead_days,
+                   SUM(s.n_min) AS n_min, SUM(s.sum_err_min) AS sum_err_min,
+                   SUM(s.sum_abs_err_min) AS sum_abs_err_min, SUM(s.sumsq_err_min) AS sumsq_err_min,
+                   SUM(s.n_max) AS n_max, SUM(s.sum_err_max) AS sum_err_max,
+                   SUM(s.sum_abs_err_max) AS sum_abs_err_max, SUM(s.sumsq_err_max) AS sumsq_err_max
+            FROM forecast_skill s
+            JOIN locations l ON l.id = s.location_id
+            WHERE (? IS NULL OR l.name = ?)
+            GROUP BY s.lead_days
+            ORDER BY s.lead_days
+        """, conn, params=(location, location))
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"✗ 查詢失敗：{e}")
+        return pd.DataFrame()
+
+    result = pd.DataFrame({'lead_days': skill['lead_days'], 'n': skill['n_max']})
+    for kind in ('min', 'max'):
+        n = skill[f'n_{kind}'].where(skill[f'n_{kind}'] > 0)
+        result[f'bias_{kind}'] = skill[f'sum_err_{kind}'] / n
+        result[f'mae_{kind}'] = skill[f'sum_abs_err_{kind}'] / n
+        result[f'rmse_{kind}'] = (skill[f'sumsq_err_{kind}'] / n).pow(0.5)
+    return result
+
+
+# 測試程式碼
+if __name__ == "__main__":
+    print("=" * 60)
+    print("預報校驗（依預報時效）")
+    print("=" * 60)
+
+    verified = rebuild_verification()
+    print(f"✓ 已校驗 {verified} 個預報日期")
+
+    skill = get_skill_by_lead()
+    if skill.empty:
+        print("尚無可校驗的預報（需要連續多天的批次）")
+    else:
+        print(f"\n{'時效':>4} {'樣本':>6} {'最高溫偏差':>10} {'最高溫MAE':>10} {'最低溫偏差':>10} {'最低溫MAE':>10}")
+        for row in skill.itertuples():
+            print(f"{row.lead_days:>3}天 {row.n:>6} {row.bias_max:>+10.2f} {row.mae_max:>10.2f} "
+                  f"{row.bias_min:>+10.2f} {row.mae_min:>10.2f}")
+
+    print("=" * 60)